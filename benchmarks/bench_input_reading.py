@@ -0,0 +1,90 @@
+"""
+Compare reading RecipeML input through Python file reads with memory-mapping it.
+
+Run with ``python -m benchmarks.bench_input_reading --sizes 1.4 100``. Every measurement
+runs in a fresh process so the reported peak RSS belongs to that reading mode only.
+"""
+
+import argparse
+import mmap
+import resource
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from lxml import etree as ET
+
+from benchmarks.synthetic import write_recipeml
+from recipe_xml_converter.helpers import map_file
+
+
+def parse_path(path: Path) -> int:
+    """Parse the file from its path the way the transformer used to."""
+    return len(ET.parse(path).getroot())
+
+
+def parse_file_object(path: Path) -> int:
+    """Parse the file from a Python file object, as uploaded files are parsed."""
+    with open(path, "rb") as file:
+        return len(ET.parse(file).getroot())
+
+
+def parse_mmap(path: Path) -> int:
+    """Parse the file from a read-only memory map of it."""
+    with map_file(path, min_size=0) as buffer:
+        assert isinstance(buffer, mmap.mmap)
+        return len(ET.fromstring(buffer))
+
+
+MODES: dict[str, Callable[[Path], int]] = {
+    "path": parse_path,
+    "file object": parse_file_object,
+    "mmap": parse_mmap,
+}
+
+
+def measure(mode: str, path: Path) -> tuple[float, int]:
+    """
+    Parse the file once with the given mode.
+
+    :return: the elapsed seconds and the peak RSS of the process in KB
+    """
+    start = time.perf_counter()
+    MODES[mode](path)
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def main() -> None:
+    """Run the benchmark and print a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1.4, 100.0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'size (MB)':>10} {'mode':>12} {'best (s)':>9} {'mean (s)':>9} {'peak RSS (MB)':>14}"
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        for size in args.sizes:
+            path = write_recipeml(
+                Path(work_dir) / f"{size}.xml", int(size * 1024 * 1024)
+            )
+            for mode in MODES:
+                results = []
+                for _ in range(args.repeat):
+                    with ProcessPoolExecutor(max_workers=1) as executor:
+                        results.append(executor.submit(measure, mode, path).result())
+                times = [elapsed for elapsed, _ in results]
+                rss = max(peak for _, peak in results) / 1024
+                print(
+                    f"{size:>10} {mode:>12} {min(times):>9.3f} "
+                    f"{statistics.mean(times):>9.3f} {rss:>14.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
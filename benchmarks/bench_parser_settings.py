@@ -0,0 +1,100 @@
+"""
+Measure how the input parser settings affect parse throughput and memory.
+
+Run with ``python -m benchmarks.bench_parser_settings --size 50``. Each setting is toggled
+on its own against the configured defaults, and a fresh parser per document is compared
+with the reused per-thread parser. Every measurement runs in a fresh process so the
+reported peak RSS belongs to that configuration only.
+"""
+
+import argparse
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Union
+
+from lxml import etree as ET
+
+from benchmarks.synthetic import write_recipeml
+from recipe_xml_converter.parsers import get_parser, parser_options
+
+VARIANTS: dict[str, dict[str, Union[bool, str]]] = {
+    "defaults": {},
+    "huge_tree": {"huge_tree": True},
+    "remove_blank_text": {"remove_blank_text": True},
+    "resolve_entities=True": {"resolve_entities": True},
+    "resolve_entities=False": {"resolve_entities": False},
+    "no_network=False": {"no_network": False},
+    "collect_ids=True": {"collect_ids": True},
+}
+
+
+def measure(
+    path: Path, overrides: dict[str, Union[bool, str]], repeat: int, reuse: bool
+) -> tuple[float, int]:
+    """
+    Parse the file several times with the given parser options.
+
+    :return: the best elapsed seconds and the peak RSS of the process in KB
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        parser = (
+            get_parser(**overrides)
+            if reuse
+            else ET.XMLParser(**parser_options(**overrides))
+        )
+        start = time.perf_counter()
+        ET.parse(path, parser)
+        best = min(best, time.perf_counter() - start)
+    return best, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def parse_many(path: Path, count: int, reuse: bool) -> float:
+    """
+    Parse the same small file many times in a row.
+
+    :return: the elapsed seconds
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        parser = get_parser() if reuse else ET.XMLParser(**parser_options())
+        ET.parse(path, parser)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """Run the benchmark and print a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=float, default=50.0, help="document size in MB")
+    parser.add_argument("--small-files", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = write_recipeml(
+            Path(work_dir) / "large.xml", int(args.size * 1024 * 1024)
+        )
+        print(f"{'settings':>24} {'MB/s':>8} {'peak RSS (MB)':>14}")
+        for name, overrides in VARIANTS.items():
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                best, rss = executor.submit(
+                    measure, path, overrides, args.repeat, True
+                ).result()
+            print(f"{name:>24} {args.size / best:>8.1f} {rss / 1024:>14.1f}")
+
+        small = write_recipeml(Path(work_dir) / "small.xml", 2048)
+        print(f"\n{'parser':>24} {'docs/s':>8}")
+        for reuse in (False, True):
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                elapsed = executor.submit(
+                    parse_many, small, args.small_files, reuse
+                ).result()
+            name = "reused per thread" if reuse else "new per document"
+            print(f"{name:>24} {args.small_files / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compare the compression methods, levels and threads of combined cookbooks in a zip archive.
+
+Run with ``python -m benchmarks.bench_zip_compression data/*.xml --levels 1 6 9 --threads 1 4``.
+A single thread lets zipfile compress the entries straight into the archive, more threads
+compress them with ParallelEntryWriter as the orchestrator does. Every
+file becomes one entry (repeated ``--copies`` times), each archive is checked with
+``testzip`` and, if it is installed, ``unzip -t``.
+"""
+
+import argparse
+import functools
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+from recipe_xml_converter.archive import (
+    COMPRESSION_METHODS,
+    ParallelEntryWriter,
+    ZipWriter,
+    copy_file,
+    open_entry,
+)
+
+
+def write_archive(
+    files: list[Path],
+    target: Path,
+    compression: str,
+    level: Optional[int],
+    threads: int,
+) -> float:
+    """
+    Write every file as an entry of a new archive.
+
+    :return: the elapsed seconds
+    """
+    start = time.perf_counter()
+    method = COMPRESSION_METHODS[compression]
+    with open(target, "w+b") as archive_file, ZipWriter(
+        archive_file, method, level
+    ) as writer:
+        if threads <= 1:
+            for i, file in enumerate(files):
+                with open_entry(
+                    writer.archive, f"{i + 1}.xml", file.stat().st_size
+                ) as entry:
+                    copy_file(file, entry)
+        else:
+            with ParallelEntryWriter(
+                writer, method, threads, level, target.parent
+            ) as parallel_writer:
+                for i, file in enumerate(files):
+                    parallel_writer.submit(
+                        f"{i + 1}.xml",
+                        functools.partial(copy_file, file),
+                        file.stat().st_size,
+                    )
+    return time.perf_counter() - start
+
+
+def check_archive(path: Path, compression: str) -> None:
+    """Fail if the archive isn't readable by zipfile or, for deflated entries, unzip."""
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None, f"corrupt entry in {path}"
+    if compression == "deflated" and shutil.which("unzip"):
+        subprocess.run(["unzip", "-tqq", str(path)], check=True)
+
+
+def main() -> None:
+    """Run the benchmark and print a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument(
+        "--compression", nargs="+", default=["deflated", "bzip2", "lzma"]
+    )
+    parser.add_argument("--levels", nargs="+", type=int, default=[])
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, os.cpu_count()])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files * args.copies
+    size = sum(file.stat().st_size for file in files)
+    print(f"{len(files)} entries, {size / 1024 / 1024:.1f} MB, {os.cpu_count()} CPUs")
+    print(
+        f"{'compression':>12} {'level':>8} {'threads':>8} {'best (s)':>9} "
+        f"{'mean (s)':>9} {'ratio':>6}"
+    )
+    with tempfile.TemporaryDirectory() as work_dir:
+        for compression in args.compression:
+            # lzma has no levels in zip archives
+            levels = args.levels if compression != "lzma" else []
+            for level in levels or [None]:
+                for threads in args.threads:
+                    target = Path(work_dir) / f"{compression}-{level}-{threads}.zip"
+                    times = [
+                        write_archive(files, target, compression, level, threads)
+                        for _ in range(args.repeat)
+                    ]
+                    check_archive(target, compression)
+                    print(
+                        f"{compression:>12} {level or 'default':>8} {threads:>8} "
+                        f"{min(times):>9.3f} {statistics.mean(times):>9.3f} "
+                        f"{target.stat().st_size / size:>6.3f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
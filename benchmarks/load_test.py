@@ -0,0 +1,333 @@
+"""
+Load-test the FastAPI service with concurrent uploads at increasing concurrency.
+
+Run with ``python -m benchmarks.load_test --concurrency 1 2 4 8 --requests 40``. Unless
+``--url`` points at a running server, the app is started with uvicorn in a separate process
+so its RSS can be sampled without the client's memory. Every upload combines the RecipeML
+files in ``data/`` with synthetic ones. The throughput, latency percentiles, error rate and
+peak server RSS of every level are printed and saved as JSON to ``--output`` so runs can
+be compared with ``--baseline``. The uploads repeat, so the API shares conversions between
+identical requests; ``--unique`` gives every request its own ``max_combined_files`` to
+measure conversions only.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from benchmarks.synthetic import write_recipeml
+from recipe_xml_converter.exceptions import InvalidInputException
+from recipe_xml_converter.validation import sniff_input
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def build_upload(files: list[Path], max_combined_files: int) -> tuple[bytes, str]:
+    """
+    Build the multipart form the frontend posts to the transform endpoint.
+
+    :return: the body and its content type
+    """
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="max_combined_files"'
+        f"\r\n\r\n{max_combined_files}\r\n".encode()
+    ]
+    for file in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="files"; '
+            f'filename="{file.name}"\r\nContent-Type: text/xml\r\n\r\n'.encode()
+            + file.read_bytes()
+            + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def recipeml_files(directory: Path) -> list[Path]:
+    """Return the RecipeML files in a directory, skipping files the API would reject."""
+    files = []
+    for path in sorted(directory.glob("*.xml")):
+        try:
+            with open(path, "rb") as file:
+                sniff_input(file, "recipeml")
+        except InvalidInputException:
+            continue
+        files.append(path)
+    return files
+
+
+def post(url: str, body: bytes, content_type: str) -> tuple[float, bool]:
+    """
+    Send one upload to the transform endpoint and read the whole response.
+
+    :return: the latency in seconds and whether the archive was returned
+    """
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(
+        parts.hostname or "127.0.0.1", parts.port, timeout=600
+    )
+    start = time.perf_counter()
+    try:
+        connection.request(
+            "POST",
+            "/api/transform/",
+            body,
+            {"Content-Type": content_type, "Content-Length": str(len(body))},
+        )
+        response = connection.getresponse()
+        response.read()
+        ok = response.status == 200
+    except OSError:
+        ok = False
+    finally:
+        connection.close()
+    return time.perf_counter() - start, ok
+
+
+def process_rss(pid: int) -> int:
+    """Return the RSS in KB of a process and all its descendants, such as worker processes."""
+    children: dict[int, list[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if entry.name.isdigit():
+            try:
+                parent = int((entry / "stat").read_text().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+            children.setdefault(parent, []).append(int(entry.name))
+
+    rss, pids = 0, [pid]
+    while pids:
+        current = pids.pop()
+        pids.extend(children.get(current, []))
+        try:
+            status = Path(f"/proc/{current}/status").read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith("VmRSS:"):
+                rss += int(line.split()[1])
+    return rss
+
+
+def run_level(
+    url: str,
+    uploads: list[tuple[bytes, str]],
+    concurrency: int,
+    requests: int,
+    server_pid: Optional[int],
+) -> dict[str, Any]:
+    """Send the requests with the given number of concurrent clients and summarize them."""
+    peak_rss = 0
+    done = threading.Event()
+
+    def sample_rss() -> None:
+        nonlocal peak_rss
+        while server_pid and not done.is_set():
+            peak_rss = max(peak_rss, process_rss(server_pid))
+            done.wait(0.05)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(
+            executor.map(
+                lambda i: post(url, *uploads[i % len(uploads)]), range(requests)
+            )
+        )
+    elapsed = time.perf_counter() - start
+    done.set()
+    sampler.join()
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    percentiles = (
+        statistics.quantiles(latencies, n=100, method="inclusive")
+        if len(latencies) > 1
+        else latencies * 99
+    )
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "throughput": len(latencies) / elapsed,
+        "p50": percentiles[49] if latencies else None,
+        "p95": percentiles[94] if latencies else None,
+        "p99": percentiles[98] if latencies else None,
+        "error_rate": 1 - len(latencies) / requests,
+        "peak_rss_mb": peak_rss / 1024 if server_pid else None,
+    }
+
+
+def start_server(port: int, env: Optional[dict[str, str]] = None) -> subprocess.Popen:
+    """
+    Start the app with uvicorn in a separate process and wait until it accepts connections.
+
+    :param env: settings to override in the environment of the server
+    """
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "recipe_xml_converter.api:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=Path(__file__).parent.parent,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("The server didn't start within 30 seconds")
+
+
+def free_port() -> int:
+    """Return a port nothing is listening on."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def compare(results: list[dict[str, Any]], baseline_path: Path) -> None:
+    """Print the change of throughput and p95 latency against an earlier run."""
+    baseline = {
+        level["concurrency"]: level
+        for level in json.loads(baseline_path.read_text())["levels"]
+    }
+    print(f"\nCompared to {baseline_path}:")
+    for level in results:
+        before = baseline.get(level["concurrency"])
+        if not before or not before["p95"] or not level["p95"]:
+            continue
+        print(
+            f"{level['concurrency']:>11} throughput {level['throughput'] / before['throughput']:>6.2f}x"
+            f"  p95 {level['p95'] / before['p95']:>6.2f}x"
+        )
+
+
+def main() -> None:
+    """Run the load test and print and save a table of the results."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--files-per-upload", type=int, default=2)
+    parser.add_argument("--synthetic-size", type=float, default=0.5, help="in MB")
+    parser.add_argument(
+        "--unique", action="store_true", help="make every request differ"
+    )
+    parser.add_argument("--url", help="a running server to test instead of a new one")
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--baseline", type=Path, help="an earlier result to compare to")
+    args = parser.parse_args()
+
+    server = None if args.url else start_server(port := free_port())
+    url = args.url or f"http://127.0.0.1:{port}"
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            synthetic = [
+                write_recipeml(
+                    Path(work_dir) / f"synthetic_{i}.xml",
+                    int(args.synthetic_size * 1024 * 1024),
+                )
+                for i in range(args.files_per_upload)
+            ]
+            files = recipeml_files(DATA_DIR) + synthetic
+            groups = [
+                files[i : i + args.files_per_upload]
+                for i in range(0, len(files), args.files_per_upload)
+            ]
+            uploads = [build_upload(group, 1000) for group in groups]
+
+            print(
+                f"{'concurrency':>11} {'req/s':>7} {'p50 (s)':>8} {'p95 (s)':>8} "
+                f"{'p99 (s)':>8} {'errors':>7} {'peak RSS (MB)':>14}"
+            )
+            results = []
+            for level_number, concurrency in enumerate(args.concurrency):
+                if args.unique:
+                    uploads = [
+                        build_upload(
+                            groups[i % len(groups)],
+                            1000 + level_number * args.requests + i,
+                        )
+                        for i in range(args.requests)
+                    ]
+                level = run_level(
+                    url,
+                    uploads,
+                    concurrency,
+                    args.requests,
+                    server.pid if server else None,
+                )
+                results.append(level)
+                print(
+                    f"{concurrency:>11} {level['throughput']:>7.2f} "
+                    + " ".join(
+                        f"{level[key]:>8.3f}" if level[key] is not None else f"{'-':>8}"
+                        for key in ("p50", "p95", "p99")
+                    )
+                    + f" {level['error_rate']:>7.1%} "
+                    + (
+                        f"{level['peak_rss_mb']:>14.1f}"
+                        if level["peak_rss_mb"] is not None
+                        else f"{'-':>14}"
+                    )
+                )
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    output = args.output or RESULTS_DIR / f"load_test_{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            {
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "commit": subprocess.run(
+                    ["git", "rev-parse", "--short", "HEAD"],
+                    capture_output=True,
+                    text=True,
+                ).stdout.strip(),
+                "cpus": os.cpu_count(),
+                "settings": vars(args)
+                | {
+                    "output": str(output),
+                    "baseline": str(args.baseline) if args.baseline else None,
+                },
+                "levels": results,
+            },
+            indent=2,
+        )
+    )
+    print(f"\nSaved the results to {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Soak-test the FastAPI service with thousands of conversions and check its memory stays flat.
+
+Run with ``python -m benchmarks.soak_test --requests 5000 --job-workers 2 --max-jobs 200``.
+The app is started with uvicorn in a separate process with the result cache disabled, and
+every request has its own ``max_combined_files``, so each one is converted. The RSS of the
+server and its worker processes is sampled every ``--sample-every`` requests; the test
+fails if it grew by more than ``--max-growth`` MB between the end of the ``--warmup``
+requests and the end of the run. Compare ``--job-workers 0`` (conversions in the server)
+to job workers recycled with ``--max-jobs`` or ``--max-rss``.
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.load_test import (
+    DATA_DIR,
+    build_upload,
+    free_port,
+    post,
+    process_rss,
+    recipeml_files,
+    start_server,
+)
+from benchmarks.synthetic import write_recipeml
+from recipe_xml_converter.workers import resident_memory
+
+
+def main() -> None:
+    """Run the soak test, print the memory samples and exit with 1 if memory grew."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--max-growth", type=float, default=20, help="in MB")
+    parser.add_argument("--synthetic-size", type=float, default=0.1, help="in MB")
+    parser.add_argument("--job-workers", type=int, default=0)
+    parser.add_argument("--max-jobs", type=int, default=0)
+    parser.add_argument("--max-rss", type=float, default=0, help="in MB")
+    args = parser.parse_args()
+
+    server = start_server(
+        port := free_port(),
+        {
+            "API_RESULT_CACHE_SIZE": "0",
+            "API_JOB_WORKERS": str(args.job_workers),
+            "WORKER_MAX_TASKS": str(args.max_jobs),
+            "WORKER_MAX_RSS": str(int(args.max_rss * 1024 * 1024)),
+        },
+    )
+    url = f"http://127.0.0.1:{port}"
+    samples: list[tuple[int, float, float]] = []
+    errors = 0
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            synthetic = write_recipeml(
+                Path(work_dir) / "synthetic.xml", int(args.synthetic_size * 1024 * 1024)
+            )
+            files = recipeml_files(DATA_DIR)[:2] + [synthetic]
+
+            print(f"{'requests':>9} {'total RSS (MB)':>15} {'server RSS (MB)':>16}")
+            with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+                for start in range(0, args.requests, args.sample_every):
+                    batch = range(start, min(start + args.sample_every, args.requests))
+                    results = executor.map(
+                        lambda i: post(url, *build_upload(files, 1000 + i)), batch
+                    )
+                    errors += sum(1 for _, ok in results if not ok)
+                    samples.append(
+                        (
+                            batch[-1] + 1,
+                            process_rss(server.pid) / 1024,
+                            (resident_memory(server.pid) or 0) / 1024 / 1024,
+                        )
+                    )
+                    print(
+                        f"{samples[-1][0]:>9} {samples[-1][1]:>15.1f} {samples[-1][2]:>16.1f}"
+                    )
+    finally:
+        server.terminate()
+        server.wait()
+
+    settled = [sample for sample in samples if sample[0] >= args.warmup] or samples
+    growth = statistics.median([rss for _, rss, _ in settled[-3:]]) - settled[0][1]
+    slope = (
+        statistics.linear_regression(
+            [requests for requests, _, _ in settled], [rss for _, rss, _ in settled]
+        ).slope
+        if len(settled) > 1
+        else 0.0
+    )
+    print(
+        f"\n{errors} errors, {growth:+.1f} MB after the warm-up "
+        f"({slope * 1000:+.2f} MB per 1000 requests)"
+    )
+    if errors or growth > args.max_growth:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
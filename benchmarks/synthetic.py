@@ -0,0 +1,50 @@
+"""Generators of synthetic RecipeML documents for the benchmarks."""
+
+from pathlib import Path
+
+RECIPE = """  <recipe>
+    <head>
+      <title>Synthetic Recipe {i}</title>
+      <categories><cat>Category {category}</cat><cat>Synthetic</cat></categories>
+      <yield>4</yield>
+    </head>
+    <ingredients>
+      <ing><amt><qty>1 1/2</qty><unit>cups</unit></amt><item>flour</item></ing>
+      <ing><amt><qty>2</qty><unit>tablespoons</unit></amt><item>sugar</item></ing>
+      <ing><amt><qty>1</qty></amt><item>egg</item><prep>beaten</prep></ing>
+    </ingredients>
+    <directions>
+      <step>Mix the flour and the sugar in a large bowl.</step>
+      <step>Add the egg and stir until smooth. Bake for 20 minutes.</step>
+    </directions>
+  </recipe>
+"""
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<recipeml version="0.5">
+  <meta name="DC.Creator" content="Synthetic Generator"/>
+  <meta name="DC.Source" content="benchmarks"/>
+"""
+
+FOOTER = "</recipeml>\n"
+
+
+def write_recipeml(path: Path, size: int) -> Path:
+    """
+    Write a synthetic RecipeML document of roughly the given size.
+
+    :param path: the full path to the file to create
+    :param size: the approximate size of the document in bytes
+    :return: the full path to the created file
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(HEADER)
+        written, i = len(HEADER), 0
+        while written < size:
+            recipe = RECIPE.format(i=i, category=i % 20)
+            file.write(recipe)
+            written += len(recipe)
+            i += 1
+        file.write(FOOTER)
+    return path
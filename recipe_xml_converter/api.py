@@ -1,19 +1,231 @@
-import tempfile
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
 from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Optional, Union
 
 import uvicorn
-from fastapi import FastAPI, Form, UploadFile
+from fastapi import FastAPI, Form, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from starlette.background import BackgroundTasks
-from starlette.responses import FileResponse, RedirectResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import (
+    FileResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.types import Receive, Scope, Send
 
 from recipe_xml_converter import config
-from recipe_xml_converter.helpers import setup_logging
+from recipe_xml_converter.diagnostics import AllocationTracer
+from recipe_xml_converter.exceptions import (
+    InvalidInputException,
+    ScratchSpaceException,
+)
+from recipe_xml_converter.helpers import get_file_size, setup_logging
+from recipe_xml_converter.inputs import ArchiveMember, is_bundle, list_members
 from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.results import RecentResults, hash_file
+from recipe_xml_converter.scratch import Janitor, ScratchDir, ScratchSpace
+from recipe_xml_converter.transformer import warm_start
+from recipe_xml_converter.workers import JobWorkers, report_progress, resident_memory
 
 setup_logging()
 
+PROFILE_HEADER_TEMPLATES = 10
+"""The number of the slowest templates returned in the profile header."""
+PROGRESS_KEEP_ALIVE = 15
+"""The seconds after which a quiet progress stream gets a comment, so proxies keep it open."""
+PROGRESS_RETENTION = 60
+"""The seconds the progress of a finished job is kept for clients connecting late."""
+
+
+class _JobProgress:
+    """The progress events of a job, kept for the clients following it."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        """
+        Create the progress of a job without events.
+
+        :param loop: the event loop of the server
+        """
+        self.events: list[dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.finished = False
+        self.started = False
+        self.followers = 0
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    def publish(self, event: dict[str, Any]) -> None:
+        """
+        Add an event, from any thread.
+
+        :param event: the progress event
+        """
+        self._loop.call_soon_threadsafe(self._add, event)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        """
+        End the events after those published so far, on the thread of the event loop.
+
+        :param error: the reason the job failed or None if it succeeded
+        """
+        self._loop.call_soon(self._end, error)
+
+    async def follow(
+        self, keep_alive: float
+    ) -> AsyncIterator[Optional[dict[str, Any]]]:
+        """
+        Stream all events of the job, from the first one, until it finished.
+
+        :param keep_alive: the seconds to wait for an event before yielding None
+        :return: an iterator of the events or None if none arrived in time
+        """
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.finished:
+                return
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), keep_alive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def _add(self, event: dict[str, Any]) -> None:
+        """Add an event unless the job finished and wake the followers."""
+        if not self.finished:
+            self.events.append(event)
+            self._changed.set()
+
+    def _end(self, error: Optional[str]) -> None:
+        """Mark the job as finished and wake the followers."""
+        self.error = error
+        self.finished = True
+        self._changed.set()
+
+
+class _ConversionProgress:
+    """Relays the progress events of a conversion to the jobs waiting for it."""
+
+    def __init__(self) -> None:
+        """Create a relay without jobs."""
+        self._jobs: list[_JobProgress] = []
+        self._latest: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: dict[str, Any]) -> None:
+        """Relay an event of the conversion, on the thread converting."""
+        with self._lock:
+            self._latest[event["stage"]] = event
+            for job in self._jobs:
+                job.publish(event)
+
+    def attach(self, job: _JobProgress) -> None:
+        """
+        Relay the events of the conversion to a job, starting with the latest of every stage.
+
+        :param job: the progress of the job
+        """
+        with self._lock:
+            self._jobs.append(job)
+            for event in self._latest.values():
+                job.publish(event)
+
+
+class _SharedArchive:
+    """
+    An archive too large for the result cache, sent from the job directory that created it.
+
+    Every request that waited for the conversion sends it, and the last one to finish
+    removes the directory.
+    """
+
+    def __init__(self, scratch_dir: ScratchDir, path: Path) -> None:
+        """
+        Keep the archive of a finished conversion for a single response.
+
+        :param scratch_dir: the job directory of the conversion
+        :param path: the full path to the archive in it
+        """
+        self.path = path
+        self._scratch_dir = scratch_dir
+        self._users = 1
+
+    def share(self, users: int) -> None:
+        """
+        Hand the archive to the requests that waited for its conversion.
+
+        :param users: the number of waiting requests, each of which releases it once
+        """
+        self._users = users
+        if not self._users:
+            self._scratch_dir.cleanup()
+
+    def release(self) -> None:
+        """Remove the job directory once no response sends the archive anymore."""
+        self._users -= 1
+        if not self._users:
+            self._scratch_dir.cleanup()
+
+
+class _ArchiveResponse(FileResponse):
+    """Sends a shared archive and releases it once it is sent or the client went away."""
+
+    def __init__(
+        self, archive: _SharedArchive, headers: Optional[dict[str, str]] = None
+    ) -> None:
+        """
+        Prepare the response.
+
+        :param archive: the archive to send
+        :param headers: the additional headers of the response
+        """
+        super().__init__(archive.path, headers=headers, media_type="application/zip")
+        self._archive = archive
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Send the archive."""
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._archive.release()
+
+
+class _Conversion:
+    """A running conversion shared by identical requests."""
+
+    def __init__(self, future: asyncio.Future, progress: _ConversionProgress) -> None:
+        """
+        Track a conversion nobody waits for yet.
+
+        :param future: the future of the archive and the timings of the conversion
+        :param progress: the relay of its progress events
+        """
+        self.future = future
+        self.progress = progress
+        self.waiters = 0
+
+
+_jobs: dict[str, _JobProgress] = {}
+"""The progress of the running and recently finished jobs by their ID."""
+_in_flight: dict[str, _Conversion] = {}
+"""The running conversions and their progress by the hash of their request."""
+_recent_results = RecentResults(
+    config.API_RESULT_CACHE_SIZE, config.API_RESULT_CACHE_TTL
+)
+"""The archives of recently answered requests by the hash of the request."""
+
+
 app = FastAPI()
 """The FastAPI app to use for the HTTP requests."""
 
@@ -32,6 +244,60 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def preload_stylesheets() -> None:
+    """Compile all stylesheets when the server starts if warm start is enabled."""
+    if config.WARM_START:
+        warm_start()
+
+
+@app.on_event("startup")
+def start_janitor() -> None:
+    """Remove the job directories of crashed servers now and keep doing so periodically."""
+    app.state.janitor = Janitor(
+        ScratchSpace.from_config(), config.SCRATCH_JANITOR_INTERVAL
+    )
+    app.state.janitor.start()
+
+
+@app.on_event("shutdown")
+def stop_janitor() -> None:
+    """Stop removing abandoned job directories."""
+    app.state.janitor.stop()
+
+
+@app.on_event("startup")
+def start_job_workers() -> None:
+    """Start converting in worker processes instead of the server if configured."""
+    app.state.job_workers = (
+        JobWorkers(config.API_JOB_WORKERS) if config.API_JOB_WORKERS else None
+    )
+
+
+@app.on_event("shutdown")
+def stop_job_workers() -> None:
+    """Stop the worker processes."""
+    if app.state.job_workers is not None:
+        app.state.job_workers.close()
+
+
+@app.on_event("startup")
+def start_tracing() -> None:
+    """Trace the allocations of the server for the memory diagnostics if configured."""
+    app.state.tracer = (
+        AllocationTracer(config.TRACEMALLOC_FRAMES)
+        if config.TRACEMALLOC_FRAMES
+        else None
+    )
+
+
+@app.on_event("shutdown")
+def stop_tracing() -> None:
+    """Stop tracing the allocations of the server."""
+    if app.state.tracer is not None:
+        app.state.tracer.stop()
+
+
 @app.get("/")
 async def homepage() -> RedirectResponse:
     """Redirect to the homepage."""
@@ -41,29 +307,467 @@ async def homepage() -> RedirectResponse:
 @app.post("/api/transform/")
 async def transform_recipes(
     files: list[UploadFile],
-    background_tasks: BackgroundTasks,
     max_combined_files: int = Form(),
-) -> FileResponse:
+    output_format: str = Form(default="xml"),
+    profile: bool = Form(default=False),
+    job_id: Optional[str] = Form(default=None),
+) -> Response:
     """
     Transform RecipeML files to MyCookbook XML ones and return a zip containing the results.
 
+    Identical requests arriving while one is converted wait for its archive, and those
+    arriving shortly after get the archive of the last one, instead of converting the same
+    files again. Archives larger than the result cache are sent from the scratch space
+    rather than memory. The progress of a request with a job ID is streamed by job_progress.
+
     :param files: the RecipeML files
-    :param background_tasks: tasks to run after the response is returned
     :param max_combined_files: the maximum number of files to combine in one
+    :param output_format: xml to combine the recipes into MyCookbook XML files, or jsonl or parquet to export them
+    :param profile: whether to return the slowest stylesheet templates in the X-XSLT-Profile
+        header, only in debug mode
+    :param job_id: an ID chosen by the client to follow the progress of the request with
     :return: a zip file containing all the transformed MyCookbook XML files
     """
-    temp_dir = tempfile.TemporaryDirectory(dir=config.BASE_DATA_DIR)
-    background_tasks.add_task(lambda d: d.cleanup(), temp_dir)
+    if profile and not config.DEBUG:
+        raise HTTPException(
+            status_code=403, detail="Profiling is only available in debug mode"
+        )
 
-    orchestrator = RecipeOrchestrator(
-        tuple([f.file for f in files]), Path(temp_dir.name), max_combined_files
-    )
-    return FileResponse(
-        orchestrator.orchestrate(),
-        media_type="application/zip",
+    job = _start_job(job_id) if job_id else None
+    error: Optional[str] = "The conversion failed"
+    try:
+        convert = functools.partial(
+            _convert,
+            max_combined_files=max_combined_files,
+            output_format=output_format,
+            profile=profile,
+        )
+        if profile:
+            # the timings belong to a single run, so profiled requests are never shared
+            progress = _ConversionProgress()
+            if job is not None:
+                progress.attach(job)
+            scratch_dir, input_files = await _save_uploads(files)
+            archive, timings = await run_in_threadpool(
+                convert, scratch_dir, input_files, on_progress=progress
+            )
+            error = None
+            return _archive_response(
+                archive,
+                {"X-XSLT-Profile": json.dumps(timings[:PROFILE_HEADER_TEMPLATES])},
+            )
+
+        key = await run_in_threadpool(
+            _request_key, files, max_combined_files, output_format
+        )
+        content: Union[bytes, _SharedArchive, None] = _recent_results.get(key)
+        if content is None:
+            content = await _coalesce(key, files, convert, job)
+        error = None
+        return _archive_response(content)
+    except HTTPException as e:
+        error = str(e.detail)
+        raise
+    finally:
+        if job is not None and job_id is not None:
+            _finish_job(job_id, job, error)
+
+
+@app.get("/api/progress/{job_id}")
+async def job_progress(job_id: str) -> StreamingResponse:
+    """
+    Stream the progress of a request as Server-Sent Events, so clients don't have to poll.
+
+    The stream can be opened before the request is sent. Every event is a JSON object of
+    the stage, the number of done and total items, the bytes of the done items, the number
+    of items that failed and whether the stage finished. The stream ends with an end event
+    holding the error of a failed request.
+
+    :param job_id: the job ID sent with the request
+    :return: the event stream
+    """
+    job = _jobs.get(job_id)
+    if job is None:
+        job = _jobs[job_id] = _JobProgress(asyncio.get_running_loop())
+    return StreamingResponse(
+        _stream_progress(job_id, job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
     )
 
 
+@app.get("/api/debug/memory")
+async def memory_diagnostics(limit: int = 20) -> dict[str, Any]:
+    """
+    Report the memory of the server and its workers and the fastest growing allocation sites.
+
+    Only available with TRACEMALLOC_FRAMES set, since tracing slows every allocation down.
+
+    :param limit: the number of allocation sites to return
+    :return: the resident bytes of the server, the traced bytes, the allocation sites that
+        grew the most since the server started and the jobs and resident bytes of every
+        worker process
+    """
+    tracer: Optional[AllocationTracer] = getattr(app.state, "tracer", None)
+    if tracer is None:
+        raise HTTPException(
+            status_code=404, detail="Set TRACEMALLOC_FRAMES to trace allocations"
+        )
+
+    job_workers: Optional[JobWorkers] = getattr(app.state, "job_workers", None)
+    return {
+        "rss": resident_memory(os.getpid()),
+        "traced": tracer.traced_memory(),
+        "allocations": await run_in_threadpool(tracer.top, limit),
+        "workers": job_workers.stats() if job_workers is not None else [],
+        "recycled_workers": job_workers.recycled if job_workers is not None else 0,
+    }
+
+
+def _start_job(job_id: str) -> _JobProgress:
+    """
+    Return the progress of a new job, which clients may be following already.
+
+    :param job_id: the job ID sent with the request
+    :return: the progress of the job
+    """
+    job = _jobs.get(job_id)
+    if job is None or job.started:
+        job = _jobs[job_id] = _JobProgress(asyncio.get_running_loop())
+    job.started = True
+    return job
+
+
+def _finish_job(job_id: str, job: _JobProgress, error: Optional[str]) -> None:
+    """
+    End the progress of a job and forget it once clients connecting late had their chance.
+
+    :param job_id: the job ID sent with the request
+    :param job: the progress of the job
+    :param error: the reason the job failed or None if it succeeded
+    """
+    job.finish(error)
+    asyncio.get_running_loop().call_later(PROGRESS_RETENTION, _forget_job, job_id, job)
+
+
+def _forget_job(job_id: str, job: _JobProgress) -> None:
+    """Forget the progress of a job unless a new job took over its ID."""
+    if _jobs.get(job_id) is job:
+        del _jobs[job_id]
+
+
+async def _stream_progress(job_id: str, job: _JobProgress) -> AsyncIterator[str]:
+    """
+    Format the progress events of a job as Server-Sent Events.
+
+    :param job_id: the job ID sent with the request
+    :param job: the progress of the job
+    :return: an iterator of the messages
+    """
+    job.followers += 1
+    try:
+        async for event in job.follow(PROGRESS_KEEP_ALIVE):
+            yield (
+                ": keep-alive\n\n"
+                if event is None
+                else f"data: {json.dumps(event)}\n\n"
+            )
+        yield f"event: end\ndata: {json.dumps({'error': job.error})}\n\n"
+    finally:
+        job.followers -= 1
+        # a job that was never requested is forgotten once nobody waits for it
+        if not job.started and not job.followers:
+            _forget_job(job_id, job)
+
+
+def _request_key(
+    files: list[UploadFile], max_combined_files: int, output_format: str
+) -> str:
+    """
+    Return a hash of the uploaded files and the settings of a request.
+
+    :param files: the uploaded files, which are rewound afterwards
+    :param max_combined_files: the maximum number of files to combine in one
+    :param output_format: the format of the files in the archive
+    :return: the hex digest
+    """
+    digest = hashlib.sha256(json.dumps([max_combined_files, output_format]).encode())
+    for upload in files:
+        digest.update((upload.filename or "").encode() + b"\0")
+        digest.update(hash_file(upload.file).encode())
+    return digest.hexdigest()
+
+
+async def _coalesce(
+    key: str,
+    files: list[UploadFile],
+    convert: Callable[..., tuple[Union[bytes, _SharedArchive], list[dict[str, Any]]]],
+    job: Optional[_JobProgress] = None,
+) -> Union[bytes, _SharedArchive]:
+    """
+    Convert the files of a request unless an identical request is converted already.
+
+    The conversion works on copies of the uploads in its own job directory, as the uploads
+    of the request starting it are closed if that request is cancelled before the others.
+
+    :param key: the hash of the request
+    :param files: the uploaded files
+    :param convert: the function converting the saved uploads in a job directory,
+        reporting its progress to the function passed as on_progress
+    :param job: the progress of the job of the request or None if nobody follows it
+    :return: the content of the archive or the archive to send, which the caller must
+        release
+    """
+    conversion = _in_flight.get(key)
+    if conversion is None:
+        scratch_dir, input_files = await _save_uploads(files)
+        conversion = _in_flight.get(key)
+        if conversion is not None:
+            # an identical request started converting while the uploads were saved
+            scratch_dir.cleanup()
+        else:
+            progress = _ConversionProgress()
+            conversion = _Conversion(
+                asyncio.ensure_future(
+                    run_in_threadpool(
+                        convert, scratch_dir, input_files, on_progress=progress
+                    )
+                ),
+                progress,
+            )
+            _in_flight[key] = conversion
+            conversion.future.add_done_callback(
+                functools.partial(_finish_conversion, key)
+            )
+    if job is not None:
+        conversion.progress.attach(job)
+    conversion.waiters += 1
+    try:
+        # a waiting request that is cancelled mustn't cancel the conversion of the others
+        content, _ = await asyncio.shield(conversion.future)
+    except asyncio.CancelledError:
+        if _in_flight.get(key) is conversion:
+            conversion.waiters -= 1
+        elif not conversion.future.cancelled() and isinstance(
+            conversion.future.result()[0], _SharedArchive
+        ):
+            # the archive was handed to this request before it was cancelled
+            conversion.future.result()[0].release()
+        raise
+    return content
+
+
+def _finish_conversion(key: str, future: asyncio.Future) -> None:
+    """
+    Hand the archive of a finished conversion to the requests waiting for it.
+
+    Archives that fit into the result cache are kept for requests arriving shortly after.
+
+    :param key: the hash of the request
+    :param future: the finished conversion
+    """
+    conversion = _in_flight.pop(key)
+    if future.cancelled() or future.exception() is not None:
+        return
+    content = future.result()[0]
+    if isinstance(content, _SharedArchive):
+        content.share(conversion.waiters)
+    else:
+        _recent_results.put(key, content)
+
+
+def _archive_response(
+    content: Union[bytes, _SharedArchive], headers: Optional[dict[str, str]] = None
+) -> Response:
+    """
+    Return the response sending an archive from memory or from the scratch space.
+
+    :param content: the content of the archive or the archive to send
+    :param headers: the additional headers of the response
+    :return: the response
+    """
+    if isinstance(content, _SharedArchive):
+        return _ArchiveResponse(content, headers)
+    return Response(content, media_type="application/zip", headers=headers)
+
+
+async def _save_uploads(
+    files: list[UploadFile],
+) -> tuple[ScratchDir, tuple[Union[Path, ArchiveMember], ...]]:
+    """
+    Copy the uploaded files into a new job directory, so a conversion doesn't depend on them.
+
+    A request cancelled while the files are copied leaves no job directory behind.
+
+    :param files: the uploaded files
+    :return: the job directory and the saved files or the members of the saved archives
+    :raises HTTPException: if the files don't fit into the scratch space
+    """
+    saving = asyncio.ensure_future(run_in_threadpool(_save_files, files))
+    try:
+        return await asyncio.shield(saving)
+    except asyncio.CancelledError:
+        saving.add_done_callback(_discard_uploads)
+        raise
+
+
+def _save_files(
+    files: list[UploadFile],
+) -> tuple[ScratchDir, tuple[Union[Path, ArchiveMember], ...]]:
+    """
+    Copy the uploaded files into a new job directory.
+
+    :param files: the uploaded files
+    :return: the job directory and the saved files or the members of the saved archives
+    :raises HTTPException: if the files don't fit into the scratch space
+    """
+    try:
+        # the directory holds the uploads and the archive of about the same size
+        scratch_dir = ScratchSpace.from_config().create(
+            2 * sum([get_file_size(upload.file) for upload in files])
+        )
+    except ScratchSpaceException as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    try:
+        input_files = tuple(
+            [
+                input_file
+                for upload in files
+                for input_file in _save_upload(upload, scratch_dir.path)
+            ]
+        )
+    except BaseException:
+        scratch_dir.cleanup()
+        raise
+    return scratch_dir, input_files
+
+
+def _discard_uploads(future: asyncio.Future) -> None:
+    """
+    Remove the job directory of uploads saved for a request that was cancelled meanwhile.
+
+    :param future: the finished copying of the uploads
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result()[0].cleanup()
+
+
+def _convert(
+    scratch_dir: ScratchDir,
+    input_files: tuple[Union[Path, ArchiveMember], ...],
+    max_combined_files: int,
+    output_format: str,
+    profile: bool,
+    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+) -> tuple[Union[bytes, _SharedArchive], list[dict[str, Any]]]:
+    """
+    Convert the saved uploads in their job directory.
+
+    With API_JOB_WORKERS, the files are converted in one of the job worker processes, so
+    the memory the conversion leaves behind doesn't build up in the server. Archives up to
+    API_RESULT_CACHE_SIZE bytes are read into memory and the job directory is removed,
+    larger ones stay in the job directory until they are sent.
+
+    :param scratch_dir: the job directory holding the saved uploads
+    :param input_files: the saved files or the members of the saved archives
+    :param max_combined_files: the maximum number of files to combine in one
+    :param output_format: the format of the files in the archive
+    :param profile: whether to collect the timings of the stylesheet templates
+    :param on_progress: the function called with every progress event of the conversion
+    :return: the content of the archive or the archive to send, and the timings of the
+        slowest templates first
+    :raises HTTPException: if the request is invalid or doesn't fit into the scratch space
+    """
+    job_workers: Optional[JobWorkers] = getattr(app.state, "job_workers", None)
+    work_dir = scratch_dir.path
+    shared: Optional[_SharedArchive] = None
+    try:
+        try:
+            args = (input_files, work_dir, max_combined_files, output_format, profile)
+            if job_workers is not None:
+                # the events of the worker process are relayed through the pipe
+                archive_path, timings = job_workers.run(
+                    _convert_files,
+                    *args,
+                    report_progress if on_progress else None,
+                    on_progress=on_progress,
+                )
+            else:
+                archive_path, timings = _convert_files(*args, on_progress)
+        except InvalidInputException as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except ScratchSpaceException as e:
+            raise HTTPException(status_code=507, detail=str(e))
+
+        if archive_path.stat().st_size <= config.API_RESULT_CACHE_SIZE:
+            return archive_path.read_bytes(), timings
+        # the job directory is removed by the responses sending the archive instead
+        shared = _SharedArchive(scratch_dir, archive_path)
+        return shared, timings
+    finally:
+        if shared is None:
+            scratch_dir.cleanup()
+
+
+def _convert_files(
+    input_files: tuple[Union[Path, ArchiveMember], ...],
+    work_dir: Path,
+    max_combined_files: int,
+    output_format: str,
+    profile: bool,
+    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+) -> tuple[Path, list[dict[str, Any]]]:
+    """
+    Convert the files of a request, in the server or in a job worker process.
+
+    :param input_files: the saved uploads or the members of the saved archives
+    :param work_dir: the full path to the directory of the request
+    :param max_combined_files: the maximum number of files to combine in one
+    :param output_format: the format of the files in the archive
+    :param profile: whether to collect the timings of the stylesheet templates
+    :param on_progress: the function called with every progress event of the conversion
+    :return: the full path to the archive and the timings of the slowest templates first
+    :raises InvalidInputException: if the settings of the request are invalid
+    :raises ScratchSpaceException: if the job outgrows its scratch space
+    """
+    try:
+        orchestrator = RecipeOrchestrator(
+            input_files,
+            work_dir,
+            max_combined_files,
+            output_format=output_format,
+            profile=profile,
+        )
+    except ValueError as e:
+        raise InvalidInputException(str(e)) from e
+    if on_progress is not None:
+        orchestrator.progress.subscribe(on_progress)
+    return orchestrator.orchestrate(), orchestrator.profile
+
+
+def _save_upload(
+    upload: UploadFile, work_dir: Path
+) -> tuple[Union[Path, ArchiveMember], ...]:
+    """
+    Save an upload to the work directory and return its input files.
+
+    Archives are saved as they are, so their members can be read without extracting them.
+
+    :param upload: the uploaded file
+    :param work_dir: the full path to the directory of the request
+    :return: the saved copy or the members of the saved archive
+    """
+    name = Path(upload.filename or "")
+    saved_path = work_dir / "uploads" / (name.name or "upload.xml")
+    if saved_path.exists():
+        # uploads of the same name are kept apart in folders of their own
+        saved_path = saved_path.parent / str(uuid.uuid4()) / saved_path.name
+    saved_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(saved_path, "wb") as saved:
+        shutil.copyfileobj(upload.file, saved)
+    return list_members(saved_path) if is_bundle(name) else (saved_path,)
+
+
 def start_server() -> None:
     """Start the uvicorn server."""
     uvicorn.run(app, host="0.0.0.0", port=8000)
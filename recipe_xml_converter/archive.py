@@ -0,0 +1,667 @@
+import hashlib
+import json
+import mmap
+import re
+import shutil
+import struct
+import tempfile
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Callable, Optional, Union, cast
+
+from lxml import etree as ET
+
+from recipe_xml_converter.exceptions import TransformerException
+
+REPORT_NAME = "report.json"
+"""The name of the archive entry holding the report of the files transformed into it."""
+MANIFEST_NAME = "manifest.json"
+"""The name of the archive entry listing how many input files each combined entry holds."""
+INDEX_NAME = "index.json"
+"""The name of the archive entry locating every recipe in the combined entries."""
+
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+"""The zip compression methods of the combined entries by name."""
+ENTRY_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+"""The modification time of every archive entry, so identical jobs create identical archives."""
+
+_RECIPE = re.compile(rb"<recipe(?:\s[^>]*)?(?:/>|>.*?</recipe>)", re.DOTALL)
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_END = struct.Struct("<4s4H2LH")
+_ZIP64_END = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_EXTRA_ID = 0x0001
+_DATA_DESCRIPTOR_FLAG = 0x08
+_DATA_DESCRIPTOR_SIGNATURE = b"PK\x07\x08"
+_UTF8_FLAG = 0x800
+
+
+def write_entry(
+    archive: zipfile.ZipFile, name: str, content: Union[Path, bytes, str]
+) -> None:
+    """
+    Add an entry to an archive with the same metadata whenever it is created.
+
+    :param archive: the archive opened for writing
+    :param name: the name of the entry
+    :param content: the full path to the file to add or the content of the entry
+    """
+    if not isinstance(content, Path):
+        archive.writestr(_entry_info(name), content)
+        return
+
+    with open_entry(archive, name, content.stat().st_size) as target:
+        copy_file(content, target)
+
+
+def copy_file(file: Path, target: IO[bytes]) -> None:
+    """
+    Copy the content of a file to a stream such as an archive entry.
+
+    :param file: the full path to the file
+    :param target: the stream to write to
+    """
+    with open(file, "rb") as source:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+
+def open_entry(archive: zipfile.ZipFile, name: str, max_size: int) -> IO[bytes]:
+    """
+    Open a new entry of an archive to write its content as a stream.
+
+    The entry is compressed with the method and level the archive was opened with and dated
+    ENTRY_TIMESTAMP, zipfile's default for entries opened by name.
+
+    :param archive: the archive opened for writing
+    :param name: the name of the entry
+    :param max_size: the number of bytes the entry won't exceed, so large entries can be
+        stored in the zip64 format
+    :return: the stream of the entry, which the caller must close
+    """
+    return archive.open(name, "w", force_zip64=max_size >= zipfile.ZIP64_LIMIT)
+
+
+class ZipWriter:
+    """
+    Writes a zip archive from members compressed elsewhere, then entries added by zipfile.
+
+    zipfile only adds entries it compresses itself, so members compressed on other threads or
+    kept from another archive are copied as they are: their local header and data verbatim,
+    followed by a central directory listing them at their new offsets. The archive property
+    writes that central directory and hands the archive to zipfile in append mode, which adds
+    the remaining entries and writes the central directory again when the writer is closed.
+    """
+
+    def __init__(
+        self,
+        target: IO[bytes],
+        compression: int = zipfile.ZIP_STORED,
+        level: Optional[int] = None,
+    ) -> None:
+        """
+        Start an empty archive.
+
+        :param target: the empty file of the archive, opened for reading and writing
+        :param compression: the zip compression method of the entries added by zipfile
+        :param level: the compression level or None for the default of the method
+        """
+        self._target = target
+        self._compression = compression
+        self._level = level
+        self._members: list[tuple[zipfile.ZipInfo, int]] = []
+        self._archive: Optional[zipfile.ZipFile] = None
+
+    def __enter__(self) -> "ZipWriter":
+        """Return the writer to use in a with statement."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Finish the archive when leaving the with statement."""
+        self.close()
+
+    def copy_member(self, source: IO[bytes], info: zipfile.ZipInfo) -> None:
+        """
+        Add a member of another archive without decompressing it.
+
+        :param source: the file of the other archive
+        :param info: the metadata of the member as zipfile read it from that archive
+        :raises TransformerException: if the member doesn't start with a local header or
+            entries were added by zipfile already
+        """
+        if self._archive is not None:
+            raise TransformerException("Members can't follow the entries of zipfile")
+
+        source.seek(info.header_offset)
+        header = source.read(_LOCAL_HEADER.size)
+        if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_HEADER_SIGNATURE:
+            raise TransformerException(f"Bad local header of {info.filename}")
+        name_length, extra_length = _LOCAL_HEADER.unpack(header)[-2:]
+        name_and_extra = source.read(name_length + extra_length)
+        offset = self._target.tell()
+        self._target.write(header + name_and_extra)
+        _copy_bytes(source, self._target, info.compress_size)
+        if info.flag_bits & _DATA_DESCRIPTOR_FLAG:
+            # the data is followed by its CRC and sizes, 8 bytes each in the zip64 format
+            sizes_length = 16 if _has_zip64_extra(name_and_extra[name_length:]) else 8
+            # the signature of the data descriptor is optional, otherwise it starts with the CRC
+            signature = source.read(4)
+            self._target.write(signature)
+            _copy_bytes(
+                source,
+                self._target,
+                sizes_length + (4 if signature == _DATA_DESCRIPTOR_SIGNATURE else 0),
+            )
+        self._members.append((info, offset))
+
+    @property
+    def archive(self) -> zipfile.ZipFile:
+        """The archive opened by zipfile to add entries after the copied members."""
+        if self._archive is None:
+            self._write_central_directory()
+            self._archive = zipfile.ZipFile(
+                self._target,
+                "a",
+                compression=self._compression,
+                compresslevel=self._level,
+            )
+        return self._archive
+
+    def close(self) -> None:
+        """Write the central directory of the archive, which may be done more than once."""
+        self.archive.close()
+
+    def _write_central_directory(self) -> None:
+        """Write the central directory of the copied members and the end records."""
+        start = self._target.tell()
+        for info, offset in self._members:
+            self._target.write(_central_header(info, offset))
+        size = self._target.tell() - start
+        count = len(self._members)
+        if count >= 0xFFFF or start > zipfile.ZIP64_LIMIT or size > zipfile.ZIP64_LIMIT:
+            end = self._target.tell()
+            self._target.write(
+                _ZIP64_END.pack(
+                    b"PK\x06\x06", 44, 45, 45, 0, 0, count, count, size, start
+                )
+                + _ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, end, 1)
+            )
+            count, size, start = 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF
+        self._target.write(_END.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+
+
+class ParallelEntryWriter:
+    """
+    Compresses archive entries on several threads and adds them to an archive in order.
+
+    zlib, bz2 and lzma release the GIL, so every entry is written by zipfile into an archive
+    of its own on one of the threads, and its member is copied to the target as it is. At
+    most two entries per thread are pending at a time, each kept in memory up to SPOOL_SIZE
+    bytes and on disk beyond.
+    """
+
+    SPOOL_SIZE = 16 * 1024 * 1024
+    """The bytes of a compressed entry kept in memory before it is moved to disk."""
+
+    def __init__(
+        self,
+        writer: ZipWriter,
+        compression: int,
+        threads: int,
+        level: Optional[int] = None,
+        spool_dir: Optional[Path] = None,
+    ) -> None:
+        """
+        Prepare the threads compressing the entries.
+
+        :param writer: the archive the members are added to
+        :param compression: the zip compression method of the entries
+        :param threads: the number of threads compressing entries
+        :param level: the compression level or None for the default of the method
+        :param spool_dir: the full path to the directory of compressed entries too large to
+            keep in memory, or None for the temporary directory
+        """
+        self._writer = writer
+        self._compression = compression
+        self._level = level
+        self._spool_dir = str(spool_dir) if spool_dir else None
+        self._threads = max(1, threads)
+        self._executor = ThreadPoolExecutor(
+            self._threads, thread_name_prefix="compressor"
+        )
+        self._pending: deque[Future] = deque()
+        self._results: list[Any] = []
+
+    def __enter__(self) -> "ParallelEntryWriter":
+        """Return the writer to use in a with statement."""
+        return self
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        """Add the remaining entries when leaving the with statement without an error."""
+        if exc_type is None:
+            self.close()
+            return
+        self._executor.shutdown(cancel_futures=True)
+        for future in self._pending:
+            if not future.cancelled() and future.exception() is None:
+                future.result()[0].close()
+
+    def submit(
+        self, name: str, write: Callable[[IO[bytes]], Any], max_size: int
+    ) -> None:
+        """
+        Add an entry whose content is written to a stream on one of the threads.
+
+        :param name: the name of the entry
+        :param write: the function writing the content of the entry to the given stream
+        :param max_size: the number of bytes the entry won't exceed
+        """
+        self._pending.append(
+            self._executor.submit(self._compress, name, write, max_size)
+        )
+        while len(self._pending) > 2 * self._threads:
+            self._add_next()
+
+    def close(self) -> list[Any]:
+        """
+        Add all remaining entries and stop the threads, which may be done more than once.
+
+        :return: the return values of the functions writing the entries in order
+        """
+        while self._pending:
+            self._add_next()
+        self._executor.shutdown()
+        return self._results
+
+    def _compress(
+        self, name: str, write: Callable[[IO[bytes]], Any], max_size: int
+    ) -> tuple[IO[bytes], zipfile.ZipInfo, Any]:
+        """
+        Write an entry into an archive of its own.
+
+        :return: the file of that archive, the metadata of the entry and the return value of
+            the function writing it
+        """
+        spool = cast(
+            IO[bytes],
+            tempfile.SpooledTemporaryFile(self.SPOOL_SIZE, dir=self._spool_dir),
+        )
+        try:
+            with zipfile.ZipFile(
+                spool, "w", compression=self._compression, compresslevel=self._level
+            ) as archive:
+                with open_entry(archive, name, max_size) as target:
+                    result = write(target)
+        except BaseException:
+            spool.close()
+            raise
+        return spool, archive.infolist()[0], result
+
+    def _add_next(self) -> None:
+        """Wait for the oldest entry to be compressed and copy it to the archive."""
+        spool, info, result = self._pending.popleft().result()
+        with spool:
+            self._writer.copy_member(spool, info)
+        self._results.append(result)
+
+
+def copy_members(
+    source: Path, target: ZipWriter, skipped: tuple[str, ...] = ()
+) -> None:
+    """
+    Copy the members of an archive to another one in order without recompressing them.
+
+    :param source: the full path to the archive to copy
+    :param target: the archive opened for writing
+    :param skipped: the names of the members not to copy
+    """
+    with open(source, "rb") as source_file, zipfile.ZipFile(source_file) as archive:
+        for info in archive.infolist():
+            if info.filename not in skipped:
+                target.copy_member(source_file, info)
+
+
+def _copy_bytes(source: IO[bytes], target: IO[bytes], length: int) -> None:
+    """
+    Copy a number of bytes from the position of a stream to another one.
+
+    :raises TransformerException: if the source ends before
+    """
+    while length:
+        chunk = source.read(min(length, 1024 * 1024))
+        if not chunk:
+            raise TransformerException("Unexpected end of archive member")
+        target.write(chunk)
+        length -= len(chunk)
+
+
+def _has_zip64_extra(extra: bytes) -> bool:
+    """Check whether the extra field of a zip header holds zip64 sizes."""
+    return any(header_id == _ZIP64_EXTRA_ID for header_id, _ in _extra_fields(extra))
+
+
+def _extra_fields(extra: bytes) -> list[tuple[int, bytes]]:
+    """Split the extra field of a zip header into the ID and the content of each field."""
+    fields = []
+    while len(extra) >= 4:
+        header_id, length = struct.unpack("<2H", extra[:4])
+        fields.append((header_id, extra[: 4 + length]))
+        extra = extra[4 + length :]
+    return fields
+
+
+def _central_header(info: zipfile.ZipInfo, offset: int) -> bytes:
+    """
+    Return the central directory header of an archive member.
+
+    :param info: the metadata of the member
+    :param offset: the position of its local header in the archive
+    :return: the header, with the sizes and the offset in a zip64 extra field if needed
+    """
+    values = [info.file_size, info.compress_size, offset]
+    zip64 = [value for value in values if value > zipfile.ZIP64_LIMIT]
+    extra = b"".join(
+        field
+        for header_id, field in _extra_fields(info.extra)
+        if header_id != _ZIP64_EXTRA_ID
+    )
+    if zip64:
+        extra = (
+            struct.pack(f"<2H{len(zip64)}Q", _ZIP64_EXTRA_ID, 8 * len(zip64), *zip64)
+            + extra
+        )
+    file_size, compress_size, offset = [
+        0xFFFFFFFF if value > zipfile.ZIP64_LIMIT else value for value in values
+    ]
+    year, month, day, hour, minute, second = info.date_time
+    name = info.orig_filename.encode(
+        "utf-8" if info.flag_bits & _UTF8_FLAG else "cp437"
+    )
+    return (
+        _CENTRAL_HEADER.pack(
+            b"PK\x01\x02",
+            max(info.create_version, 45 if zip64 else 0),
+            info.create_system,
+            max(info.extract_version, 45 if zip64 else 0),
+            info.reserved,
+            info.flag_bits,
+            info.compress_type,
+            hour << 11 | minute << 5 | second // 2,
+            (year - 1980) << 9 | month << 5 | day,
+            info.CRC,
+            compress_size,
+            file_size,
+            len(name),
+            len(extra),
+            len(info.comment),
+            0,
+            info.internal_attr,
+            info.external_attr,
+            offset,
+        )
+        + name
+        + extra
+        + info.comment
+    )
+
+
+def _entry_info(name: str) -> zipfile.ZipInfo:
+    """Return the metadata of a new archive entry, which is the same for every job."""
+    info = zipfile.ZipInfo(name, ENTRY_TIMESTAMP)
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def read_manifest(archive: zipfile.ZipFile) -> list[dict[str, Any]]:
+    """
+    Read the combined entries of an archive and the number of input files in each of them.
+
+    Archives created before the manifest existed list their entries as full, so nothing is
+    added to them.
+
+    :param archive: the archive opened for reading
+    :return: the name, number of files and uncompressed size of every combined entry in order
+    """
+    if MANIFEST_NAME in archive.namelist():
+        entries = json.loads(archive.read(MANIFEST_NAME))["entries"]
+    else:
+        entries = [
+            {"name": name, "files": None}
+            for name in archive.namelist()
+            if name != REPORT_NAME
+        ]
+    for entry in entries:
+        entry["size"] = archive.getinfo(entry["name"]).file_size
+    return entries
+
+
+def is_ordered(archive: zipfile.ZipFile) -> bool:
+    """
+    Check whether the entries of an archive were sorted or partitioned.
+
+    :param archive: the archive opened for reading
+    :return: whether its manifest says so
+    """
+    if MANIFEST_NAME not in archive.namelist():
+        return False
+    return bool(json.loads(archive.read(MANIFEST_NAME)).get("ordered"))
+
+
+def write_manifest(
+    archive: zipfile.ZipFile, entries: list[dict[str, Any]], ordered: bool = False
+) -> None:
+    """
+    Add the manifest listing the combined entries to an archive.
+
+    :param archive: the archive opened for writing
+    :param entries: the name and number of files of every combined entry in order
+    :param ordered: whether the entries are sorted or partitioned, so nothing can be added
+    """
+    manifest: dict[str, Any] = {
+        "entries": [
+            {"name": entry["name"], "files": entry["files"]} for entry in entries
+        ]
+    }
+    if ordered:
+        manifest["ordered"] = True
+    write_entry(archive, MANIFEST_NAME, json.dumps(manifest, indent=2))
+
+
+def index_cookbook(file: Path, entry_name: str) -> list[dict[str, Any]]:
+    """
+    Locate every recipe of a combined MyCookbook XML file.
+
+    The file is scanned for recipe elements rather than parsed as a whole, and only the
+    recipes themselves are parsed to read their title and categories.
+
+    :param file: the full path to the combined file
+    :param entry_name: the name of the file in the archive
+    :return: the title, categories, content hash, entry, byte offset and length of every recipe
+    """
+    with open(file, "rb") as cookbook, mmap.mmap(
+        cookbook.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        return [
+            _index_record(
+                ET.fromstring(match.group()), match.group(), entry_name, match.start()
+            )
+            for match in _RECIPE.finditer(data)  # type: ignore
+        ]
+
+
+def write_cookbook(
+    files: list[Path], target: IO[bytes], entry_name: str
+) -> list[dict[str, Any]]:
+    """
+    Combine MyCookbook XML files into a single one written straight to a stream.
+
+    The recipes and the whitespace around them are copied as the combining stylesheet does,
+    so the result is the same, but only one file at a time is held in memory and the combined
+    file is never saved on its own.
+
+    :param files: the full paths to the files to combine in order
+    :param target: the stream to write the combined file to
+    :param entry_name: the name of the archive entry the stream belongs to
+    :return: the index records of the recipes in the combined file
+    """
+    output = _RecordingWriter(target)
+    parser = ET.XMLParser(huge_tree=True, resolve_entities=False)
+    records = []
+    with ET.xmlfile(output, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element("cookbook", version="46"):
+            for file in files:
+                cookbook = ET.parse(str(file), parser).getroot()
+                if cookbook.tag != "cookbook":
+                    continue
+                if cookbook.text:
+                    xf.write(cookbook.text)
+                for child in cookbook:
+                    xf.flush()
+                    offset = output.start_recording()
+                    xf.write(child, with_tail=False)
+                    xf.flush()
+                    content = output.stop_recording()
+                    if child.tag == "recipe":
+                        records.append(
+                            _index_record(child, content, entry_name, offset)
+                        )
+                    if child.tail:
+                        xf.write(child.tail)
+    target.write(b"\n")
+    return records
+
+
+class _RecordingWriter:
+    """Writes to a stream counting the bytes and keeping those written while recording."""
+
+    def __init__(self, target: IO[bytes]) -> None:
+        """
+        Wrap the stream.
+
+        :param target: the stream to write to
+        """
+        self._target = target
+        self._recorded: Optional[list[bytes]] = None
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        """
+        Write the data to the stream.
+
+        :param data: the bytes to write
+        :return: the number of bytes written
+        """
+        self._target.write(data)
+        self.position += len(data)
+        if self._recorded is not None:
+            self._recorded.append(data)
+        return len(data)
+
+    def start_recording(self) -> int:
+        """
+        Keep the bytes written from now on.
+
+        :return: the number of bytes written so far
+        """
+        self._recorded = []
+        return self.position
+
+    def stop_recording(self) -> bytes:
+        """Return the bytes written since recording started and stop keeping them."""
+        recorded, self._recorded = b"".join(self._recorded or []), None
+        return recorded
+
+
+def _index_record(
+    recipe: ET._Element, content: bytes, entry_name: str, offset: int
+) -> dict[str, Any]:
+    """
+    Describe where a recipe is stored and how to find it.
+
+    :param recipe: the recipe element
+    :param content: the recipe element serialized as in the entry
+    :param entry_name: the name of the entry holding the recipe
+    :param offset: the position of the recipe in the entry
+    :return: the title, categories, content hash, entry, byte offset and length of the recipe
+    """
+    return {
+        "title": recipe.findtext("title"),
+        "categories": [category.text or "" for category in recipe.iterfind("category")],
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "entry": entry_name,
+        "offset": offset,
+        "length": len(content),
+    }
+
+
+def read_index(archive: zipfile.ZipFile) -> list[dict[str, Any]]:
+    """
+    Read the locations of all recipes in an archive.
+
+    :param archive: the archive opened for reading
+    :return: the records of the recipes
+    :raises TransformerException: if the archive was created without an index
+    """
+    if INDEX_NAME not in archive.namelist():
+        raise TransformerException("The archive has no index of its recipes")
+    return json.loads(archive.read(INDEX_NAME))["recipes"]
+
+
+def write_index(archive: zipfile.ZipFile, records: list[dict[str, Any]]) -> None:
+    """
+    Add the index locating the recipes to an archive.
+
+    :param archive: the archive opened for writing
+    :param records: the records of all recipes in the archive
+    """
+    write_entry(
+        archive,
+        INDEX_NAME,
+        json.dumps({"recipes": records}, ensure_ascii=False, separators=(",", ":")),
+    )
+
+
+def find_recipes(
+    archive: zipfile.ZipFile,
+    title: Optional[str] = None,
+    category: Optional[str] = None,
+    sha256: Optional[str] = None,
+) -> list[dict[str, Any]]:
+    """
+    Look up the recipes of an archive matching all the given criteria in its index.
+
+    :param archive: the archive opened for reading
+    :param title: the exact title of the recipes
+    :param category: one of the categories of the recipes
+    :param sha256: the content hash of the recipe
+    :return: the records of the matching recipes
+    """
+    return [
+        record
+        for record in read_index(archive)
+        if (title is None or record["title"] == title)
+        and (category is None or category in record["categories"])
+        and (sha256 is None or record["sha256"] == sha256)
+    ]
+
+
+def read_recipe(archive: zipfile.ZipFile, record: dict[str, Any]) -> bytes:
+    """
+    Read a single recipe from its entry without reading the entry as a whole.
+
+    :param archive: the archive opened for reading
+    :param record: the index record of the recipe
+    :return: the recipe element serialized as in the entry
+    """
+    with archive.open(record["entry"]) as entry:
+        entry.seek(record["offset"])
+        return entry.read(record["length"])
@@ -1,10 +1,15 @@
 import logging
+import sys
+import time
+import zipfile
 from pathlib import Path
+from typing import Any, Callable, Optional
 
 import click
 
+from recipe_xml_converter import config, daemon
+from recipe_xml_converter.exceptions import TransformerException
 from recipe_xml_converter.helpers import get_files_in_path, setup_logging
-from recipe_xml_converter.orchestrator import RecipeOrchestrator
 
 setup_logging()
 
@@ -26,8 +31,128 @@ logger = logging.getLogger(__name__)
     help="The maximum number of files to combine together.",
     default=1000,
 )
+@click.option(
+    "--workers",
+    help="The number of worker processes transforming files, 0 to transform them in this process.",
+    default=config.WORKERS,
+)
+@click.option(
+    "--min_workers",
+    help="The number of idle worker processes to keep while waiting files don't fit into the memory budget.",
+    default=config.MIN_WORKERS,
+)
+@click.option(
+    "--memory_budget",
+    help="The maximum number of bytes the files transformed at the same time may need, 0 for no limit.",
+    default=config.MEMORY_BUDGET,
+)
+@click.option(
+    "--file_timeout",
+    help="The maximum number of seconds the transformation of a single file may take.",
+    type=float,
+    default=config.FILE_TIMEOUT,
+)
+@click.option(
+    "--job_timeout",
+    help="The maximum number of seconds the transformation of all files may take.",
+    type=float,
+    default=config.JOB_TIMEOUT,
+)
+@click.option(
+    "--recipes_per_shard",
+    help="Split large files into chunks of this many recipes transformed by several workers, 0 to not split them.",
+    default=config.RECIPES_PER_SHARD,
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(["xml", "jsonl", "parquet"]),
+    help="Combine the recipes into MyCookbook XML files or export them to JSON Lines or Parquet.",
+    default="xml",
+)
+@click.option(
+    "--index",
+    is_flag=True,
+    default=config.ARCHIVE_INDEX,
+    help="Add an index of the recipes to the archive so single recipes can be extracted quickly.",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(["stored", "deflated", "bzip2", "lzma"]),
+    help="Compress the combined files in the archive, on COMPRESSION_THREADS threads.",
+    default=config.ARCHIVE_COMPRESSION,
+)
+@click.option(
+    "--sort_by",
+    type=click.Choice(["", "title"]),
+    help="Sort the recipes of the combined files, regardless of the order of the files.",
+    default=config.SORT_BY,
+)
+@click.option(
+    "--partition_by",
+    type=click.Choice(["", "category", "alphabet"]),
+    help="Combine the recipes into a folder per first category or per initial of the title.",
+    default=config.PARTITION_BY,
+)
+@click.option(
+    "--progress",
+    type=click.Choice(["bar", "json", "none"]),
+    help="Show the progress of every stage as bars on stderr or as lines of JSON on stdout.",
+    default=config.PROGRESS,
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=config.PROFILE,
+    help="Save the calls and time of every stylesheet template next to the archive.",
+)
+@click.option(
+    "--profile_python",
+    is_flag=True,
+    default=config.PROFILE_PYTHON,
+    help="Save a cProfile of all transformations next to the archive.",
+)
+@click.option(
+    "--append",
+    "append_to",
+    help="Full path to an archive created before to add the transformed recipes to instead of creating a new one.",
+)
+@click.option(
+    "--shared_dir",
+    help="Full path to a directory mounted by several hosts to transform the files together with the nodes started with convert_node.",
+)
+@click.option(
+    "--self-check",
+    is_flag=True,
+    help="Compile all stylesheets, transform a sample recipe and report the timings instead of transforming files.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    help="Full path to the socket of a running conversion daemon to send the files to instead of converting them here.",
+)
 def transform_and_save(
-    recipes: tuple[str, ...], target: str, max_files_combined: int
+    recipes: tuple[str, ...],
+    target: str,
+    max_files_combined: int,
+    workers: int,
+    min_workers: int,
+    memory_budget: int,
+    file_timeout: Optional[float],
+    job_timeout: Optional[float],
+    recipes_per_shard: int,
+    output_format: str,
+    index: bool,
+    compression: str,
+    sort_by: str,
+    partition_by: str,
+    progress: str,
+    profile: bool,
+    profile_python: bool,
+    append_to: Optional[str],
+    shared_dir: Optional[str],
+    self_check: bool,
+    socket_path: Optional[str],
 ) -> None:
     """
     Convert RecipeML files to MyCookbook XML ones and save them as a zip to the file system.
@@ -35,14 +160,192 @@ def transform_and_save(
     :param recipes: the full paths to the RecipeML files or a directories
     :param target: the full path to the directory where the transformed recipes should be saved
     :param max_files_combined: the maximum number of files to combine together.
+    :param workers: the number of worker processes transforming files
+    :param min_workers: the number of idle worker processes to keep
+    :param memory_budget: the maximum number of bytes of memory of concurrent transformations
+    :param file_timeout: the maximum number of seconds the transformation of a single file may take
+    :param job_timeout: the maximum number of seconds the transformation of all files may take
+    :param recipes_per_shard: the number of recipes per chunk large files are split into
+    :param output_format: the format of the files in the archive
+    :param index: whether to add an index of the recipes to the archive
+    :param compression: the zip compression method of the combined files
+    :param sort_by: the order of the recipes in the combined files
+    :param partition_by: the way of partitioning the recipes into folders
+    :param progress: how to show the progress, as bars, JSON lines or not at all
+    :param profile: whether to save the timings of the stylesheet templates
+    :param profile_python: whether to save a cProfile of the transformations
+    :param append_to: the full path to an existing archive to add the recipes to
+    :param shared_dir: the full path to the directory shared with other nodes
+    :param self_check: whether to only check the installation and report timings
+    :param socket_path: the full path to the socket of a running conversion daemon
     """
+    if self_check:
+        run_self_check()
+        return
+    options: dict[str, Any] = {
+        "workers": workers,
+        "min_workers": min_workers,
+        "memory_budget": memory_budget,
+        "file_timeout": file_timeout,
+        "job_timeout": job_timeout,
+        "output_format": output_format,
+        "recipes_per_shard": recipes_per_shard,
+        "index": index,
+        "compression": compression,
+        "sort_by": sort_by,
+        "partition_by": partition_by,
+        "profile": profile,
+        "profile_python": profile_python,
+    }
+    if socket_path:
+        archive_path = daemon.submit(
+            Path(socket_path),
+            recipes,
+            target,
+            max_files_combined,
+            append_to,
+            shared_dir,
+            _progress_renderer(progress),
+            **options,
+        )
+        logger.info(f"✅ Saved transformed recipes to {archive_path}")
+        return
+
+    # the orchestrator is only imported now so that daemon clients start up faster
+    from recipe_xml_converter.orchestrator import RecipeOrchestrator
+    from recipe_xml_converter.scratch import ScratchSpace
+    from recipe_xml_converter.transformer import warm_start
+
+    if config.WARM_START:
+        warm_start()
+    ScratchSpace.from_config().clean()  # left behind by crashed runs
+
     recipe_paths = tuple(
         [path for paths in recipes for path in get_files_in_path(Path(paths))]
     )
-    orchestrator = RecipeOrchestrator(recipe_paths, Path(target), max_files_combined)
-    archive_path = orchestrator.orchestrate()
+    orchestrator = RecipeOrchestrator(
+        recipe_paths,
+        Path(append_to).parent if append_to else Path(target),
+        max_files_combined,
+        **options,
+    )
+    renderer = _progress_renderer(progress)
+    if renderer is not None:
+        orchestrator.progress.subscribe(renderer)
+
+    if append_to:
+        archive_path = orchestrator.append(Path(append_to))
+    elif shared_dir:
+        archive_path = orchestrator.orchestrate_distributed(Path(shared_dir))
+    else:
+        archive_path = orchestrator.orchestrate()
     logger.info(f"✅ Saved transformed recipes to {archive_path}")
 
 
+@click.command
+@click.option(
+    "--shared_dir",
+    "-s",
+    required=True,
+    help="Full path to the directory shared with the host running convert --shared_dir.",
+)
+@click.option(
+    "--publish_timeout",
+    help="The maximum number of seconds to wait for the job to be published.",
+    default=600.0,
+)
+def work(shared_dir: str, publish_timeout: float) -> None:
+    """
+    Transform the files of a job published to a shared directory on this host.
+
+    :param shared_dir: the full path to the directory shared with the coordinating host
+    :param publish_timeout: the maximum number of seconds to wait for the job
+    """
+    from recipe_xml_converter.orchestrator import RecipeOrchestrator
+
+    if config.WARM_START:
+        from recipe_xml_converter.transformer import warm_start
+
+        warm_start()
+
+    try:
+        chunks = RecipeOrchestrator((), Path(shared_dir)).work(
+            Path(shared_dir), publish_timeout=publish_timeout
+        )
+    except TransformerException as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    logger.info(f"✅ Transformed {chunks} chunks")
+
+
+@click.command
+@click.option(
+    "--archive",
+    "-a",
+    required=True,
+    help="Full path to an archive created with an index of its recipes.",
+)
+@click.option("--title", help="The exact title of the recipe.")
+@click.option("--category", help="One of the categories of the recipe.")
+@click.option("--hash", "sha256", help="The SHA-256 hash of the recipe.")
+def extract_recipe(
+    archive: str,
+    title: Optional[str],
+    category: Optional[str],
+    sha256: Optional[str],
+) -> None:
+    """
+    Print the recipes of an archive matching all given criteria looking them up in its index.
+
+    :param archive: the full path to the archive
+    :param title: the exact title of the recipes
+    :param category: one of the categories of the recipes
+    :param sha256: the content hash of the recipe
+    """
+    from recipe_xml_converter.archive import find_recipes, read_recipe
+
+    with zipfile.ZipFile(archive) as recipes:
+        try:
+            records = find_recipes(recipes, title, category, sha256)
+        except TransformerException as e:
+            logger.error(f"❌ {e}")
+            sys.exit(1)
+        if not records:
+            logger.warning("No matching recipe found")
+            sys.exit(1)
+        for record in records:
+            click.echo(read_recipe(recipes, record).decode("utf-8"))
+
+
+def _progress_renderer(progress: str) -> Optional[Callable[[dict[str, Any]], None]]:
+    """
+    Return the function showing the progress events of a conversion.
+
+    :param progress: how to show the progress, as bars, JSON lines or not at all
+    :return: the renderer or None to show no progress
+    """
+    from recipe_xml_converter.progress import BarRenderer, JsonLinesRenderer
+
+    if progress == "bar":
+        return BarRenderer()
+    if progress == "json":
+        return JsonLinesRenderer(sys.stdout)
+    return None
+
+
+def run_self_check() -> None:
+    """Check the stylesheets and a sample transformation, log the timings and exit with an error on failure."""
+    from recipe_xml_converter.transformer import check_transformations
+
+    logger.info(f"start-up (CPU time): {time.process_time() * 1000:.1f}ms")
+    try:
+        for step, seconds in check_transformations().items():
+            logger.info(f"{step}: {seconds * 1000:.1f}ms")
+    except TransformerException:
+        logger.exception("❌ Self-check failed")
+        sys.exit(1)
+    logger.info("✅ Self-check passed")
+
+
 if __name__ == "__main__":
     transform_and_save()
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from pathlib import Path
 
 from decouple import config
@@ -5,4 +7,83 @@ from decouple import config
 BASE_DATA_DIR = config(
     "BASE_DATA_DIR", default=str(Path(__file__).parent.parent / "data")
 )
-DEBUG = config("DEBUG", default=False)
+SCRATCH_DIR = config("SCRATCH_DIR", default=BASE_DATA_DIR)
+SCRATCH_MEMORY_DIR = config("SCRATCH_MEMORY_DIR", default="")
+SCRATCH_MEMORY_MAX_JOB_SIZE = config(
+    "SCRATCH_MEMORY_MAX_JOB_SIZE", default=64 * 1024 * 1024, cast=int
+)
+SCRATCH_PER_INPUT_BYTE = config("SCRATCH_PER_INPUT_BYTE", default=3, cast=int)
+SCRATCH_JOB_QUOTA = config("SCRATCH_JOB_QUOTA", default=0, cast=int)
+SCRATCH_QUOTA = config("SCRATCH_QUOTA", default=0, cast=int)
+SCRATCH_MAX_AGE = config("SCRATCH_MAX_AGE", default=24 * 60 * 60, cast=float)
+SCRATCH_JANITOR_INTERVAL = config("SCRATCH_JANITOR_INTERVAL", default=600, cast=float)
+DEBUG = config("DEBUG", default=False, cast=bool)
+RECOVER_MALFORMED = config("RECOVER_MALFORMED", default=False, cast=bool)
+QUARANTINE_DIR = config("QUARANTINE_DIR", default="")
+MMAP_INPUT = config("MMAP_INPUT", default=False, cast=bool)
+MMAP_MIN_SIZE = config("MMAP_MIN_SIZE", default=1024 * 1024, cast=int)
+PARSER_HUGE_TREE = config("PARSER_HUGE_TREE", default=False, cast=bool)
+PARSER_REMOVE_BLANK_TEXT = config("PARSER_REMOVE_BLANK_TEXT", default=False, cast=bool)
+PARSER_RESOLVE_ENTITIES = config(
+    "PARSER_RESOLVE_ENTITIES",
+    default="internal",
+    cast=lambda value: (
+        "internal"
+        if value.lower() == "internal"
+        else value.lower() in ("1", "true", "yes", "on")
+    ),
+)
+PARSER_NO_NETWORK = config("PARSER_NO_NETWORK", default=True, cast=bool)
+PARSER_COLLECT_IDS = config("PARSER_COLLECT_IDS", default=False, cast=bool)
+WORKERS = config("WORKERS", default=0, cast=int)
+MIN_WORKERS = config("MIN_WORKERS", default=0, cast=int)
+MEMORY_BUDGET = config("MEMORY_BUDGET", default=0, cast=int)
+MEMORY_PER_INPUT_BYTE = config("MEMORY_PER_INPUT_BYTE", default=32, cast=int)
+WORKER_START_METHOD = config("WORKER_START_METHOD", default="forkserver")
+WORKER_MAX_TASKS = config("WORKER_MAX_TASKS", default=0, cast=int)
+WORKER_MAX_RSS = config("WORKER_MAX_RSS", default=0, cast=int)
+FILE_TIMEOUT = config(
+    "FILE_TIMEOUT", default="", cast=lambda value: float(value) if value else None
+)
+JOB_TIMEOUT = config(
+    "JOB_TIMEOUT", default="", cast=lambda value: float(value) if value else None
+)
+API_RESULT_CACHE_SIZE = config(
+    "API_RESULT_CACHE_SIZE", default=64 * 1024 * 1024, cast=int
+)
+API_RESULT_CACHE_TTL = config("API_RESULT_CACHE_TTL", default=60, cast=float)
+API_JOB_WORKERS = config("API_JOB_WORKERS", default=0, cast=int)
+TRACEMALLOC_FRAMES = config("TRACEMALLOC_FRAMES", default=0, cast=int)
+WARM_START = config("WARM_START", default=False, cast=bool)
+DAEMON_SOCKET = config(
+    "DAEMON_SOCKET",
+    default=str(Path(tempfile.gettempdir()) / "recipe-xml-converter.sock"),
+)
+DAEMON_WORKERS = config("DAEMON_WORKERS", default=4, cast=int)
+RECIPES_PER_SHARD = config("RECIPES_PER_SHARD", default=0, cast=int)
+SHARD_MIN_SIZE = config("SHARD_MIN_SIZE", default=16 * 1024 * 1024, cast=int)
+FILES_PER_CLAIM = config("FILES_PER_CLAIM", default=50, cast=int)
+CLAIM_TIMEOUT = config("CLAIM_TIMEOUT", default=300, cast=float)
+MAX_ENTRY_SIZE = config("MAX_ENTRY_SIZE", default=0, cast=int)
+STREAM_COMBINE = config("STREAM_COMBINE", default=False, cast=bool)
+ARCHIVE_INDEX = config("ARCHIVE_INDEX", default=False, cast=bool)
+ARCHIVE_COMPRESSION = config("ARCHIVE_COMPRESSION", default="stored")
+ARCHIVE_COMPRESSION_LEVEL = config(
+    "ARCHIVE_COMPRESSION_LEVEL",
+    default="",
+    cast=lambda value: int(value) if value else None,
+)
+COMPRESSION_THREADS = config(
+    "COMPRESSION_THREADS", default=os.cpu_count() or 1, cast=int
+)
+SORT_BY = config("SORT_BY", default="")
+PARTITION_BY = config("PARTITION_BY", default="")
+SORT_RUN_SIZE = config("SORT_RUN_SIZE", default=50_000, cast=int)
+RESULT_STORE_DIR = config("RESULT_STORE_DIR", default="")
+RESULT_STORE_MAX_SIZE = config(
+    "RESULT_STORE_MAX_SIZE", default=1024 * 1024 * 1024, cast=int
+)
+PROGRESS = config("PROGRESS", default="bar")
+PROGRESS_INTERVAL = config("PROGRESS_INTERVAL", default=0.5, cast=float)
+PROFILE = config("PROFILE", default=False, cast=bool)
+PROFILE_PYTHON = config("PROFILE_PYTHON", default=False, cast=bool)
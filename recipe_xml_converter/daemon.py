@@ -0,0 +1,229 @@
+import contextlib
+import json
+import logging
+import os
+import socket
+import socketserver
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import click
+
+from recipe_xml_converter import config
+from recipe_xml_converter.exceptions import TransformerException
+from recipe_xml_converter.helpers import get_files_in_path, setup_logging
+
+logger = logging.getLogger(__name__)
+
+
+def convert(
+    request: dict[str, Any],
+    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+) -> dict[str, Any]:
+    """
+    Transform the files of a client request on one of the warm conversion threads.
+
+    The files are transformed on the thread itself unless the request asks for worker
+    processes, which are then started for the request alone.
+
+    :param request: the recipes, target, max_files_combined, archive to append to, shared
+        directory and orchestrator options sent by the client
+    :param on_progress: the function called with every progress event of the conversion
+    :return: the path to the archive and the summary of its report
+    """
+    from recipe_xml_converter.orchestrator import RecipeOrchestrator
+
+    recipe_paths = tuple(
+        [
+            path
+            for paths in request["recipes"]
+            for path in get_files_in_path(Path(paths))
+        ]
+    )
+    append_to, shared_dir = request.get("append_to"), request.get("shared_dir")
+    orchestrator = RecipeOrchestrator(
+        recipe_paths,
+        Path(append_to).parent if append_to else Path(request["target"]),
+        request.get("max_files_combined", 1000),
+        **request.get("options", {}),
+    )
+    if on_progress is not None:
+        orchestrator.progress.subscribe(on_progress)
+
+    if append_to:
+        archive_path = orchestrator.append(Path(append_to))
+    elif shared_dir:
+        archive_path = orchestrator.orchestrate_distributed(Path(shared_dir))
+    else:
+        archive_path = orchestrator.orchestrate()
+    return {
+        "archive": str(archive_path),
+        "summary": json.loads(orchestrator.report.to_json())["summary"],
+    }
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handles a single conversion request sent as a line of JSON."""
+
+    server: "ConversionDaemon"
+
+    def handle(self) -> None:
+        """Run the conversion, sending its progress if asked, and answer with a line of JSON."""
+        try:
+            request = json.loads(self.rfile.readline())
+            on_progress = self._send_progress if request.get("progress") else None
+            response = self.server.executor.submit(
+                convert, request, on_progress
+            ).result()
+        except Exception as e:
+            logger.exception("❌ Failed to handle a conversion request")
+            response = {"error": str(e)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+    def _send_progress(self, event: dict[str, Any]) -> None:
+        """Send a progress event as a line of JSON ahead of the answer."""
+        # a client that went away mustn't fail the conversion
+        with contextlib.suppress(OSError):
+            self.wfile.write(json.dumps({"progress": event}).encode("utf-8") + b"\n")
+
+
+class ConversionDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Local server converting files for CLI clients on a pool of long-lived, warmed threads.
+
+    Clients talk to it through a Unix domain socket, so they don't pay for imports and
+    stylesheet compilation on every invocation. Requests asking for worker processes get
+    a pool of their own, whose processes don't share the warm stylesheets.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, workers: int = config.DAEMON_WORKERS) -> None:
+        """
+        Bind the daemon to the socket and start its conversion threads.
+
+        :param socket_path: the full path to the Unix domain socket to listen on
+        :param workers: the number of conversion threads
+        """
+        from recipe_xml_converter.scratch import Janitor, ScratchSpace
+        from recipe_xml_converter.transformer import warm_start
+
+        if socket_path.exists():
+            if is_running(socket_path):
+                raise TransformerException(
+                    f"A daemon is already listening on {socket_path}"
+                )
+            socket_path.unlink()  # left behind by a daemon that didn't shut down cleanly
+
+        self.socket_path = socket_path
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="converter", initializer=warm_start
+        )
+        super().__init__(str(socket_path), _RequestHandler)
+        os.chmod(socket_path, 0o600)
+        self.janitor = Janitor(
+            ScratchSpace.from_config(), config.SCRATCH_JANITOR_INTERVAL
+        )
+        self.janitor.start()
+
+    def server_close(self) -> None:
+        """Stop the conversion and janitor threads and remove the socket."""
+        super().server_close()
+        self.janitor.stop()
+        self.executor.shutdown(wait=False)
+        self.socket_path.unlink(missing_ok=True)
+
+
+def is_running(socket_path: Path) -> bool:
+    """
+    Check whether a daemon is listening on the socket.
+
+    :param socket_path: the full path to the Unix domain socket
+    :return: whether a connection could be established
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(socket_path))
+            return True
+        except OSError:
+            return False
+
+
+def submit(
+    socket_path: Path,
+    recipes: tuple[str, ...],
+    target: str,
+    max_files_combined: int,
+    append_to: Optional[str] = None,
+    shared_dir: Optional[str] = None,
+    on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+    **options: Any,
+) -> Path:
+    """
+    Send a conversion request to a running daemon and wait for the archive.
+
+    :param socket_path: the full path to the Unix domain socket of the daemon
+    :param recipes: the full paths to the RecipeML files or directories
+    :param target: the full path to the directory where the archive should be saved
+    :param max_files_combined: the maximum number of files to combine together
+    :param append_to: the full path to an existing archive to add the recipes to
+    :param shared_dir: the full path to the directory shared with other nodes
+    :param on_progress: the function called with every progress event of the conversion
+    :param options: the keyword arguments of the orchestrator, e.g. output_format
+    :return: the full path to the archive
+    """
+    request = {
+        "recipes": [str(Path(path).absolute()) for path in recipes],
+        "target": str(Path(target).absolute()),
+        "max_files_combined": max_files_combined,
+        "append_to": str(Path(append_to).absolute()) if append_to else None,
+        "shared_dir": str(Path(shared_dir).absolute()) if shared_dir else None,
+        "progress": on_progress is not None,
+        "options": options,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with client.makefile("rb") as responses:
+            response = json.loads(responses.readline())
+            while "progress" in response:
+                if on_progress is not None:
+                    on_progress(response["progress"])
+                response = json.loads(responses.readline())
+
+    if "error" in response:
+        raise TransformerException(response["error"])
+    return Path(response["archive"])
+
+
+@click.command
+@click.option(
+    "--socket",
+    "socket_path",
+    help="Full path to the Unix domain socket to listen on.",
+    default=config.DAEMON_SOCKET,
+)
+@click.option(
+    "--workers",
+    help="The number of conversion threads.",
+    default=config.DAEMON_WORKERS,
+)
+def serve(socket_path: str, workers: int) -> None:
+    """
+    Run the conversion daemon until interrupted.
+
+    :param socket_path: the full path to the Unix domain socket to listen on
+    :param workers: the number of conversion threads
+    """
+    setup_logging()
+    with ConversionDaemon(Path(socket_path), workers) as daemon:
+        logger.info(f"👂 Listening on {socket_path} with {workers} conversion threads")
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Shutting down")
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,70 @@
+import tracemalloc
+from typing import Any, Optional
+
+
+class AllocationTracer:
+    """
+    Traces the Python allocations of a long-running process to find what keeps growing.
+
+    The allocations are compared to a snapshot taken when tracing started, so the sites
+    that grew the most since then come first. Memory libxml2 and libxslt allocate in C is
+    invisible to tracemalloc and only shows in the resident memory of the process.
+    """
+
+    def __init__(self, frames: int) -> None:
+        """
+        Start tracing the allocations.
+
+        :param frames: the number of frames of the call stack kept for every allocation
+        """
+        tracemalloc.start(frames)
+        self._frames = frames
+        self._baseline: Optional[tracemalloc.Snapshot] = self._snapshot()
+
+    def top(self, limit: int = 20) -> list[dict[str, Any]]:
+        """
+        Return the allocation sites that grew the most since tracing started.
+
+        :param limit: the number of sites to return
+        :return: the traceback, bytes, allocations and their growth of every site, largest
+            growth first
+        """
+        snapshot = self._snapshot()
+        group_by = "traceback" if self._frames > 1 else "lineno"
+        statistics = (
+            snapshot.compare_to(self._baseline, group_by)
+            if self._baseline is not None
+            else snapshot.statistics(group_by)
+        )
+        return [
+            {
+                "traceback": [
+                    f"{frame.filename}:{frame.lineno}" for frame in stat.traceback
+                ],
+                "size": stat.size,
+                "size_diff": getattr(stat, "size_diff", stat.size),
+                "count": stat.count,
+                "count_diff": getattr(stat, "count_diff", stat.count),
+            }
+            for stat in statistics[:limit]
+        ]
+
+    def traced_memory(self) -> dict[str, int]:
+        """Return the bytes of the Python allocations traced now and at the peak."""
+        current, peak = tracemalloc.get_traced_memory()
+        return {"current": current, "peak": peak}
+
+    def stop(self) -> None:
+        """Stop tracing and free the traces."""
+        self._baseline = None
+        tracemalloc.stop()
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        """Take a snapshot of the allocations, leaving out those of tracemalloc itself."""
+        return tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
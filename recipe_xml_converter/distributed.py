@@ -0,0 +1,322 @@
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterator, Optional, Union
+
+from recipe_xml_converter.exceptions import (
+    InvalidInputException,
+    TimeoutException,
+    TransformerException,
+)
+from recipe_xml_converter.inputs import ArchiveMember
+from recipe_xml_converter.report import (
+    FAILED,
+    REJECTED,
+    SALVAGED,
+    TIMED_OUT,
+    TRANSFORMED,
+)
+
+QUEUE_NAME = "queue.sqlite"
+"""The name of the database of the work queue in the shared directory."""
+FRAGMENTS_DIR = "fragments"
+"""The name of the directory holding the transformed files in the shared directory."""
+INPUTS_DIR = "inputs"
+"""The name of the directory holding the spilled file objects in the shared directory."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    files INTEGER NOT NULL,
+    published REAL NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    files TEXT NOT NULL,
+    node TEXT,
+    heartbeat REAL,
+    outcomes TEXT
+);
+"""
+
+_EXCEPTIONS = {
+    REJECTED: InvalidInputException,
+    TIMED_OUT: TimeoutException,
+    FAILED: TransformerException,
+}
+
+
+def node_name() -> str:
+    """Return the name identifying this process among all nodes working on a job."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encode_input(file: Union[Path, ArchiveMember]) -> dict[str, Any]:
+    """
+    Convert an input file to JSON so other nodes can find it on the shared filesystem.
+
+    :param file: the full path to the input file or the archive member
+    :return: the JSON representation
+    """
+    if isinstance(file, ArchiveMember):
+        return file.to_dict()
+    return {"path": str(file)}
+
+
+def decode_input(data: dict[str, Any]) -> Union[Path, ArchiveMember]:
+    """
+    Convert the JSON representation of an input file back to the input file.
+
+    :param data: the JSON representation created by encode_input
+    :return: the full path to the input file or the archive member
+    """
+    return Path(data["path"]) if "path" in data else ArchiveMember.from_dict(data)
+
+
+def encode_outcome(
+    outcome: Union[bool, Exception], fragment: Optional[str]
+) -> dict[str, Any]:
+    """
+    Convert the outcome of a transformation to JSON.
+
+    :param outcome: whether the file was salvaged or the exception raised while transforming it
+    :param fragment: the path to the transformed file relative to the shared directory
+    :return: the JSON representation
+    """
+    if isinstance(outcome, Exception):
+        status = next(
+            (
+                status
+                for status, exception in _EXCEPTIONS.items()
+                if isinstance(outcome, exception)
+            ),
+            FAILED,
+        )
+        return {"status": status, "reason": str(outcome)}
+    return {"status": SALVAGED if outcome else TRANSFORMED, "fragment": fragment}
+
+
+def decode_outcome(data: dict[str, Any]) -> Union[bool, Exception]:
+    """
+    Convert the JSON representation of an outcome back to the outcome.
+
+    :param data: the JSON representation created by encode_outcome
+    :return: whether the file was salvaged or the exception raised while transforming it
+    """
+    if data["status"] in _EXCEPTIONS:
+        return _EXCEPTIONS[data["status"]](data["reason"])
+    return data["status"] == SALVAGED
+
+
+class WorkQueue:
+    """
+    Queue of the chunks of input files of a job shared by nodes mounting the same directory.
+
+    The queue is an SQLite database in the shared directory, so claiming a chunk is a single
+    transaction guarded by the filesystem's locks. A chunk whose node stops sending
+    heartbeats for claim_timeout seconds is handed to the next node asking for work.
+    The queue holds a single job at a time, identified by a digest of its input files
+    and settings, whose chunks the coordinator clears once it is done.
+    """
+
+    def __init__(self, shared_dir: Path, claim_timeout: float) -> None:
+        """
+        Open the queue in the shared directory, creating it if needed.
+
+        :param shared_dir: the full path to the directory all nodes mount
+        :param claim_timeout: the number of seconds after which a silent node loses its chunk
+        """
+        shared_dir.mkdir(parents=True, exist_ok=True)
+        self._shared_dir = shared_dir
+        self._claim_timeout = claim_timeout
+        self._connection = sqlite3.connect(
+            shared_dir / QUEUE_NAME, timeout=60, isolation_level=None
+        )
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the connection to the database."""
+        self._connection.close()
+
+    def publish(
+        self, files: list[dict[str, Any]], files_per_claim: int, digest: str
+    ) -> bool:
+        """
+        Add the input files of a job in chunks unless the queue already holds the job.
+
+        :param files: the JSON representations of the input files in order
+        :param files_per_claim: the number of files a node claims at once
+        :param digest: the hash of the input files and settings identifying the job
+        :return: whether the files were added or an earlier run of the job is resumed
+        :raises TransformerException: if the queue holds another job that isn't done
+        """
+        with self._transaction():
+            row = self._connection.execute("SELECT digest FROM job").fetchone()
+            if row is not None and self._cleared():
+                self._connection.execute("DELETE FROM job")
+            elif row is not None:
+                if row[0] != digest:
+                    raise TransformerException(
+                        f"{self._shared_dir} holds another unfinished job, "
+                        f"remove {QUEUE_NAME} to abandon it"
+                    )
+                return False
+            self._connection.execute(
+                "INSERT INTO job (files, published, digest) VALUES (?, ?, ?)",
+                (len(files), time.time(), digest),
+            )
+            positions = list(enumerate(files))
+            self._connection.executemany(
+                "INSERT INTO chunks (files) VALUES (?)",
+                [
+                    (json.dumps(positions[start : start + files_per_claim]),)
+                    for start in range(0, len(positions), max(1, files_per_claim))
+                ],
+            )
+            return True
+
+    def published(self) -> bool:
+        """Return whether the coordinator has added the files of the job yet."""
+        return self._connection.execute("SELECT 1 FROM job").fetchone() is not None
+
+    def wait_until_published(self, timeout: float) -> None:
+        """
+        Poll until the coordinator has added the files of the job.
+
+        :param timeout: the maximum number of seconds to wait
+        :raises TransformerException: if no job was published in time
+        """
+        deadline = time.monotonic() + timeout
+        while not self.published():
+            if time.monotonic() >= deadline:
+                raise TransformerException(f"No job was published within {timeout}s")
+            time.sleep(1)
+
+    def claim(self, node: str) -> Optional[tuple[int, list[tuple[int, dict]]]]:
+        """
+        Claim the next chunk nobody works on, or whose node went silent.
+
+        :param node: the name of the claiming node
+        :return: the id of the chunk and the positions and files in it or None if none is left
+        """
+        now = time.time()
+        with self._transaction():
+            row = self._connection.execute(
+                "SELECT id, files FROM chunks WHERE outcomes IS NULL "
+                "AND (node IS NULL OR heartbeat < ?) ORDER BY id LIMIT 1",
+                (now - self._claim_timeout,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE chunks SET node = ?, heartbeat = ? WHERE id = ?",
+                (node, now, row[0]),
+            )
+        return row[0], [(position, file) for position, file in json.loads(row[1])]
+
+    def heartbeat(self, chunk: int, node: str) -> None:
+        """
+        Tell the other nodes the chunk is still being worked on.
+
+        :param chunk: the id of the chunk
+        :param node: the name of the node working on it
+        """
+        self._connection.execute(
+            "UPDATE chunks SET heartbeat = ? WHERE id = ? AND node = ?",
+            (time.time(), chunk, node),
+        )
+
+    @contextlib.contextmanager
+    def keep_claimed(self, chunk: int, node: str) -> Iterator[None]:
+        """
+        Send heartbeats for a chunk from a background thread while the block runs.
+
+        A heartbeat goes out every third of the claim timeout, so a node working on a slow
+        file keeps its chunk as long as the process is alive.
+
+        :param chunk: the id of the chunk
+        :param node: the name of the node working on it
+        """
+        stopped = threading.Event()
+
+        def beat() -> None:
+            # connections can't be shared between threads
+            queue = WorkQueue(self._shared_dir, self._claim_timeout)
+            try:
+                while not stopped.wait(self._claim_timeout / 3):
+                    # a heartbeat missed while the database is busy is sent with the next
+                    with contextlib.suppress(sqlite3.OperationalError):
+                        queue.heartbeat(chunk, node)
+            finally:
+                queue.close()
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stopped.set()
+            thread.join()
+
+    def complete(self, chunk: int, node: str, outcomes: list[dict[str, Any]]) -> bool:
+        """
+        Save the outcomes of a chunk unless another node took it over in the meantime.
+
+        :param chunk: the id of the chunk
+        :param node: the name of the node that worked on it
+        :param outcomes: the JSON representations of the outcomes of its files in order
+        :return: whether the outcomes were saved
+        """
+        cursor = self._connection.execute(
+            "UPDATE chunks SET outcomes = ? WHERE id = ? AND node = ? "
+            "AND outcomes IS NULL",
+            (json.dumps(outcomes), chunk, node),
+        )
+        return cursor.rowcount == 1
+
+    def pending(self) -> int:
+        """Return the number of chunks without outcomes."""
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM chunks WHERE outcomes IS NULL"
+        ).fetchone()[0]
+
+    def outcomes(self) -> dict[int, dict[str, Any]]:
+        """Return the JSON representations of the outcomes of all finished files by position."""
+        outcomes = {}
+        for files, chunk_outcomes in self._connection.execute(
+            "SELECT files, outcomes FROM chunks WHERE outcomes IS NOT NULL"
+        ):
+            for (position, _), outcome in zip(
+                json.loads(files), json.loads(chunk_outcomes)
+            ):
+                outcomes[position] = outcome
+        return outcomes
+
+    def clear(self) -> None:
+        """
+        Remove the chunks of the finished job, so the next job can be published.
+
+        The job itself stays until then, so nodes that start late find nothing to claim
+        instead of waiting for it.
+        """
+        self._connection.execute("DELETE FROM chunks")
+
+    def _cleared(self) -> bool:
+        """Return whether the chunks of the job were removed once it was done."""
+        return self._connection.execute("SELECT 1 FROM chunks").fetchone() is None
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[None]:
+        """Hold the write lock of the database, so no two nodes claim the same chunk."""
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
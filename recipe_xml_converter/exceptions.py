@@ -1,2 +1,14 @@
 class TransformerException(Exception):
     """General exception to use for transformer errors."""
+
+
+class InvalidInputException(TransformerException):
+    """Exception to use for input files that are rejected before being transformed."""
+
+
+class TimeoutException(TransformerException):
+    """Exception to use for transformations that exceeded their time budget."""
+
+
+class ScratchSpaceException(TransformerException):
+    """Exception to use for jobs that don't fit into the scratch space."""
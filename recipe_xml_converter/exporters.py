@@ -0,0 +1,127 @@
+import abc
+import json
+import logging
+from pathlib import Path
+from typing import Any, Iterator
+
+from recipe_xml_converter.exceptions import TransformerException
+from recipe_xml_converter.recipes import read_recipes
+
+logger = logging.getLogger(__name__)
+
+
+class Exporter(abc.ABC):
+    """General exporter writing the records of transformed files to a single file."""
+
+    def __init__(self, input_files: tuple[Path, ...], output_file: Path) -> None:
+        """
+        Create a new exporter instance.
+
+        :param input_files: the full paths to the transformed files to export
+        :param output_file: the file location to save the exported records
+        """
+        self._input_files = input_files
+        self._output_file = output_file
+
+    @abc.abstractmethod
+    def _records(self, file: Path) -> Iterator[dict[str, Any]]:
+        """
+        Stream the records contained in a transformed file.
+
+        :param file: the full path to the transformed file
+        :return: an iterator of the records
+        """
+
+    @abc.abstractmethod
+    def _write(self, records: Iterator[dict[str, Any]]) -> None:
+        """
+        Write the records to the output file.
+
+        :param records: the records to write
+        """
+
+    def export(self) -> None:
+        """Export the records of all input files to the output file."""
+        self._output_file.parent.mkdir(parents=True, exist_ok=True)
+        self._write(
+            record for file in self._input_files for record in self._records(file)
+        )
+        logger.debug(
+            f"✅ Exported {len(self._input_files)} files to {self._output_file}"
+        )
+
+
+class RecipeExporter(Exporter, abc.ABC):
+    """Exporter of the recipes in MyCookbook XML files produced by the RecipeTransformer."""
+
+    def _records(self, file: Path) -> Iterator[dict[str, Any]]:
+        """
+        Stream the recipes of a MyCookbook XML file one at a time.
+
+        :param file: the full path to the transformed file
+        :return: an iterator of the recipe records
+        """
+        try:
+            for recipe in read_recipes(file):
+                yield recipe.to_record()
+        except ValueError as e:
+            raise TransformerException(f"Failed to export {file.name}: {e}") from e
+
+
+class RecipeJsonLinesExporter(RecipeExporter):
+    """Exports recipes as JSON Lines with one recipe object per line."""
+
+    def _write(self, records: Iterator[dict[str, Any]]) -> None:
+        """
+        Write every record as a line of JSON.
+
+        :param records: the records to write
+        """
+        with open(self._output_file, "w", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False))
+                file.write("\n")
+
+
+class RecipeParquetExporter(RecipeExporter):
+    """Exports recipes to a Parquet file. Requires the optional pyarrow package."""
+
+    batch_size = 10000
+    """The number of recipes buffered in memory before they are written as a row group."""
+
+    def _write(self, records: Iterator[dict[str, Any]]) -> None:
+        """
+        Write the records in row groups of batch_size recipes.
+
+        :param records: the records to write
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise TransformerException(
+                "Exporting to Parquet requires the pyarrow package"
+            ) from e
+
+        strings = pa.list_(pa.string())
+        schema = pa.schema(
+            [
+                ("title", pa.string()),
+                ("description", pa.string()),
+                ("categories", strings),
+                ("quantity", pa.string()),
+                ("preptime", pa.string()),
+                ("cooktime", pa.string()),
+                ("ingredients", strings),
+                ("recipetext", strings),
+                ("source", strings),
+            ]
+        )
+        with pq.ParquetWriter(self._output_file, schema) as writer:
+            batch: list[dict[str, Any]] = []
+            for record in records:
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    writer.write_table(pa.Table.from_pylist(batch, schema))
+                    batch = []
+            writer.write_table(pa.Table.from_pylist(batch, schema))
@@ -1,7 +1,16 @@
+import bz2
+import contextlib
+import gzip
+import io
 import logging
+import lzma
+import mmap
+import os
 from pathlib import Path
+from typing import IO, Iterator, Optional, Union
 
 from recipe_xml_converter import config
+from recipe_xml_converter.inputs import ArchiveMember, is_bundle, list_members
 
 
 def setup_logging() -> None:
@@ -13,16 +22,130 @@ def setup_logging() -> None:
     )
 
 
-def get_files_in_path(path: Path) -> tuple[Path, ...]:
+def get_files_in_path(path: Path) -> tuple[Union[Path, ArchiveMember], ...]:
     """
-    Return all the XML files contained in the path.
+    Return all the XML files contained in the path, including those in archives.
 
     :param path: the path to traverse
-    :return: the paths to all XML files contained in the path
+    :return: the paths to all XML files and the XML members of all archives contained in the path
     """
     if path.is_file():
-        return (path,)
+        return list_members(path) if is_bundle(path) else (path,)
     elif path.is_dir():
-        return tuple(path.rglob("*.xml"))
+        files = [
+            found
+            for found in sorted(path.rglob("*"))
+            if found.is_file() and (found.suffix == ".xml" or is_bundle(found))
+        ]
+        return tuple([member for file in files for member in get_files_in_path(file)])
     else:
         raise ValueError(f"Cannot locate input file(s) at {path}")
+
+
+def get_input_root(files: tuple[Union[Path, IO, ArchiveMember], ...]) -> Optional[Path]:
+    """
+    Return the deepest directory holding all input files and archives on disk.
+
+    :param files: the full paths to the files, the archive members or the file objects
+    :return: the full path to the directory or None if no input is on disk
+    """
+    paths = [
+        file.archive if isinstance(file, ArchiveMember) else file
+        for file in files
+        if isinstance(file, (Path, ArchiveMember))
+    ]
+    if not paths:
+        return None
+    try:
+        return Path(os.path.commonpath([path.absolute().parent for path in paths]))
+    except ValueError:  # on different drives
+        return None
+
+
+def get_file_name(
+    file: Union[Path, IO, ArchiveMember], root: Optional[Path] = None
+) -> str:
+    """
+    Return a human readable name of an input file.
+
+    Files on disk and archives are named by their path relative to the root, so that inputs
+    of the same name in different folders or archives can be told apart.
+
+    :param file: the full path to the file, the archive member or the file object
+    :param root: the full path to the directory the names are relative to or None to name
+        files by their path as given
+    :return: the name of the file or a placeholder for anonymous file objects
+    """
+    if isinstance(file, ArchiveMember):
+        archive = get_file_name(file.archive, root)
+        return f"{archive}/{file.member}" if file.member else archive
+    if isinstance(file, Path):
+        if root is not None:
+            with contextlib.suppress(ValueError):
+                return file.absolute().relative_to(root).as_posix()
+        return file.as_posix()
+    # file descriptors of temporary files are no names
+    name = getattr(file, "name", None)
+    return name if isinstance(name, str) and name else f"<{type(file).__name__}>"
+
+
+def get_file_size(file: Union[Path, IO, ArchiveMember]) -> int:
+    """
+    Return the number of bytes of an input file.
+
+    :param file: the full path to the file, the archive member or the seekable file object
+    :return: the size of the file
+    """
+    if isinstance(file, Path):
+        return file.stat().st_size
+    if isinstance(file, ArchiveMember):
+        # compressed single files don't record their size, so use the compressed one
+        return file.size if file.size is not None else file.archive.stat().st_size
+    position = file.tell()
+    size = file.seek(0, os.SEEK_END)
+    file.seek(position)
+    return size
+
+
+@contextlib.contextmanager
+def map_file(
+    file: Union[Path, IO], min_size: int = config.MMAP_MIN_SIZE
+) -> Iterator[Optional[mmap.mmap]]:
+    """
+    Memory-map an input file that is stored on disk.
+
+    Files smaller than min_size, decompressed streams and file objects that aren't backed by
+    a file descriptor are never mapped. Mapping a spooled temporary file writes it to disk
+    if it is still held in memory, which only happens to those larger than min_size.
+
+    :param file: the full path to the file or the file object to map
+    :param min_size: the minimum file size in bytes worth mapping
+    :return: a context manager yielding the read-only map or None if the file can't be mapped
+    """
+    if isinstance(file, (gzip.GzipFile, bz2.BZ2File, lzma.LZMAFile)):
+        # their file descriptor holds the compressed data
+        yield None
+        return
+
+    # the size is checked first, since asking a spooled temporary file for its file
+    # descriptor writes it to disk if it is still held in memory
+    try:
+        size = get_file_size(file)
+    except (AttributeError, OSError, ValueError):
+        size = 0
+    if size == 0 or size < min_size:
+        yield None
+        return
+
+    with contextlib.ExitStack() as stack:
+        try:
+            if isinstance(file, Path):
+                fileno = stack.enter_context(open(file, "rb")).fileno()
+            else:
+                fileno = file.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            yield None
+            return
+
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
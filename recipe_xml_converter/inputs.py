@@ -0,0 +1,229 @@
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import tarfile
+import threading
+import zipfile
+from pathlib import Path
+from typing import IO, Any, Callable, Iterator, Optional
+
+from recipe_xml_converter.exceptions import InvalidInputException
+
+COMPRESSED_SUFFIXES: dict[str, Callable[[Path], IO[bytes]]] = {
+    ".gz": gzip.open,  # type: ignore
+    ".tgz": gzip.open,  # type: ignore
+    ".bz2": bz2.open,  # type: ignore
+    ".xz": lzma.open,  # type: ignore
+}
+"""The functions opening the decompressed stream of compressed files by file suffix."""
+
+_local = threading.local()
+
+
+class ArchiveMember:
+    """
+    A RecipeML file inside a zip or tar archive or a compressed file.
+
+    Members are read straight from the archive rather than being extracted to disk first.
+    They can be sent to worker processes, which open them on their own, except for members
+    of compressed tar archives, which are only read in order and extracted for the workers.
+    """
+
+    def __init__(
+        self,
+        archive: Path,
+        member: Optional[str] = None,
+        offset: Optional[int] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        """
+        Create a new member.
+
+        :param archive: the full path to the archive or compressed file
+        :param member: the name of the member in the archive or None for compressed files
+        :param offset: the position of the member's data in the decompressed tar archive
+        :param size: the number of bytes of the decompressed member if known
+        """
+        self.archive = archive
+        self.member = member
+        self.size = size
+        """The number of bytes of the decompressed member if the archive records it."""
+        self._offset = offset
+
+    @property
+    def name(self) -> str:
+        """Return the name of the member including the name of its archive."""
+        return (
+            f"{self.archive.name}/{self.member}" if self.member else self.archive.name
+        )
+
+    @property
+    def sequential(self) -> bool:
+        """Return whether the member is in a compressed tar archive, read best in order."""
+        return self._offset is not None and self.archive.suffix in COMPRESSED_SUFFIXES
+
+    def open(self) -> IO[bytes]:
+        """
+        Open the member for reading.
+
+        :return: the file object of the decompressed member, which the caller must close
+        """
+        if self.member is None:
+            return COMPRESSED_SUFFIXES[self.archive.suffix](self.archive)
+        if self._offset is None:
+            with zipfile.ZipFile(self.archive) as archive:
+                # the member keeps the archive file open until it is closed itself
+                return archive.open(self.member)
+
+        streams: Optional[_TarStreams] = getattr(_local, "tar_streams", None)
+        if streams is not None:
+            return self._read_tar_member(streams.open(self.archive))
+        with _open_tar(self.archive) as stream:
+            return self._read_tar_member(stream)
+
+    def _read_tar_member(self, stream: IO[bytes]) -> IO[bytes]:
+        """Read the data of a tar member from the stream of its archive into memory."""
+        stream.seek(self._offset or 0)
+        return io.BytesIO(stream.read(self.size or 0))
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the member as a dict of JSON types, so it can be recreated elsewhere."""
+        return {
+            "archive": str(self.archive),
+            "member": self.member,
+            "offset": self._offset,
+            "size": self.size,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "ArchiveMember":
+        """
+        Recreate a member from the dict created by to_dict.
+
+        :param data: the archive, member, offset and size of the member
+        :return: the member
+        """
+        return cls(Path(data["archive"]), data["member"], data["offset"], data["size"])
+
+    def __repr__(self) -> str:
+        """Return the name of the member."""
+        return f"ArchiveMember({self.name})"
+
+
+class _TarStreams:
+    """The stream of the tar archive last read on a thread, kept open for its next member."""
+
+    def __init__(self) -> None:
+        """Create the streams without an open one."""
+        self._archive: Optional[Path] = None
+        self._stream: Optional[IO[bytes]] = None
+
+    def open(self, archive: Path) -> IO[bytes]:
+        """
+        Return the stream of a tar archive, closing the one of another archive.
+
+        :param archive: the full path to the tar archive
+        :return: the decompressed stream
+        """
+        if self._stream is None or self._archive != archive:
+            self.close()
+            self._archive, self._stream = archive, _open_tar(archive)
+        return self._stream
+
+    def close(self) -> None:
+        """Close the open stream."""
+        if self._stream is not None:
+            self._stream.close()
+        self._archive = self._stream = None
+
+
+@contextlib.contextmanager
+def tar_streams() -> Iterator[None]:
+    """
+    Keep the stream of the tar archive last read on this thread open until the end of a job.
+
+    Members of a compressed tar archive read one after the other in the order of the archive
+    then decompress it only once, instead of once per member. Seeking backwards starts
+    decompressing from the beginning again, so the members should be read in order.
+
+    :return: a context manager closing the stream when it exits
+    """
+    previous = getattr(_local, "tar_streams", None)
+    _local.tar_streams = streams = _TarStreams()
+    try:
+        yield
+    finally:
+        streams.close()
+        _local.tar_streams = previous
+
+
+def _open_tar(archive: Path) -> IO[bytes]:
+    """Open the decompressed stream of a tar archive."""
+    open_stream = COMPRESSED_SUFFIXES.get(archive.suffix, open)
+    return open_stream(archive, "rb")  # type: ignore
+
+
+def is_bundle(path: Path) -> bool:
+    """
+    Check whether a file is an archive or compressed file that may contain RecipeML files.
+
+    :param path: the full path to the file
+    :return: whether the file name ends with a supported archive or compression suffix
+    """
+    return (
+        path.suffix in (".zip", ".tar")
+        or path.suffix in COMPRESSED_SUFFIXES
+        and (path.suffix == ".tgz" or path.with_suffix("").suffix in (".xml", ".tar"))
+    )
+
+
+def list_members(path: Path) -> tuple[ArchiveMember, ...]:
+    """
+    List the XML files inside an archive or compressed file without extracting them.
+
+    Tar archives are read once to find their members.
+
+    :param path: the full path to the archive or compressed file
+    :return: the members in the order of the archive
+    :raises InvalidInputException: if the archive can't be read
+    """
+    try:
+        return _list_members(path)
+    except (
+        OSError,
+        EOFError,
+        zipfile.BadZipFile,
+        tarfile.TarError,
+        lzma.LZMAError,
+    ) as e:
+        raise InvalidInputException(f"Unreadable archive {path.name}: {e}") from e
+
+
+def _list_members(path: Path) -> tuple[ArchiveMember, ...]:
+    """
+    List the XML files inside an archive or compressed file.
+
+    :param path: the full path to the archive or compressed file
+    :return: the members in the order of the archive
+    """
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            return tuple(
+                [
+                    ArchiveMember(path, info.filename, size=info.file_size)
+                    for info in archive.infolist()
+                    if not info.is_dir() and info.filename.endswith(".xml")
+                ]
+            )
+    if path.suffix in (".tar", ".tgz") or path.with_suffix("").suffix == ".tar":
+        with tarfile.open(path, "r:*") as archive:
+            return tuple(
+                [
+                    ArchiveMember(path, info.name, info.offset_data, info.size)
+                    for info in archive
+                    if info.isfile() and info.name.endswith(".xml")
+                ]
+            )
+    return (ArchiveMember(path),)
@@ -1,45 +1,247 @@
 import abc
+import contextlib
+import functools
+import hashlib
+import json
 import logging
-import tempfile
+import lzma
+import os
+import re
+import shutil
 import time
 import uuid
 import zipfile
+import zlib
 from pathlib import Path
-from typing import IO, Optional, Type, Union
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterator, Optional, Type, Union
 
-from lxml.builder import E
-from tqdm import tqdm
+from lxml import etree as ET
 
 from recipe_xml_converter import config
-from recipe_xml_converter.exceptions import TransformerException
+from recipe_xml_converter.archive import (
+    COMPRESSION_METHODS,
+    INDEX_NAME,
+    MANIFEST_NAME,
+    REPORT_NAME,
+    ParallelEntryWriter,
+    ZipWriter,
+    copy_file,
+    copy_members,
+    index_cookbook,
+    is_ordered,
+    open_entry,
+    read_index,
+    read_manifest,
+    write_cookbook,
+    write_entry,
+    write_index,
+    write_manifest,
+)
+from recipe_xml_converter.exceptions import (
+    InvalidInputException,
+    TimeoutException,
+    TransformerException,
+)
+from recipe_xml_converter.helpers import get_file_name, get_file_size, get_input_root
+from recipe_xml_converter.inputs import ArchiveMember, tar_streams
+from recipe_xml_converter.profiling import (
+    PYTHON_PROFILE_SUFFIX,
+    XSLT_PROFILE_SUFFIX,
+    aggregate_python_profiles,
+    aggregate_xslt_profiles,
+    python_profile,
+)
+from recipe_xml_converter.progress import (
+    COMBINE,
+    EXPORT,
+    SORT,
+    TRANSFORM,
+    ProgressBus,
+)
+from recipe_xml_converter.report import (
+    FAILED,
+    REJECTED,
+    SALVAGED,
+    TIMED_OUT,
+    TRANSFORMED,
+    TransformationReport,
+)
+from recipe_xml_converter.results import ResultStore, hash_file
+from recipe_xml_converter.scratch import ScratchDir, ScratchSpace
 from recipe_xml_converter.transformer import (
     RecipeCombiner,
     RecipeTransformer,
     Transformer,
+    stylesheets_digest,
 )
 
+if TYPE_CHECKING:
+    from recipe_xml_converter.distributed import WorkQueue
+    from recipe_xml_converter.exporters import Exporter
+    from recipe_xml_converter.workers import WorkerPool
+
+# lxml.builder, the worker pool, the work queue, the exporters and the sorting are imported
+# where they are used to keep the start-up of the CLI fast
+
 logger = logging.getLogger(__name__)
 
 
+def transform_file(
+    transformer_class: Type[Transformer],
+    file: Union[Path, IO, ArchiveMember],
+    target_path: Path,
+    recover: bool,
+    profile: bool = False,
+    profile_python: bool = False,
+) -> bool:
+    """
+    Transform one file with a new transformer instance, in this or in a worker process.
+
+    The profiles are saved next to the transformed file, with which they share the name.
+
+    :param transformer_class: the transformer to use
+    :param file: the full path to the file to be transformed, the archive member or the file object
+    :param target_path: the full path to save the transformed file to
+    :param recover: whether to try salvaging malformed input files
+    :param profile: whether to save the timings of the stylesheet templates
+    :param profile_python: whether to save a cProfile of the transformation
+    :return: whether the file was malformed and only partially salvaged
+    """
+    if isinstance(file, ArchiveMember):
+        try:
+            with file.open() as member:
+                return transform_file(
+                    transformer_class,
+                    member,
+                    target_path,
+                    recover,
+                    profile,
+                    profile_python,
+                )
+        except (OSError, EOFError, zipfile.BadZipFile, lzma.LZMAError, zlib.error) as e:
+            raise TransformerException(f"Failed to read {file.name}: {e}") from e
+
+    transformer = transformer_class(file, target_path, recover, profile)
+    with python_profile(
+        target_path.with_suffix(PYTHON_PROFILE_SUFFIX) if profile_python else None
+    ):
+        transformer.transform_and_save()
+    if profile:
+        target_path.with_suffix(XSLT_PROFILE_SUFFIX).write_text(
+            json.dumps(transformer.profile)
+        )
+    return transformer.salvaged
+
+
 class Orchestrator(abc.ABC):
     """General orchestrator for a complete workflow of transforming and combining multiple XML files."""
 
     def __init__(
         self,
-        input_files: tuple[Union[Path, IO], ...],
+        input_files: tuple[Union[Path, IO, ArchiveMember], ...],
         output_dir: Path,
         max_files_combined: int = 1000,
+        recover: bool = config.RECOVER_MALFORMED,
+        quarantine_dir: Optional[Path] = (
+            Path(config.QUARANTINE_DIR) if config.QUARANTINE_DIR else None
+        ),
+        workers: int = config.WORKERS,
+        min_workers: int = config.MIN_WORKERS,
+        memory_budget: int = config.MEMORY_BUDGET,
+        file_timeout: Optional[float] = config.FILE_TIMEOUT,
+        job_timeout: Optional[float] = config.JOB_TIMEOUT,
+        output_format: str = "xml",
+        recipes_per_shard: int = config.RECIPES_PER_SHARD,
+        max_entry_size: int = config.MAX_ENTRY_SIZE,
+        index: bool = config.ARCHIVE_INDEX,
+        stream_combine: bool = config.STREAM_COMBINE,
+        compression: str = config.ARCHIVE_COMPRESSION,
+        sort_by: str = config.SORT_BY,
+        partition_by: str = config.PARTITION_BY,
+        profile: bool = config.PROFILE,
+        profile_python: bool = config.PROFILE_PYTHON,
+        result_store_dir: Optional[Path] = (
+            Path(config.RESULT_STORE_DIR) if config.RESULT_STORE_DIR else None
+        ),
     ) -> None:
         """
         Initialize a new orchestrator instance.
 
-        :param input_files: the full paths to the input files to transform
+        :param input_files: the full paths to the input files, archive members or file objects to transform
         :param output_dir: the full path to the target folder where the transformation results should be saved
         :param max_files_combined: the maximum number of files to combine into one
+        :param recover: whether to try salvaging malformed input files instead of rejecting them
+        :param quarantine_dir: the full path to a folder where a copy of rejected input files should be kept
+        :param workers: the number of worker processes transforming files or 0 to transform them in this process
+        :param min_workers: the number of idle worker processes to keep while waiting files
+            don't fit into the memory budget
+        :param memory_budget: the maximum number of bytes the files transformed at the same time
+            are estimated to need or 0 to run as many as there are workers
+        :param file_timeout: the maximum number of seconds the transformation of a single file may take
+        :param job_timeout: the maximum number of seconds the transformation of all files may take
+        :param output_format: xml to combine the transformed files or the format of one of the exporters
+        :param recipes_per_shard: the number of recipes per chunk large input files are split into
+            to transform them in parallel or 0 to transform every file as a whole
+        :param max_entry_size: the maximum number of bytes of transformed files to combine into one
+            or 0 to only limit the number of files
+        :param index: whether to add an index locating every recipe in the combined files
+        :param stream_combine: whether to combine the transformed files straight into the
+            archive instead of saving the combined files first
+        :param compression: the name of the zip compression method of the combined files,
+            which are compressed on COMPRESSION_THREADS threads unless they are stored
+        :param sort_by: the order of the items in the combined files or an empty string to
+            keep them in the order of the input files
+        :param partition_by: the way of partitioning the items into folders of combined files
+            or an empty string for a single folder
+        :param profile: whether to save the timings of the stylesheet templates of all
+            transformations next to the archive
+        :param profile_python: whether to save the merged cProfile of all transformations next
+            to the archive
+        :param result_store_dir: the full path to a folder keeping the archives of earlier jobs
+            to return them again for identical jobs instead of transforming the files
         """
+        if output_format != "xml" and output_format not in self._exporter_classes:
+            raise ValueError(f"Unsupported output format {output_format}")
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Unsupported compression {compression}")
+        if sort_by and sort_by not in self._sort_keys:
+            raise ValueError(f"Unsupported sort order {sort_by}")
+        if partition_by and partition_by not in self._partitions:
+            raise ValueError(f"Unsupported partitioning {partition_by}")
+
         self._input_files = input_files
+        self._input_root = get_input_root(input_files)
         self._output_dir = output_dir
         self._max_files_combined = max_files_combined
+        self._recover = recover
+        self._quarantine_dir = quarantine_dir
+        self._workers = workers
+        self._min_workers = min_workers
+        self._memory_budget = memory_budget
+        self._file_timeout = file_timeout
+        self._job_timeout = job_timeout
+        self._output_format = output_format
+        self._recipes_per_shard = recipes_per_shard
+        self._max_entry_size = max_entry_size
+        self._index = index
+        self._stream_combine = stream_combine
+        self._compression = compression
+        self._sort_by = sort_by
+        self._partition_by = partition_by
+        self._profile = profile
+        self._profile_python = profile_python
+        self._result_store = (
+            ResultStore(result_store_dir, config.RESULT_STORE_MAX_SIZE)
+            if result_store_dir
+            else None
+        )
+        self._deadline: Optional[float] = None
+        self.report = TransformationReport()
+        """The outcome of every input file of the last orchestration."""
+        self.progress = ProgressBus()
+        """The progress of the stages of the orchestrations, which callers subscribe to."""
+        self.profile: list[dict[str, Any]] = []
+        """The total calls and milliseconds of every template of the last orchestration if profiling."""
 
     @property
     @abc.abstractmethod
@@ -51,40 +253,843 @@ class Orchestrator(abc.ABC):
     def _combiner_class(self) -> Type[Transformer]:
         """Return the transformer to use to combine the transformed files."""
 
+    @property
+    def _exporter_classes(self) -> dict[str, Type["Exporter"]]:
+        """Return the exporters to use instead of the combiner for each output format."""
+        return {}
+
+    @property
+    def _sort_keys(self) -> tuple[str, ...]:
+        """Return the orders the items of the combined files can be sorted in."""
+        return ()
+
+    @property
+    def _partitions(self) -> tuple[str, ...]:
+        """Return the ways the items of the combined files can be partitioned."""
+        return ()
+
     def orchestrate(self) -> Path:
         """
         Transform and combine all input files saving the result to the target location as a zip archive.
 
+        Files that fail or time out are left out of the archive and listed in its report. With
+        a result store, the archive of an identical earlier job is returned instead.
+
         :return: the path to the zip archive
         """
-        with tempfile.TemporaryDirectory(dir=config.BASE_DATA_DIR) as work_dir:
-            transformed_files = self._transform_files(Path(work_dir))
+        reused_path = self._reuse_result()
+        if reused_path is not None:
+            return reused_path
+
+        if self._job_timeout is not None:
+            self._deadline = time.monotonic() + self._job_timeout
+
+        scratch_dir = self._create_scratch_dir()
+        with scratch_dir as work_dir:
+            transformed_files = self._transform_files(work_dir)
+            scratch_dir.check()
+            archive_path = self._package(transformed_files, work_dir)
+            self._save_profiles(work_dir, archive_path)
+
+        # failures and timeouts may not happen again, so such results aren't reused
+        if self._result_store is not None and not any(
+            entry["status"] in (FAILED, TIMED_OUT) for entry in self.report.files
+        ):
+            self._result_store.put(archive_path)
+        return archive_path
+
+    def _create_scratch_dir(self) -> ScratchDir:
+        """
+        Create the working directory of the job on the scratch space fitting its input files.
+
+        :raises ScratchSpaceException: if the job doesn't fit into the scratch space
+        """
+        return ScratchSpace.from_config().create(
+            sum([get_file_size(file) for file in self._input_files])
+            * config.SCRATCH_PER_INPUT_BYTE
+        )
+
+    @functools.cached_property
+    def _archive_name(self) -> str:
+        """
+        Return the name of the archive, a hash of the input files and the settings of the job.
+
+        Identical jobs get the same name, so they can reuse each other's result, while
+        concurrent different jobs writing to the same folder never collide.
+        """
+        digest = hashlib.sha256(
+            json.dumps(
+                [
+                    type(self).__qualname__,
+                    stylesheets_digest(),
+                    self._max_files_combined,
+                    self._max_entry_size,
+                    self._recover,
+                    self._output_format,
+                    self._index,
+                    self._compression,
+                    self._sort_by,
+                    self._partition_by,
+                    self._file_timeout,
+                    self._job_timeout,
+                ]
+            ).encode()
+        )
+        archive_hashes: dict[Path, str] = {}
+        for file in self._input_files:
+            digest.update(get_file_name(file, self._input_root).encode() + b"\0")
+            if isinstance(file, ArchiveMember):
+                if file.archive not in archive_hashes:
+                    with open(file.archive, "rb") as archive:
+                        archive_hashes[file.archive] = hash_file(archive)
+                digest.update(archive_hashes[file.archive].encode())
+            elif isinstance(file, Path):
+                with open(file, "rb") as input_file:
+                    digest.update(hash_file(input_file).encode())
+            else:
+                digest.update(hash_file(file).encode())
+        return f"{digest.hexdigest()[:32]}_transformed.zip"
+
+    def _reuse_result(self) -> Optional[Path]:
+        """
+        Copy the archive of an identical earlier job from the result store to the output folder.
+
+        :return: the full path to the copied archive or None if there is none to reuse
+        """
+        if self._result_store is None or self._profile or self._profile_python:
+            return None
+
+        archive_path = self._result_store.get(self._archive_name, self._output_dir)
+        if archive_path is None:
+            return None
+        with zipfile.ZipFile(archive_path) as archive:
+            self.report = TransformationReport.from_json(archive.read(REPORT_NAME))
+        logger.info(f"Reused the result of an identical job {archive_path.name}")
+        return archive_path
+
+    def orchestrate_distributed(
+        self,
+        shared_dir: Path,
+        files_per_claim: int = config.FILES_PER_CLAIM,
+        claim_timeout: float = config.CLAIM_TIMEOUT,
+    ) -> Path:
+        """
+        Transform the input files together with the nodes working on a shared directory.
+
+        The input files are published to a work queue in the shared directory, which has to
+        be mounted at the same path on every node, and this process works on it as well until
+        every chunk is done. The transformed files are then combined and zipped as by
+        orchestrate, and the queue is cleared for the next job. Running the same job again
+        for the directory resumes it if it ran out of time or crashed.
+
+        :param shared_dir: the full path to the directory all nodes mount
+        :param files_per_claim: the number of input files a node claims at once
+        :param claim_timeout: the number of seconds after which the chunk of a node that
+            stopped reporting progress is handed to another node
+        :return: the path to the zip archive
+        :raises TransformerException: if the directory holds another unfinished job
+        """
+        from recipe_xml_converter.distributed import (
+            FRAGMENTS_DIR,
+            INPUTS_DIR,
+            WorkQueue,
+            decode_outcome,
+            encode_input,
+        )
+
+        if self._job_timeout is not None:
+            self._deadline = time.monotonic() + self._job_timeout
+
+        queue = WorkQueue(shared_dir, claim_timeout)
+        try:
+            inputs = [
+                (
+                    file
+                    if isinstance(file, (Path, ArchiveMember))
+                    else self._spill(file, shared_dir)
+                )
+                for file in self._input_files
+            ]
+            if not queue.publish(
+                [encode_input(file) for file in inputs],
+                files_per_claim,
+                self._archive_name,
+            ):
+                logger.info(f"Resuming the job in {shared_dir}")
+            while queue.pending():
+                if self._deadline is not None and time.monotonic() >= self._deadline:
+                    break
+                if not self._work(queue, shared_dir):
+                    # the other nodes' chunks are done or go stale meanwhile
+                    time.sleep(1)
+            outcomes = queue.outcomes()
+
+            not_done = {"status": TIMED_OUT, "reason": "The job ran out of time"}
+            transformed_files = [
+                self._record_outcome(
+                    file,
+                    shared_dir
+                    / outcomes.get(position, {}).get("fragment", FRAGMENTS_DIR),
+                    decode_outcome(outcomes.get(position, not_done)),
+                )
+                for position, file in enumerate(self._input_files)
+            ]
+            # the files are combined next to the fragments, the only place the combiner
+            # may read
+            archive_path = self._package(
+                tuple([file for file in transformed_files if file]),
+                shared_dir / FRAGMENTS_DIR,
+            )
+            self._save_profiles(shared_dir / FRAGMENTS_DIR, archive_path)
+            if not queue.pending():
+                # a job that ran out of time stays in the queue to be resumed
+                queue.clear()
+                shutil.rmtree(shared_dir / FRAGMENTS_DIR, ignore_errors=True)
+                shutil.rmtree(shared_dir / INPUTS_DIR, ignore_errors=True)
+        finally:
+            queue.close()
+        return archive_path
+
+    def work(
+        self,
+        shared_dir: Path,
+        claim_timeout: float = config.CLAIM_TIMEOUT,
+        publish_timeout: float = 600,
+    ) -> int:
+        """
+        Transform chunks of the job published to a shared directory until none is left.
+
+        The input files are ignored, nodes only transform the files of the job. Combining
+        them is left to the process that published the job with orchestrate_distributed.
+
+        :param shared_dir: the full path to the directory all nodes mount
+        :param claim_timeout: the number of seconds after which the chunk of a node that
+            stopped reporting progress is handed to another node
+        :param publish_timeout: the maximum number of seconds to wait for the job
+        :return: the number of chunks this node transformed
+        """
+        from recipe_xml_converter.distributed import WorkQueue
+
+        queue = WorkQueue(shared_dir, claim_timeout)
+        try:
+            queue.wait_until_published(publish_timeout)
+            return self._work(queue, shared_dir)
+        finally:
+            queue.close()
+
+    def _work(self, queue: "WorkQueue", shared_dir: Path) -> int:
+        """
+        Claim and transform chunks of a work queue until none is left to claim.
+
+        :param queue: the work queue of the job
+        :param shared_dir: the full path to the directory all nodes mount
+        :return: the number of chunks this node transformed
+        """
+        from recipe_xml_converter.distributed import (
+            FRAGMENTS_DIR,
+            decode_input,
+            encode_outcome,
+            node_name,
+        )
+        from recipe_xml_converter.workers import WorkerPool
+
+        node = node_name()
+        (shared_dir / FRAGMENTS_DIR).mkdir(exist_ok=True)
+        chunks = 0
+        with contextlib.ExitStack() as stack:
+            pool = (
+                stack.enter_context(
+                    WorkerPool(
+                        self._workers,
+                        self._file_timeout,
+                        min_workers=self._min_workers,
+                        memory_budget=self._memory_budget,
+                    )
+                )
+                if self._workers or self._file_timeout
+                else None
+            )
+            while (claim := self._claim(queue, node)) is not None:
+                chunk, files = claim
+                fragments = [
+                    f"{FRAGMENTS_DIR}/{position}-{uuid.uuid4()}.xml"
+                    for position, _ in files
+                ]
+                tasks = [
+                    (
+                        self._transformer_class,
+                        decode_input(data),
+                        shared_dir / fragment,
+                        self._recover,
+                        self._profile,
+                        self._profile_python,
+                    )
+                    for (_, data), fragment in zip(files, fragments)
+                ]
+                with queue.keep_claimed(chunk, node):
+                    outcomes = self._transform_chunk(tasks, pool)
+
+                if queue.complete(
+                    chunk,
+                    node,
+                    [
+                        encode_outcome(outcome, fragment)
+                        for outcome, fragment in zip(outcomes, fragments)
+                    ],
+                ):
+                    chunks += 1
+                else:
+                    logger.warning(f"Chunk {chunk} was taken over by another node")
+        return chunks
+
+    @staticmethod
+    def _transform_chunk(
+        tasks: list[tuple], pool: Optional["WorkerPool"]
+    ) -> list[Union[bool, Exception]]:
+        """
+        Transform the files of a chunk, in worker processes enforcing FILE_TIMEOUT if given.
+
+        :param tasks: the arguments of transform_file for each file
+        :param pool: the worker processes or None to transform the files in this process
+        :return: whether each file was salvaged or the exception raised while transforming it
+        """
+        outcomes: list[Union[bool, Exception]] = []
+        if pool is None:
+            for task in tasks:
+                try:
+                    outcomes.append(transform_file(*task))
+                except TransformerException as e:
+                    outcomes.append(e)
+            return outcomes
+
+        outcomes = [TimeoutException("Not transformed") for _ in tasks]
+        for index, outcome in pool.imap_unordered(transform_file, tasks):
+            outcomes[index] = outcome
+        return outcomes
+
+    def _claim(
+        self, queue: "WorkQueue", node: str
+    ) -> Optional[tuple[int, list[tuple[int, dict]]]]:
+        """
+        Claim the next chunk of a work queue unless the job ran out of time.
+
+        :param queue: the work queue of the job
+        :param node: the name of this node
+        :return: the id of the chunk and the positions and files in it or None to stop
+        """
+        if self._deadline is not None and time.monotonic() >= self._deadline:
+            return None
+        return queue.claim(node)
+
+    def _package(self, transformed_files: tuple[Path, ...], work_dir: Path) -> Path:
+        """
+        Combine or export the transformed files and save them to a zip archive.
+
+        :param transformed_files: the full paths to the transformed files in order
+        :param work_dir: the full path to the directory for intermediate files
+        :return: the path to the zip archive
+        """
+        logger.info(
+            f"Successfully transformed {len(transformed_files)}/{len(self._input_files)} files."
+        )
+
+        if self._output_format != "xml":
+            exported_file = self._export_files(transformed_files, work_dir)
+            return self._zip_files(
+                (exported_file,), (f"recipes.{exported_file.suffix[1:]}",)
+            )
+
+        if self._sort_by or self._partition_by:
+            combined_files, entry_names = self._sort_files(transformed_files, work_dir)
             logger.info(
-                f"Successfully transformed {len(transformed_files)}/{len(self._input_files)} files."
+                f"Sorted all {len(transformed_files)} transformed files into {len(combined_files)} files."
+            )
+            # the entries mix the items of many files, so none counts as having room left
+            return self._zip_files(
+                combined_files,
+                entry_names,
+                file_counts=tuple([None for _ in combined_files]),
+                ordered=True,
             )
 
-            file_lists = self._generate_file_lists(transformed_files, Path(work_dir))
-            logger.info(f"Generated {len(file_lists)} file lists.")
+        file_groups = [group for group in self._group_files(transformed_files) if group]
+        if self._stream_combine:
+            archive_path = self._zip_groups(file_groups)
+            logger.info(
+                f"Combined all {len(transformed_files)} transformed files into {len(file_groups)} entries."
+            )
+            return archive_path
+
+        file_lists = self._generate_file_lists(file_groups, work_dir)
+        logger.info(f"Generated {len(file_lists)} file lists.")
+
+        combined_files = self._combine_files(file_lists, work_dir)
+        logger.info(
+            f"Combined all {len(transformed_files)} transformed files into {len(combined_files)} files."
+        )
 
-            combined_files = self._combine_files(file_lists, Path(work_dir))
+        return self._zip_files(
+            combined_files, file_counts=tuple([len(group) for group in file_groups])
+        )
+
+    def append(self, archive_path: Path) -> Path:
+        """
+        Transform all input files and add them to an archive created by orchestrate.
+
+        The transformed files are combined with the last entry of the archive until it holds
+        max_files_combined files or max_entry_size bytes, the rest go to new entries. The
+        compressed data of the other entries is copied as it is to a new archive that
+        replaces the old one once it is complete, so a failed update leaves the archive
+        intact. An archive named by orchestrate is
+        renamed afterwards, so running the job that created it again doesn't replace it.
+
+        :param archive_path: the full path to the zip archive to update
+        :return: the full path to the updated archive
+        :raises ValueError: if the archive or this job is sorted or partitioned
+        """
+        if self._output_format != "xml":
+            raise ValueError("Only archives of combined XML files can be appended to")
+        if self._sort_by or self._partition_by:
+            raise ValueError(
+                "Sorted or partitioned files can't be appended to an archive"
+            )
+        if self._job_timeout is not None:
+            self._deadline = time.monotonic() + self._job_timeout
+
+        with zipfile.ZipFile(archive_path) as archive:
+            if is_ordered(archive):
+                raise ValueError(
+                    "Files can't be appended to a sorted or partitioned archive"
+                )
+            entries = read_manifest(archive)
+            report = TransformationReport.from_json(archive.read(REPORT_NAME))
+            records = read_index(archive) if INDEX_NAME in archive.namelist() else None
+
+        scratch_dir = self._create_scratch_dir()
+        with scratch_dir as work_dir:
+            transformed_files = self._transform_files(work_dir)
+            scratch_dir.check()
             logger.info(
-                f"Combined all {len(transformed_files)} transformed files into {len(combined_files)} files."
+                f"Successfully transformed {len(transformed_files)}/{len(self._input_files)} files."
+            )
+
+            # legacy archives without a manifest are never added to
+            last_entry = entries[-1] if entries and entries[-1]["files"] else None
+            file_groups = self._group_files(
+                transformed_files,
+                last_entry["files"] if last_entry else self._max_files_combined,
+                last_entry["size"] if last_entry else 0,
+            )
+            replaced = last_entry if last_entry and file_groups[0] else None
+            if replaced:
+                with zipfile.ZipFile(archive_path) as archive:
+                    last_file = Path(archive.extract(replaced["name"], work_dir))
+                file_groups[0].insert(0, last_file)
+                replaced["files"] += len(file_groups[0]) - 1
+            else:
+                file_groups = [group for group in file_groups if group]
+
+            file_lists = self._generate_file_lists(file_groups, work_dir)
+            combined_files = self._combine_files(file_lists, work_dir)
+
+            # the replaced entry keeps its name, the others continue the numbering
+            new_entries = [
+                {"name": f"{len(entries) + i + 1}.xml", "files": len(group)}
+                for i, group in enumerate(file_groups[1:] if replaced else file_groups)
+            ]
+            entries.extend(new_entries)
+            report.files.extend(self.report.files)
+
+            appended_path = archive_path.with_name(self._appended_name(archive_path))
+            with self._new_archive(appended_path) as writer:
+                copy_members(
+                    archive_path,
+                    writer,
+                    ((replaced["name"],) if replaced else ())
+                    + (REPORT_NAME, MANIFEST_NAME, INDEX_NAME),
+                )
+                written = ([replaced] if replaced else []) + new_entries
+                self._write_files(
+                    writer, combined_files, tuple([entry["name"] for entry in written])
+                )
+                write_entry(writer.archive, REPORT_NAME, report.to_json())
+                write_manifest(writer.archive, entries)
+                if records is not None or self._index:
+                    write_index(
+                        writer.archive,
+                        [
+                            record
+                            for record in records or []
+                            if not replaced or record["entry"] != replaced["name"]
+                        ]
+                        + self._index_files(
+                            combined_files,
+                            tuple([entry["name"] for entry in written]),
+                        ),
+                    )
+            if appended_path != archive_path:
+                archive_path.unlink()
+            archive_path = appended_path
+            self._save_profiles(work_dir, archive_path)
+
+        logger.info(
+            f"Added {len(transformed_files)} transformed files to {len(combined_files)} entries of {archive_path}."
+        )
+        return archive_path
+
+    def _appended_name(self, archive_path: Path) -> str:
+        """
+        Return the name of an archive once the input files were appended to it.
+
+        Archives named by orchestrate are named after a hash of their old name and of this
+        job, other archives keep the name they were given.
+
+        :param archive_path: the full path to the archive
+        :return: the file name of the archive
+        """
+        if not re.fullmatch(r"[0-9a-f]{32}_transformed\.zip", archive_path.name):
+            return archive_path.name
+        digest = hashlib.sha256(f"{archive_path.name}\0{self._archive_name}".encode())
+        return f"{digest.hexdigest()[:32]}_transformed.zip"
+
+    def _save_profiles(self, work_dir: Path, archive_path: Path) -> None:
+        """
+        Aggregate the profiles of all transformations of the job and save them next to the archive.
+
+        :param work_dir: the full path to the directory holding the profiles of the job
+        :param archive_path: the full path to the archive the profiles belong to
+        """
+        if self._profile:
+            self.profile = aggregate_xslt_profiles(
+                sorted(work_dir.rglob(f"*{XSLT_PROFILE_SUFFIX}"))
+            )
+            archive_path.with_suffix(XSLT_PROFILE_SUFFIX).write_text(
+                json.dumps(self.profile, indent=2, ensure_ascii=False)
+            )
+        python_profiles = sorted(work_dir.rglob(f"*{PYTHON_PROFILE_SUFFIX}"))
+        if python_profiles:
+            aggregate_python_profiles(
+                python_profiles, archive_path.with_suffix(PYTHON_PROFILE_SUFFIX)
             )
 
-            return self._zip_files(combined_files)
+    def _export_files(self, files: tuple[Path, ...], target_dir: Path) -> Path:
+        """
+        Export the transformed files to a single file in the output format.
 
-    def _zip_files(self, file_paths: tuple[Path, ...]) -> Path:
+        :param files: the full paths to the transformed files
+        :param target_dir: the target directory to save the exported file
+        :return: the full path to the exported file
+        """
+        exporter_class = self._exporter_classes[self._output_format]
+        target_path = target_dir / f"{uuid.uuid4()}.{self._output_format}"
+        self.progress.start(EXPORT, 1)
+        exporter_class(files, target_path).export()
+        self.progress.advance(EXPORT, size=target_path.stat().st_size)
+        self.progress.finish(EXPORT)
+        logger.info(
+            f"Exported all {len(files)} transformed files to {self._output_format}."
+        )
+        return target_path
+
+    def _zip_files(
+        self,
+        file_paths: tuple[Path, ...],
+        entry_names: Optional[tuple[str, ...]] = None,
+        file_counts: Optional[tuple[Optional[int], ...]] = None,
+        ordered: bool = False,
+    ) -> Path:
         """
-        Create a zip archive containing the XML files defined changing their names with consecutive numbers.
+        Create a zip archive containing the files defined changing their names with consecutive numbers.
 
         :param file_paths: the full paths to the files to include in the archive
+        :param entry_names: the names of the files in the archive instead of consecutive numbers
+        :param file_counts: the number of input files combined into each file, to list them in a
+            manifest so more files can be appended to the archive later and to index them if
+            an index was asked for, None for files that can't take more
+        :param ordered: whether the files are sorted or partitioned, so none can be appended
         :return: the full path to the archive
         """
-        archive_path = self._output_dir / f"{int(time.time())}_transformed.zip"
-        with zipfile.ZipFile(archive_path, mode="w") as archive:
-            for i, file in enumerate(file_paths):
-                archive.write(file, f"{i+1}.xml")
-        return archive_path
+        entry_names = entry_names or tuple(
+            [f"{i+1}.xml" for i in range(len(file_paths))]
+        )
+        with self._new_archive(self._output_dir / self._archive_name) as writer:
+            self._write_files(writer, file_paths, entry_names)
+            write_entry(writer.archive, REPORT_NAME, self.report.to_json())
+            if file_counts is not None:
+                write_manifest(
+                    writer.archive,
+                    [
+                        {"name": name, "files": count}
+                        for name, count in zip(entry_names, file_counts)
+                    ],
+                    ordered,
+                )
+                if self._index:
+                    write_index(
+                        writer.archive, self._index_files(file_paths, entry_names)
+                    )
+        return self._output_dir / self._archive_name
+
+    def _zip_groups(self, file_groups: list[list[Path]]) -> Path:
+        """
+        Create a zip archive combining every group of files straight into a numbered entry.
+
+        :param file_groups: the full paths to the files to combine into each entry
+        :return: the full path to the archive
+        """
+        entry_names = [f"{i+1}.xml" for i in range(len(file_groups))]
+        sizes = [sum(file.stat().st_size for file in group) for group in file_groups]
+
+        def write_combined(
+            target: IO[bytes], entry_name: str, files: list[Path], size: int
+        ) -> list[dict[str, Any]]:
+            records = self._write_combined(target, entry_name, files)
+            self.progress.advance(COMBINE, size=size)
+            return records
+
+        self.progress.start(COMBINE, len(file_groups))
+        with self._new_archive(self._output_dir / self._archive_name) as writer:
+            records = [
+                record
+                for group_records in self._write_entries(
+                    writer,
+                    [
+                        (
+                            entry_name,
+                            functools.partial(
+                                write_combined,
+                                entry_name=entry_name,
+                                files=group,
+                                size=size,
+                            ),
+                            size,
+                        )
+                        for group, entry_name, size in zip(
+                            file_groups, entry_names, sizes
+                        )
+                    ],
+                )
+                for record in group_records
+            ]
+            self.progress.finish(COMBINE)
+            write_entry(writer.archive, REPORT_NAME, self.report.to_json())
+            write_manifest(
+                writer.archive,
+                [
+                    {"name": name, "files": len(group)}
+                    for name, group in zip(entry_names, file_groups)
+                ],
+            )
+            if self._index:
+                write_index(writer.archive, records)
+        return self._output_dir / self._archive_name
+
+    @contextlib.contextmanager
+    def _new_archive(self, archive_path: Path) -> Iterator[ZipWriter]:
+        """
+        Open an archive for writing entries compressed as configured for the job.
+
+        It is written under another name first, so an identical job finishing at the same time
+        never reads or writes a half-written archive.
+
+        :param archive_path: the full path to the archive, which is replaced if it exists
+        """
+        partial_path = archive_path.with_name(f".{uuid.uuid4().hex}.part")
+        try:
+            with open(partial_path, "w+b") as target, ZipWriter(
+                target,
+                COMPRESSION_METHODS[self._compression],
+                config.ARCHIVE_COMPRESSION_LEVEL,
+            ) as writer:
+                yield writer
+            os.replace(partial_path, archive_path)
+        finally:
+            partial_path.unlink(missing_ok=True)
+
+    def _write_files(
+        self,
+        writer: ZipWriter,
+        file_paths: tuple[Path, ...],
+        entry_names: tuple[str, ...],
+    ) -> None:
+        """
+        Add files to an archive as entries of the compression of the job.
+
+        :param writer: the archive opened for writing
+        :param file_paths: the full paths to the files
+        :param entry_names: the names of the entries
+        """
+        self._write_entries(
+            writer,
+            [
+                (entry_name, functools.partial(copy_file, file), file.stat().st_size)
+                for file, entry_name in zip(file_paths, entry_names)
+            ],
+        )
+
+    def _write_entries(
+        self,
+        writer: ZipWriter,
+        entries: list[tuple[str, Callable[[IO[bytes]], Any], int]],
+    ) -> list[Any]:
+        """
+        Add entries to an archive, compressing them on several threads unless they are stored.
+
+        With a single thread, or if they are stored, zipfile writes the entries one after the
+        other as their content is written.
+
+        :param writer: the archive opened for writing
+        :param entries: the name of each entry, the function writing its content to a stream
+            and the number of bytes it won't exceed
+        :return: the return values of the functions in order
+        """
+        if self._compression == "stored" or config.COMPRESSION_THREADS <= 1:
+            results = []
+            for name, write, max_size in entries:
+                with open_entry(writer.archive, name, max_size) as target:
+                    results.append(write(target))
+            return results
+
+        with ParallelEntryWriter(
+            writer,
+            COMPRESSION_METHODS[self._compression],
+            config.COMPRESSION_THREADS,
+            config.ARCHIVE_COMPRESSION_LEVEL,
+            self._output_dir,
+        ) as parallel_writer:
+            for name, write, max_size in entries:
+                parallel_writer.submit(name, write, max_size)
+            return parallel_writer.close()
+
+    @abc.abstractmethod
+    def _write_combined(
+        self, target: IO[bytes], entry_name: str, files: list[Path]
+    ) -> list[dict[str, Any]]:
+        """
+        Combine files into an archive entry without saving the combined file.
+
+        :param target: the stream of the entry
+        :param entry_name: the name of the entry
+        :param files: the full paths to the files to combine in order
+        :return: the index records of all items in the entry
+        """
+
+    def _index_files(
+        self, file_paths: tuple[Path, ...], entry_names: tuple[str, ...]
+    ) -> list[dict[str, Any]]:
+        """
+        Locate the items of the combined files for the index of the archive.
+
+        :param file_paths: the full paths to the combined files
+        :param entry_names: the names of the files in the archive
+        :return: the index records of all items in the files
+        """
+        return []
+
+    def _sort_files(
+        self, files: tuple[Path, ...], work_dir: Path
+    ) -> tuple[tuple[Path, ...], tuple[str, ...]]:
+        """
+        Sort and partition the items of the transformed files with an external merge sort.
+
+        The items are read in sorted runs of SORT_RUN_SIZE items spilled to the work
+        directory, so the memory needed doesn't grow with the job. The runs of every
+        partition are then merged into combined files of at most max_files_combined items
+        and max_entry_size bytes, the partitions in parallel in the worker processes.
+
+        :param files: the full paths to the transformed files in order
+        :param work_dir: the full path to the directory for intermediate files
+        :return: the full paths to the combined files and their names in the archive
+        :raises TransformerException: if a file holds an unexpected item or a partition fails
+        """
+        from recipe_xml_converter.workers import WorkerPool
+
+        runs = self._spill_runs(files, work_dir / "runs")
+        tasks = [
+            (
+                tuple(partition_runs),
+                work_dir / "partitions" / str(i),
+                self._sort_by or None,
+                self._max_entry_size,
+                self._max_files_combined,
+            )
+            for i, partition_runs in enumerate(runs.values())
+        ]
+        costs = [sum(run.stat().st_size for run in task[0]) for task in tasks]
+        results: dict[int, Any] = {}
+        self.progress.start(SORT, len(tasks))
+        if self._workers:
+            with WorkerPool(self._workers) as pool:
+                for i, result in pool.imap_unordered(
+                    self._partition_writer, tasks, costs=costs
+                ):
+                    results[i] = result
+                    self.progress.advance(
+                        SORT, size=costs[i], errors=isinstance(result, Exception)
+                    )
+        else:
+            for i, task in enumerate(tasks):
+                results[i] = self._partition_writer(*task)
+                self.progress.advance(SORT, size=costs[i])
+        self.progress.finish(SORT)
+
+        combined_files: list[Path] = []
+        entry_names: list[str] = []
+        folders: set[str] = set()
+        for i, name in enumerate(runs):
+            if isinstance(results[i], Exception):
+                raise TransformerException(
+                    f"Failed to combine the partition {name}: {results[i]}"
+                )
+            folder = self._partition_folder(name, folders)
+            combined_files.extend(results[i])
+            entry_names.extend([f"{folder}{j + 1}.xml" for j in range(len(results[i]))])
+        return tuple(combined_files), tuple(entry_names)
+
+    @staticmethod
+    def _partition_folder(name: str, taken: set[str]) -> str:
+        """
+        Return the folder of the entries of a partition, unique among the taken ones.
+
+        :param name: the name of the partition, empty for the single partition
+        :param taken: the folders of the partitions before, to which the folder is added
+        :return: the folder with a trailing slash or an empty string for no folder
+        """
+        from recipe_xml_converter.sorting import partition_dir_name
+
+        if not name:
+            return ""
+        folder = partition_dir_name(name)
+        unique, n = folder, 1
+        while unique.casefold() in taken:
+            n += 1
+            unique = f"{folder}_{n}"
+        taken.add(unique.casefold())
+        return f"{unique}/"
+
+    @abc.abstractmethod
+    def _spill_runs(
+        self, files: tuple[Path, ...], run_dir: Path
+    ) -> dict[str, list[Path]]:
+        """
+        Save the items of the transformed files as sorted runs of every partition.
+
+        :param files: the full paths to the transformed files in order
+        :param run_dir: the full path to the directory to save the runs in
+        :return: the full paths to the runs of every partition in order by partition name
+        :raises TransformerException: if a file holds an unexpected item
+        """
+
+    @property
+    @abc.abstractmethod
+    def _partition_writer(self) -> Callable[..., list[Path]]:
+        """
+        Return the module level function merging the runs of a partition into combined files.
+
+        It takes the runs, the directory to save the files in, the sort order and the maximum
+        numbers of bytes and of items of a file and returns the full paths to the files in
+        order.
+        """
 
     def _transform_files(self, target_dir: Path) -> tuple[Path, ...]:
         """
@@ -93,12 +1098,193 @@ class Orchestrator(abc.ABC):
         :param target_dir: the full path to the directory where to save the files
         :return: the full paths to all the created files
         """
-        all_files = [
-            self._transform_file(file, target_dir)
-            for file in tqdm(self._input_files, desc="Files processed")
-        ]
+        if self._workers or self._file_timeout or self._job_timeout:
+            all_files = self._transform_files_in_workers(target_dir)
+        else:
+            self.progress.start(TRANSFORM, len(self._input_files))
+            all_files = []
+            with tar_streams():
+                for file in self._input_files:
+                    all_files.append(self._transform_file(file, target_dir))
+                    self.progress.advance(
+                        TRANSFORM,
+                        size=get_file_size(file),
+                        errors=all_files[-1] is None,
+                    )
+            self.progress.finish(TRANSFORM)
         return tuple([file for file in all_files if file])
 
+    def _transform_files_in_workers(self, target_dir: Path) -> list[Optional[Path]]:
+        """
+        Transform all files in worker processes that are killed when they run out of time.
+
+        Files the workers can't open on their own, file objects and members of compressed
+        tars, are saved to the target directory first, so those inputs are written to disk
+        and read again. The workers save the transformed files there as well, which are read
+        back when they are combined.
+
+        :param target_dir: the full path to the directory where to save the files
+        :return: the full paths to the created files or None for files that weren't transformed
+        """
+        from recipe_xml_converter.workers import WorkerPool
+
+        # the tasks run largest first, so members of compressed tars are extracted in the
+        # order of their archive beforehand instead of decompressing it again for each one
+        inputs: list[Union[Path, ArchiveMember]] = []
+        with tar_streams():
+            for file in self._input_files:
+                if isinstance(file, Path) or (
+                    isinstance(file, ArchiveMember) and not file.sequential
+                ):
+                    inputs.append(file)
+                else:
+                    inputs.append(self._spill(file, target_dir))
+        target_paths = [target_dir / f"{uuid.uuid4()}.xml" for _ in inputs]
+        # large inputs are split so their chunks are transformed by several workers at once
+        tasks: list[tuple[int, Union[Path, ArchiveMember], Path]] = []
+        chunk_targets: dict[int, tuple[Path, ...]] = {}
+        for index, (file, target_path) in enumerate(zip(inputs, target_paths)):
+            chunks = self._shard(file, target_dir)
+            if chunks is None:
+                tasks.append((index, file, target_path))
+                continue
+            chunk_targets[index] = tuple(
+                [target_dir / f"{uuid.uuid4()}.xml" for _ in chunks]
+            )
+            tasks.extend([(index, *task) for task in zip(chunks, chunk_targets[index])])
+        task_outcomes: list[Union[bool, Exception]] = [
+            TimeoutException("Not transformed") for _ in tasks
+        ]
+        task_sizes = [get_file_size(file) for _, file, _ in tasks]
+
+        with WorkerPool(
+            self._workers,
+            self._file_timeout,
+            min_workers=self._min_workers,
+            memory_budget=self._memory_budget,
+        ) as pool:
+            results = pool.imap_unordered(
+                transform_file,
+                [
+                    (
+                        self._transformer_class,
+                        file,
+                        target_path,
+                        self._recover,
+                        self._profile,
+                        self._profile_python,
+                    )
+                    for _, file, target_path in tasks
+                ],
+                self._deadline,
+                [self._estimate_memory(file) for _, file, _ in tasks],
+            )
+            self.progress.start(TRANSFORM, len(tasks))
+            for task, outcome in results:
+                task_outcomes[task] = outcome
+                self.progress.advance(
+                    TRANSFORM,
+                    size=task_sizes[task],
+                    errors=isinstance(outcome, Exception),
+                )
+            self.progress.finish(TRANSFORM)
+
+        outcomes: list[Union[bool, Exception]] = [False for _ in inputs]
+        for (index, _, _), outcome in zip(tasks, task_outcomes):
+            if not isinstance(outcomes[index], Exception):
+                # the first chunk that fails fails the whole file
+                outcomes[index] = (
+                    outcome
+                    if isinstance(outcome, Exception)
+                    else (outcomes[index] or outcome)
+                )
+        for index, targets in chunk_targets.items():
+            if not isinstance(outcomes[index], Exception):
+                try:
+                    self._merge(targets, target_paths[index])
+                except TransformerException as e:
+                    outcomes[index] = e
+
+        return [
+            self._record_outcome(file, target_path, outcome)
+            for file, target_path, outcome in zip(
+                self._input_files, target_paths, outcomes
+            )
+        ]
+
+    @staticmethod
+    def _estimate_memory(file: Union[Path, ArchiveMember]) -> int:
+        """
+        Estimate the memory the transformation of a file needs from the size of the file.
+
+        The input and output trees take about 26 bytes for every byte of a RecipeML file, so
+        MEMORY_PER_INPUT_BYTE errs on the safe side by default.
+
+        :param file: the full path to the input file or the archive member
+        :return: the estimated number of bytes
+        """
+        return get_file_size(file) * config.MEMORY_PER_INPUT_BYTE
+
+    def _shard(
+        self, file: Union[Path, ArchiveMember], target_dir: Path
+    ) -> Optional[tuple[Path, ...]]:
+        """
+        Split a large input file into chunks that can be transformed independently.
+
+        :param file: the full path to the input file or the archive member
+        :param target_dir: the full path to the directory where to save the chunks
+        :return: the full paths to the chunks in order or None if the file isn't split
+        """
+        if (
+            not self._recipes_per_shard
+            or not isinstance(file, Path)
+            or file.stat().st_size < config.SHARD_MIN_SIZE
+        ):
+            return None
+        try:
+            return self._split(file, target_dir / "shards")
+        except ET.XMLSyntaxError:
+            return None  # leave it to the transformer to reject or salvage the file
+
+    def _split(self, file: Path, target_dir: Path) -> Optional[tuple[Path, ...]]:
+        """
+        Split an input file into chunks of at most recipes_per_shard items.
+
+        :param file: the full path to the input file
+        :param target_dir: the full path to the directory where to save the chunks
+        :return: the full paths to the chunks in order or None if the file can't be split
+        """
+        return None
+
+    @abc.abstractmethod
+    def _merge(self, files: tuple[Path, ...], target_path: Path) -> None:
+        """
+        Reassemble the transformed chunks of an input file into a single transformed file.
+
+        :param files: the full paths to the transformed chunks in order
+        :param target_path: the full path to save the transformed file to
+        :raises TransformerException: if the chunks can't be reassembled
+        """
+
+    @staticmethod
+    def _spill(file: Union[IO, ArchiveMember], target_dir: Path) -> Path:
+        """
+        Save a file object or archive member to the target directory for a worker process.
+
+        :param file: the file object or the archive member
+        :param target_dir: the full path to the directory where to save the file
+        :return: the full path to the saved file
+        """
+        target_path = target_dir / "inputs" / f"{uuid.uuid4()}.xml"
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.ExitStack() as stack:
+            if isinstance(file, ArchiveMember):
+                file = stack.enter_context(file.open())
+            file.seek(0)
+            with open(target_path, "wb") as target:
+                shutil.copyfileobj(file, target)
+        return target_path
+
     def _combine_files(
         self, file_lists: tuple[Path, ...], target_dir: Path
     ) -> tuple[Path, ...]:
@@ -107,15 +1293,25 @@ class Orchestrator(abc.ABC):
 
         :param file_lists: the full path to the XML listing all files to be combined
         """
+        self.progress.start(COMBINE, len(file_lists))
         combined_files = []
         for file_list in file_lists:
             target_path = target_dir / f"{uuid.uuid4()}.xml"
-            self._combiner_class(file_list, target_path).transform_and_save()
+            transform_file(
+                self._combiner_class,
+                file_list,
+                target_path,
+                False,
+                self._profile,
+                self._profile_python,
+            )
             combined_files.append(target_path)
+            self.progress.advance(COMBINE, size=target_path.stat().st_size)
+        self.progress.finish(COMBINE)
         return tuple(combined_files)
 
     def _transform_file(
-        self, file: Union[Path, IO], target_dir: Path
+        self, file: Union[Path, IO, ArchiveMember], target_dir: Path
     ) -> Optional[Path]:
         """
         Transform one file and save it to the target directory.
@@ -126,29 +1322,111 @@ class Orchestrator(abc.ABC):
         """
         target_path = Path(target_dir) / f"{uuid.uuid4()}.xml"
         try:
-            self._transformer_class(file, target_path).transform_and_save()
-            return target_path
-        except TransformerException:
-            logger.exception(f"❌ Failed to transform {file.name}")
+            outcome: Union[bool, Exception] = transform_file(
+                self._transformer_class,
+                file,
+                target_path,
+                self._recover,
+                self._profile,
+                self._profile_python,
+            )
+        except TransformerException as e:
+            outcome = e
+        return self._record_outcome(file, target_path, outcome)
+
+    def _record_outcome(
+        self,
+        file: Union[Path, IO, ArchiveMember],
+        target_path: Path,
+        outcome: Union[bool, Exception],
+    ) -> Optional[Path]:
+        """
+        Add the outcome of the transformation of a file to the report.
+
+        :param file: the full path to the transformed file, the archive member or the file object
+        :param target_path: the full path to the transformed file
+        :param outcome: whether the file was salvaged or the exception raised while transforming it
+        :return: the full path to the transformed file or None if it wasn't transformed
+        """
+        name = get_file_name(file, self._input_root)
+        if isinstance(outcome, InvalidInputException):
+            logger.warning(f"❌ Rejected {name}: {outcome}")
+            self.report.add(name, REJECTED, str(outcome))
+            self._quarantine(file)
+            return None
+        elif isinstance(outcome, TimeoutException):
+            logger.warning(f"⏱ Gave up on {name}: {outcome}")
+            self.report.add(name, TIMED_OUT, str(outcome))
+            return None
+        elif isinstance(outcome, Exception):
+            logger.error(f"❌ Failed to transform {name}: {outcome}")
+            self.report.add(name, FAILED, str(outcome))
             return None
 
+        self.report.add(name, SALVAGED if outcome else TRANSFORMED)
+        return target_path
+
+    def _quarantine(self, file: Union[Path, IO, ArchiveMember]) -> None:
+        """
+        Keep a copy of a rejected input file in the quarantine directory if one is configured.
+
+        :param file: the full path to the rejected file, the archive member or the file object
+        """
+        if not self._quarantine_dir:
+            return
+
+        self._quarantine_dir.mkdir(parents=True, exist_ok=True)
+        target_path = (
+            self._quarantine_dir / f"{uuid.uuid4()}_{Path(get_file_name(file)).name}"
+        )
+        if isinstance(file, Path):
+            shutil.copyfile(file, target_path)
+        elif isinstance(file, ArchiveMember):
+            with file.open() as member, open(target_path, "wb") as target:
+                shutil.copyfileobj(member, target)
+        else:
+            file.seek(0)
+            with open(target_path, "wb") as target:
+                shutil.copyfileobj(file, target)
+
+    def _group_files(
+        self, files: tuple[Path, ...], count: int = 0, size: int = 0
+    ) -> list[list[Path]]:
+        """
+        Split the files into groups respecting the maximum files and bytes combined into one.
+
+        :param files: the full paths to the files to group
+        :param count: the number of files already in the first group
+        :param size: the number of bytes already in the first group
+        :return: the groups of files in order, of which only the first may be empty
+        """
+        groups: list[list[Path]] = [[]]
+        for file in files:
+            file_size = file.stat().st_size
+            if count >= self._max_files_combined or (
+                self._max_entry_size
+                and count
+                and size + file_size > self._max_entry_size
+            ):
+                groups.append([])
+                count, size = 0, 0
+            groups[-1].append(file)
+            count += 1
+            size += file_size
+        return groups
+
     def _generate_file_lists(
-        self, files: tuple[Path, ...], target_dir: Path
+        self, file_groups: list[list[Path]], target_dir: Path
     ) -> tuple[Path, ...]:
         """
-        Generate and save XMLs listing all files to be combined respecting the maximum files allowed.
+        Generate and save XMLs listing the files to be combined into each file.
 
-        :param files: the full paths to the files to be included in the list
-        :param target_dir: the target directory to save the file list
-        :return: the full path to the file list
+        :param file_groups: the full paths to the files to be combined into each file
+        :param target_dir: the target directory to save the file lists
+        :return: the full paths to the file lists
         """
-        file_groups = [
-            files[i : i + self._max_files_combined]
-            for i in range(0, len(files), self._max_files_combined)
-        ]
         file_lists = [
-            self._generate_file_list(group, target_dir)
-            for group in tqdm(file_groups, "Generated file groups")
+            self._generate_file_list(tuple(group), target_dir) for group in file_groups
         ]
         return tuple(file_lists)
 
@@ -161,6 +1439,8 @@ class Orchestrator(abc.ABC):
         :param target_dir: the target directory to save the file list
         :return: the full path to the file list
         """
+        from lxml.builder import E
+
         target_path = Path(target_dir) / f"{uuid.uuid4()}.xml"
         dom = E.files(*[E.file(path=str(path)) for path in files])
         Transformer.save_to_file(dom, target_path)
@@ -179,3 +1459,116 @@ class RecipeOrchestrator(Orchestrator):
     def _combiner_class(self) -> Type[Transformer]:
         """Return the recipe combiner class."""
         return RecipeCombiner
+
+    @property
+    def _exporter_classes(self) -> dict[str, Type["Exporter"]]:
+        """Return the recipe exporter classes."""
+        from recipe_xml_converter.exporters import (
+            RecipeJsonLinesExporter,
+            RecipeParquetExporter,
+        )
+
+        return {"jsonl": RecipeJsonLinesExporter, "parquet": RecipeParquetExporter}
+
+    @property
+    def _sort_keys(self) -> tuple[str, ...]:
+        """Return the orders recipes can be sorted in."""
+        from recipe_xml_converter.sorting import SORT_KEYS
+
+        return tuple(SORT_KEYS)
+
+    @property
+    def _partitions(self) -> tuple[str, ...]:
+        """Return the ways recipes can be partitioned."""
+        from recipe_xml_converter.sorting import PARTITIONS
+
+        return tuple(PARTITIONS)
+
+    def _split(self, file: Path, target_dir: Path) -> Optional[tuple[Path, ...]]:
+        """
+        Split a RecipeML file into chunks of at most recipes_per_shard recipes.
+
+        :param file: the full path to the RecipeML file
+        :param target_dir: the full path to the directory where to save the chunks
+        :return: the full paths to the chunks in order or None if the file can't be split
+        """
+        from recipe_xml_converter.sharding import split_recipeml
+
+        return split_recipeml(file, target_dir, self._recipes_per_shard)
+
+    def _merge(self, files: tuple[Path, ...], target_path: Path) -> None:
+        """
+        Reassemble the cookbooks transformed from the chunks of a RecipeML file.
+
+        :param files: the full paths to the transformed chunks in order
+        :param target_path: the full path to save the cookbook to
+        :raises TransformerException: if a chunk holds an unexpected recipe
+        """
+        from recipe_xml_converter.sharding import merge_cookbooks
+
+        try:
+            merge_cookbooks(files, target_path)
+        except ValueError as e:
+            raise TransformerException(
+                f"Failed to merge the chunks of {target_path.name}: {e}"
+            ) from e
+
+    def _spill_runs(
+        self, files: tuple[Path, ...], run_dir: Path
+    ) -> dict[str, list[Path]]:
+        """
+        Save the transformed recipes as sorted runs of every partition.
+
+        :param files: the full paths to the transformed files in order
+        :param run_dir: the full path to the directory to save the runs in
+        :return: the full paths to the runs of every partition in order by partition name
+        :raises TransformerException: if a file holds an unexpected recipe
+        """
+        from recipe_xml_converter.sorting import spill_runs
+
+        try:
+            return spill_runs(
+                files,
+                run_dir,
+                config.SORT_RUN_SIZE,
+                self._sort_by or None,
+                self._partition_by or None,
+            )
+        except ValueError as e:
+            raise TransformerException(f"Failed to sort the recipes: {e}") from e
+
+    @property
+    def _partition_writer(self) -> Callable[..., list[Path]]:
+        """Return the function merging the sorted runs of recipes into cookbooks."""
+        from recipe_xml_converter.sorting import write_partition
+
+        return write_partition
+
+    def _write_combined(
+        self, target: IO[bytes], entry_name: str, files: list[Path]
+    ) -> list[dict[str, Any]]:
+        """
+        Combine the transformed recipes into an archive entry without saving them first.
+
+        :param target: the stream of the entry
+        :param entry_name: the name of the entry
+        :param files: the full paths to the transformed files in order
+        :return: the index records of the recipes in the entry
+        """
+        return write_cookbook(files, target, entry_name)
+
+    def _index_files(
+        self, file_paths: tuple[Path, ...], entry_names: tuple[str, ...]
+    ) -> list[dict[str, Any]]:
+        """
+        Locate the recipes of the combined cookbooks for the index of the archive.
+
+        :param file_paths: the full paths to the combined cookbooks
+        :param entry_names: the names of the cookbooks in the archive
+        :return: the index records of all recipes in the cookbooks
+        """
+        return [
+            record
+            for file, entry_name in zip(file_paths, entry_names)
+            for record in index_cookbook(file, entry_name)
+        ]
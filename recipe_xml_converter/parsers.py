@@ -0,0 +1,132 @@
+import threading
+from pathlib import Path
+from typing import Any, Optional, Union
+from urllib.parse import unquote, urlparse
+
+from lxml import etree as ET
+
+from recipe_xml_converter import config
+from recipe_xml_converter.exceptions import TransformerException
+
+_local = threading.local()
+
+
+def parser_options(**overrides: Union[bool, str]) -> dict[str, Union[bool, str]]:
+    """
+    Return the options of the input XML parsers as configured in the settings.
+
+    :param overrides: options that should differ from the configured ones
+    :return: the keyword arguments for the lxml XMLParser
+    """
+    options = {
+        "huge_tree": config.PARSER_HUGE_TREE,
+        "remove_blank_text": config.PARSER_REMOVE_BLANK_TEXT,
+        "resolve_entities": (
+            config.PARSER_RESOLVE_ENTITIES
+            if config.PARSER_RESOLVE_ENTITIES != "internal" or ET.LXML_VERSION >= (5, 0)
+            else False  # only lxml 5 can limit the resolution to internal entities
+        ),
+        "no_network": config.PARSER_NO_NETWORK,
+        "collect_ids": config.PARSER_COLLECT_IDS,
+        "load_dtd": False,
+    }
+    options.update(overrides)
+    return options
+
+
+def get_parser(**overrides: Union[bool, str]) -> ET.XMLParser:
+    """
+    Return the XML parser of the current thread for the given options.
+
+    lxml parsers can be reused for any number of documents but not from several threads at
+    once, so every thread keeps its own parser per set of options.
+
+    :param overrides: options that should differ from the configured ones
+    :return: the reusable parser
+    """
+    options = parser_options(**overrides)
+    key = tuple(sorted(options.items()))
+    if not hasattr(_local, "parsers"):
+        _local.parsers = {}
+    if key not in _local.parsers:
+        _local.parsers[key] = ET.XMLParser(**options)
+    return _local.parsers[key]
+
+
+class DirectoryResolver(ET.Resolver):
+    """Resolver refusing to load any document that is not stored inside a directory."""
+
+    def __init__(self, root: Path) -> None:
+        """
+        Create a new resolver.
+
+        :param root: the full path to the only directory documents can be loaded from
+        """
+        super().__init__()
+        self._root = root.resolve()
+
+    def resolve(self, system_url: str, public_id: str, context: Any) -> Any:
+        """
+        Load the document if it is stored inside the allowed directory.
+
+        :param system_url: the URL of the document to load
+        :param public_id: the public ID of the document
+        :param context: the resolver context
+        :return: the resolved document
+        """
+        url = urlparse(system_url)
+        if url.scheme not in ("", "file"):
+            raise TransformerException(f"Access denied to {system_url}")
+
+        path = Path(unquote(url.path) if url.scheme == "file" else system_url)
+        if not path.resolve().is_relative_to(self._root):
+            raise TransformerException(
+                f"Access denied to {system_url} outside {self._root}"
+            )
+        return self.resolve_filename(str(path), context)
+
+
+def get_stylesheet(xsl_file: Path, document_root: Optional[Path] = None) -> ET.XSLT:
+    """
+    Return the compiled stylesheet of the current thread, compiling it on first use.
+
+    Stylesheets that may read other documents are bound to their document root, so they
+    are compiled anew every time instead.
+
+    :param xsl_file: the full path to the stylesheet
+    :param document_root: the full path to the directory the document() function may read from
+    :return: the compiled stylesheet
+    """
+    if document_root is not None:
+        return load_stylesheet(xsl_file, document_root)
+
+    if not hasattr(_local, "stylesheets"):
+        _local.stylesheets = {}
+    if xsl_file not in _local.stylesheets:
+        _local.stylesheets[xsl_file] = load_stylesheet(xsl_file)
+    return _local.stylesheets[xsl_file]
+
+
+def load_stylesheet(xsl_file: Path, document_root: Optional[Path] = None) -> ET.XSLT:
+    """
+    Parse and compile an XSL stylesheet with restricted access to external resources.
+
+    The stylesheet can neither write files nor access the network. Unless a document root
+    is given, it can't read any other document either.
+
+    :param xsl_file: the full path to the stylesheet
+    :param document_root: the full path to the directory the document() function may read from
+    :return: the compiled stylesheet
+    """
+    parser = ET.XMLParser()
+    stylesheet = ET.parse(xsl_file, parser)
+    if document_root is None:
+        return ET.XSLT(stylesheet, access_control=ET.XSLTAccessControl.DENY_ALL)
+
+    parser.resolvers.add(DirectoryResolver(document_root))
+    return ET.XSLT(
+        stylesheet,
+        access_control=ET.XSLTAccessControl(
+            read_network=False, write_file=False, create_dir=False, write_network=False
+        ),
+    )
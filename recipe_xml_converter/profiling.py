@@ -0,0 +1,90 @@
+import contextlib
+import json
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from lxml import etree as ET
+
+# cProfile and pstats are imported where they are used to keep the start-up of the CLI fast
+
+XSLT_PROFILE_SUFFIX = ".profile.json"
+"""The suffix of the files holding the template timings of a transformation."""
+PYTHON_PROFILE_SUFFIX = ".pstats"
+"""The suffix of the files holding the cProfile statistics of a transformation."""
+
+
+def read_xslt_profile(
+    stylesheet: str, profile: ET._ElementTree
+) -> list[dict[str, Any]]:
+    """
+    Convert the profile libxslt collected during a transformation to records.
+
+    :param stylesheet: the name of the stylesheet the profile belongs to
+    :param profile: the profile of the transformation result
+    :return: the template, number of calls and milliseconds spent in every template
+    """
+    return [
+        {
+            "stylesheet": stylesheet,
+            "template": (template.get("match") or template.get("name") or "?")
+            + (f" (mode {template.get('mode')})" if template.get("mode") else ""),
+            "calls": int(template.get("calls")),
+            # libxslt measures the time spent in the template itself in 10µs ticks
+            "time": int(template.get("time")) / 100,
+        }
+        for template in profile.getroot()
+    ]
+
+
+def aggregate_xslt_profiles(files: list[Path]) -> list[dict[str, Any]]:
+    """
+    Add up the template timings of many transformations.
+
+    :param files: the full paths to the files holding the timings of each transformation
+    :return: the total calls and milliseconds of every template, slowest first
+    """
+    totals: dict[tuple[str, str], dict[str, Any]] = {}
+    for file in files:
+        for record in json.loads(file.read_text()):
+            total = totals.setdefault(
+                (record["stylesheet"], record["template"]),
+                {**record, "calls": 0, "time": 0.0},
+            )
+            total["calls"] += record["calls"]
+            total["time"] += record["time"]
+    return sorted(totals.values(), key=lambda total: total["time"], reverse=True)
+
+
+def aggregate_python_profiles(files: list[Path], target_path: Path) -> None:
+    """
+    Merge the cProfile statistics of many transformations into a single file.
+
+    :param files: the full paths to the statistics of each transformation
+    :param target_path: the full path to save the merged statistics to
+    """
+    import pstats
+
+    stats = pstats.Stats(*[str(file) for file in files])
+    stats.dump_stats(target_path)
+
+
+@contextlib.contextmanager
+def python_profile(target_path: Optional[Path]) -> Iterator[None]:
+    """
+    Capture a cProfile of the Python code run inside the block.
+
+    :param target_path: the full path to save the statistics to or None to not profile
+    """
+    if target_path is None:
+        yield
+        return
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(target_path)
@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from typing import IO, Any, Callable
+
+from recipe_xml_converter import config
+
+TRANSFORM = "transform"
+"""The stage transforming the input files, counted in files or chunks of large files."""
+SORT = "sort"
+"""The stage merging the sorted runs of every partition, counted in partitions."""
+COMBINE = "combine"
+"""The stage combining the transformed files, counted in combined files."""
+EXPORT = "export"
+"""The stage exporting the transformed files to another format, a single step."""
+
+
+class ProgressBus:
+    """
+    Publishes the progress of the stages of a job to the callbacks subscribed to it.
+
+    Every event is a dict of the stage, the number of done and total items, the bytes of
+    the done items, the number of items that failed and whether the stage finished. Events
+    of a stage are published at most every interval seconds, apart from its first and last,
+    so counting an item costs next to nothing while nobody or a slow client listens.
+    """
+
+    def __init__(self, interval: float = config.PROGRESS_INTERVAL) -> None:
+        """
+        Create a bus without subscribers.
+
+        :param interval: the minimum number of seconds between two events of a stage
+        """
+        self._interval = interval
+        self._subscribers: list[Callable[[dict[str, Any]], None]] = []
+        self._stages: dict[str, dict[str, Any]] = {}
+        self._published: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback: Callable[[dict[str, Any]], None]) -> None:
+        """
+        Call a function with every event published from now on, on the thread publishing it.
+
+        :param callback: the function taking the event
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict[str, Any]], None]) -> None:
+        """
+        Stop calling a subscribed function.
+
+        :param callback: the function subscribed before
+        """
+        with self._lock:
+            self._subscribers.remove(callback)
+
+    def start(self, stage: str, total: int) -> None:
+        """
+        Publish that a stage started.
+
+        :param stage: the name of the stage
+        :param total: the number of items of the stage
+        """
+        with self._lock:
+            self._stages[stage] = {
+                "stage": stage,
+                "done": 0,
+                "total": total,
+                "bytes": 0,
+                "errors": 0,
+                "finished": False,
+            }
+            self._publish(stage)
+
+    def advance(
+        self, stage: str, done: int = 1, size: int = 0, errors: int = 0
+    ) -> None:
+        """
+        Count items of a stage as done, publishing an event unless one was published recently.
+
+        :param stage: the name of the started stage
+        :param done: the number of items done
+        :param size: the number of bytes of the items
+        :param errors: the number of the items that failed
+        """
+        with self._lock:
+            state = self._stages[stage]
+            state["done"] += done
+            state["bytes"] += size
+            state["errors"] += errors
+            if (
+                state["done"] >= state["total"]
+                or time.monotonic() - self._published[stage] >= self._interval
+            ):
+                self._publish(stage)
+
+    def finish(self, stage: str) -> None:
+        """
+        Publish that a stage finished, even if not all its items were done.
+
+        :param stage: the name of the started stage
+        """
+        with self._lock:
+            self._stages[stage]["finished"] = True
+            self._publish(stage)
+
+    def _publish(self, stage: str) -> None:
+        """Call the subscribers with a copy of the state of a stage, holding the lock."""
+        self._published[stage] = time.monotonic()
+        event = dict(self._stages[stage])
+        for callback in self._subscribers:
+            callback(event)
+
+
+class JsonLinesRenderer:
+    """Writes every progress event as a line of JSON, for programs reading the output."""
+
+    def __init__(self, stream: IO[str]) -> None:
+        """
+        Create a renderer writing to a text stream.
+
+        :param stream: the stream, flushed after every event
+        """
+        self._stream = stream
+
+    def __call__(self, event: dict[str, Any]) -> None:
+        """Write an event."""
+        self._stream.write(json.dumps(event) + "\n")
+        self._stream.flush()
+
+
+class BarRenderer:
+    """Draws a progress bar on stderr for every stage of a job."""
+
+    def __init__(self) -> None:
+        """Create a renderer without bars; a bar is drawn when its stage starts."""
+        self._bars: dict[str, Any] = {}
+
+    def __call__(self, event: dict[str, Any]) -> None:
+        """Move the bar of the stage of an event and close it once the stage finished."""
+        from tqdm import tqdm
+
+        bar = self._bars.get(event["stage"])
+        if bar is None:
+            bar = self._bars[event["stage"]] = tqdm(
+                total=event["total"], desc=event["stage"].capitalize()
+            )
+        bar.update(event["done"] - bar.n)
+        if event["errors"]:
+            bar.set_postfix(errors=event["errors"], refresh=False)
+        if event["finished"]:
+            bar.close()
+            del self._bars[event["stage"]]
@@ -0,0 +1,289 @@
+import sys
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+
+from lxml import etree as ET
+
+TIME_TAGS = ("preptime", "cooktime")
+"""The tags of the times of a recipe, which follow each other in the order of the input."""
+
+_ORDER = {
+    "title": 0,
+    "description": 1,
+    "category": 2,
+    "quantity": 3,
+    "preptime": 4,
+    "cooktime": 4,
+    "ingredient": 5,
+    "recipetext": 6,
+    "source": 7,
+}
+"""The position of every element in a recipe."""
+_REPEATED = {"description", "category", "preptime", "cooktime"}
+"""The elements a recipe may hold more than one of."""
+_COOKBOOK_START = b"<?xml version='1.0' encoding='UTF-8'?>\n<cookbook version=\"46\""
+"""The beginning of a saved cookbook with the start tag left open, so it can be closed empty."""
+_COOKBOOK_END = b"\n</cookbook>\n"
+"""The end of a saved cookbook holding recipes."""
+
+
+class Recipe:
+    """
+    Compact representation of a MyCookbook recipe read back from transformed files.
+
+    The exports, the sorted and partitioned runs and the merge of shards read recipes as
+    such; combining files copies the transformed files without reading their recipes.
+
+    A recipe is a handful of strings and string lists, so it is kept as such instead of as an
+    element tree, which takes about three times the memory for the same recipe.
+    Categories repeat across recipes and are interned, so every category is stored once.
+    """
+
+    __slots__ = (
+        "title",
+        "descriptions",
+        "categories",
+        "quantity",
+        "times",
+        "ingredients",
+        "recipetext",
+        "source",
+    )
+
+    def __init__(
+        self,
+        title: Optional[str] = None,
+        descriptions: tuple[str, ...] = (),
+        categories: tuple[str, ...] = (),
+        quantity: Optional[str] = None,
+        times: tuple[tuple[str, str], ...] = (),
+        ingredients: Optional[tuple[str, ...]] = None,
+        recipetext: Optional[tuple[str, ...]] = None,
+        source: Optional[tuple[str, ...]] = None,
+    ) -> None:
+        """
+        Create a recipe; fields that are None or empty have no element in MyCookbook XML.
+
+        :param title: the title
+        :param descriptions: the descriptions, one for every subtitle of the RecipeML recipe
+        :param categories: the categories
+        :param quantity: the yield
+        :param times: the tag, preptime or cooktime, and the text of every time in order
+        :param ingredients: the ingredient lines or None if there is no ingredient list
+        :param recipetext: the direction lines or None if there are no directions
+        :param source: the source lines or None if there is no source list
+        """
+        self.title = title
+        self.descriptions = descriptions
+        self.categories = tuple([sys.intern(category) for category in categories])
+        self.quantity = quantity
+        self.times = times
+        self.ingredients = ingredients
+        self.recipetext = recipetext
+        self.source = source
+
+    def __eq__(self, other: object) -> bool:
+        """Return whether the other recipe has the same fields."""
+        if not isinstance(other, Recipe):
+            return NotImplemented
+        return all(
+            getattr(self, field) == getattr(other, field) for field in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        """Return the representation of the recipe for debugging."""
+        return f"Recipe(title={self.title!r}, categories={self.categories!r})"
+
+    @classmethod
+    def from_element(cls, recipe: ET._Element) -> "Recipe":
+        """
+        Read a recipe element of MyCookbook XML, ignoring the whitespace of pretty-printing.
+
+        :param recipe: the recipe element
+        :return: the recipe
+        :raises ValueError: if the element isn't a recipe as the transformation creates it
+        """
+        fields: dict[str, Any] = {
+            "descriptions": [],
+            "categories": [],
+            "times": [],
+        }
+        position = 0
+        for child in recipe:
+            tag = child.tag
+            order = _ORDER.get(tag, -1) if isinstance(tag, str) else -1
+            if order < position or child.attrib:
+                raise ValueError(f"Unsupported {tag} in recipe")
+            # the same tag may only follow if it is one that repeats
+            position = order if tag in _REPEATED else order + 1
+
+            if tag == "description":
+                fields["descriptions"].append(_text(child))
+            elif tag == "category":
+                fields["categories"].append(_text(child))
+            elif tag in TIME_TAGS:
+                fields["times"].append((tag, _text(child)))
+            elif tag in ("title", "quantity"):
+                fields[tag] = _text(child)
+            else:
+                fields[tag] = tuple([_text(item, "li") for item in child])
+
+        return cls(
+            fields.get("title"),
+            tuple(fields["descriptions"]),
+            tuple(fields["categories"]),
+            fields.get("quantity"),
+            tuple(fields["times"]),
+            fields.get("ingredient"),
+            fields.get("recipetext"),
+            fields.get("source"),
+        )
+
+    def to_element(self) -> ET._Element:
+        """Return the recipe element of MyCookbook XML without any whitespace."""
+        recipe = ET.Element("recipe")
+
+        def add(tag: str, text: Optional[str]) -> None:
+            if text is not None:
+                ET.SubElement(recipe, tag).text = text or None
+
+        def add_list(tag: str, lines: Optional[tuple[str, ...]]) -> None:
+            if lines is not None:
+                element = ET.SubElement(recipe, tag)
+                for line in lines:
+                    ET.SubElement(element, "li").text = line or None
+
+        add("title", self.title)
+        for description in self.descriptions:
+            add("description", description)
+        for category in self.categories:
+            add("category", category)
+        add("quantity", self.quantity)
+        for tag, time in self.times:
+            add(tag, time)
+        add_list("ingredient", self.ingredients)
+        add_list("recipetext", self.recipetext)
+        add_list("source", self.source)
+        return recipe
+
+    def to_record(self) -> dict[str, Any]:
+        """Return the recipe as a flat record of the first of every repeated field."""
+
+        def first_time(tag: str) -> Optional[str]:
+            return next(
+                (text for time_tag, text in self.times if time_tag == tag), None
+            )
+
+        return {
+            "title": self.title,
+            "description": self.descriptions[0] if self.descriptions else None,
+            "categories": list(self.categories),
+            "quantity": self.quantity,
+            "preptime": first_time("preptime"),
+            "cooktime": first_time("cooktime"),
+            "ingredients": list(self.ingredients or ()),
+            "recipetext": list(self.recipetext or ()),
+            "source": list(self.source or ()),
+        }
+
+
+def _text(element: ET._Element, tag: Optional[str] = None) -> str:
+    """
+    Return the text of an element holding nothing but text.
+
+    :param element: the element
+    :param tag: the tag the element must have or None to accept any
+    :raises ValueError: if the element has another tag, attributes or children
+    """
+    if (tag and element.tag != tag) or element.attrib or len(element):
+        raise ValueError(f"Unsupported content of {element.getparent().tag}")
+    return element.text or ""
+
+
+def read_recipes(file: Path) -> Iterator[Recipe]:
+    """
+    Stream the recipes of a MyCookbook XML file one at a time.
+
+    Only the recipe being read is held as an element tree, the ones read before are dropped.
+
+    :param file: the full path to the file
+    :return: an iterator of the recipes
+    :raises ValueError: if a recipe isn't one as the transformation creates it
+    """
+    for _, element in ET.iterparse(
+        str(file), tag="recipe", huge_tree=True, resolve_entities=False
+    ):
+        yield Recipe.from_element(element)
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def write_recipes(recipes: Iterable[Recipe], target_path: Path) -> None:
+    """
+    Save recipes as a MyCookbook XML file pretty-printed like the transformed files.
+
+    :param recipes: the recipes in order
+    :param target_path: the full path to the file to save
+    """
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(target_path, "wb") as file:
+        file.write(_COOKBOOK_START)
+        empty = True
+        for recipe in recipes:
+            file.write(b">\n  " if empty else b"\n  ")
+            file.write(_recipe_xml(recipe))
+            empty = False
+        file.write(b"/>\n" if empty else _COOKBOOK_END)
+
+
+def write_cookbooks(
+    recipes: Iterable[Recipe], target_dir: Path, max_size: int = 0, max_recipes: int = 0
+) -> list[Path]:
+    """
+    Save recipes as numbered MyCookbook XML files of at most max_recipes recipes each.
+
+    A file is also started before it would grow beyond max_size bytes, but a recipe larger
+    than max_size on its own still gets a file of its own.
+
+    :param recipes: the recipes in order
+    :param target_dir: the full path to the directory to save the files in
+    :param max_size: the maximum number of bytes of a file or 0 for no limit
+    :param max_recipes: the maximum number of recipes of a file or 0 for no limit
+    :return: the full paths to the files in order, none if there are no recipes
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    paths: list[Path] = []
+    file: Optional[BinaryIO] = None
+    size = count = 0
+    try:
+        for recipe in recipes:
+            data = b"\n  " + _recipe_xml(recipe)
+            if (
+                file is None
+                or (max_recipes and count >= max_recipes)
+                or (max_size and size + len(data) + len(_COOKBOOK_END) > max_size)
+            ):
+                if file is not None:
+                    file.write(_COOKBOOK_END)
+                    file.close()
+                paths.append(target_dir / f"{len(paths) + 1}.xml")
+                file = open(paths[-1], "wb")
+                file.write(_COOKBOOK_START + b">")
+                size, count = len(_COOKBOOK_START) + 1, 0
+            file.write(data)
+            size += len(data)
+            count += 1
+        if file is not None:
+            file.write(_COOKBOOK_END)
+    finally:
+        if file is not None:
+            file.close()
+    return paths
+
+
+def _recipe_xml(recipe: Recipe) -> bytes:
+    """Return the recipe element indented as a child of the cookbook element."""
+    element = recipe.to_element()
+    ET.indent(element, space="  ", level=1)
+    return ET.tostring(element, encoding="UTF-8")
@@ -0,0 +1,55 @@
+import json
+from typing import Optional
+
+TRANSFORMED = "transformed"
+"""The file was transformed successfully."""
+SALVAGED = "salvaged"
+"""The file was malformed but parts of it were recovered and transformed."""
+REJECTED = "rejected"
+"""The file was rejected before being transformed."""
+FAILED = "failed"
+"""The transformation of the file failed."""
+TIMED_OUT = "timed_out"
+"""The transformation of the file didn't finish within its time budget."""
+
+
+class TransformationReport:
+    """Structured report of the outcome of every file in a transformation job."""
+
+    def __init__(self) -> None:
+        """Initialize an empty report."""
+        self.files: list[dict[str, str]] = []
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "TransformationReport":
+        """
+        Load a report serialized with to_json.
+
+        :param data: the serialized report
+        :return: the report with the entries of all its files
+        """
+        report = cls()
+        report.files = json.loads(data)["files"]
+        return report
+
+    def add(self, file: str, status: str, reason: Optional[str] = None) -> None:
+        """
+        Record the outcome of a single file.
+
+        :param file: the name of the file
+        :param status: the outcome of the transformation
+        :param reason: the explanation of the outcome if the file wasn't transformed cleanly
+        """
+        entry = {"file": file, "status": status}
+        if reason:
+            entry["reason"] = reason
+        self.files.append(entry)
+
+    def to_json(self) -> bytes:
+        """Return the report serialized as JSON."""
+        summary: dict[str, int] = {}
+        for entry in self.files:
+            summary[entry["status"]] = summary.get(entry["status"], 0) + 1
+        return json.dumps(
+            {"summary": summary, "files": self.files}, indent=2, ensure_ascii=False
+        ).encode("utf-8")
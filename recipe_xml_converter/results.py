@@ -0,0 +1,170 @@
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import IO, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_file(file: IO[bytes]) -> str:
+    """
+    Return the SHA-256 hash of the content of a file object read from its start.
+
+    :param file: the file object, which is rewound afterwards
+    :return: the hex digest
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    while chunk := file.read(1024 * 1024):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def copy_atomically(source: Path, target: Path) -> None:
+    """
+    Copy a file so that readers of the target never see it half written.
+
+    :param source: the full path to the file to copy
+    :param target: the full path to copy it to, which is replaced if it exists
+    """
+    partial = target.with_name(f".{target.name}.{uuid.uuid4().hex}.part")
+    try:
+        shutil.copyfile(source, partial)
+        os.replace(partial, target)
+    finally:
+        partial.unlink(missing_ok=True)
+
+
+class ResultStore:
+    """
+    Directory of the archives of earlier jobs, named after a hash of their inputs and settings.
+
+    Archives are copied in and out rather than linked, so appending to a returned archive
+    never changes the stored one. The least recently used archives are removed once the
+    store grows past its maximum size.
+    """
+
+    def __init__(self, directory: Path, max_size: int) -> None:
+        """
+        Open the store, creating its directory if needed.
+
+        :param directory: the full path to the directory of the stored archives
+        :param max_size: the maximum number of bytes of all stored archives
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        self._directory = directory
+        self._max_size = max_size
+
+    def get(self, name: str, target_dir: Path) -> Optional[Path]:
+        """
+        Copy a stored archive to the target directory.
+
+        :param name: the name of the archive
+        :param target_dir: the full path to the directory to copy it to
+        :return: the full path to the copy or None if no archive of that name is stored
+        """
+        stored = self._directory / name
+        try:
+            os.utime(stored)  # mark it as recently used
+        except FileNotFoundError:
+            return None
+
+        target_path = target_dir / name
+        copy_atomically(stored, target_path)
+        return target_path
+
+    def put(self, archive_path: Path) -> None:
+        """
+        Store an archive under its name and make room for it.
+
+        :param archive_path: the full path to the archive
+        """
+        copy_atomically(archive_path, self._directory / archive_path.name)
+        self._evict(keep=archive_path.name)
+
+    def _evict(self, keep: str) -> None:
+        """
+        Remove the least recently used archives until the store fits its maximum size.
+
+        :param keep: the name of the archive that must stay
+        """
+        archives = []
+        for path in self._directory.glob("*.zip"):
+            try:
+                archives.append((path.stat(), path))
+            except FileNotFoundError:
+                continue  # evicted by another process in the meantime
+        total = sum(stat.st_size for stat, _ in archives)
+        for stat, path in sorted(archives, key=lambda archive: archive[0].st_mtime):
+            if total <= self._max_size:
+                break
+            if path.name != keep:
+                path.unlink(missing_ok=True)
+                total -= stat.st_size
+                logger.debug(f"Evicted {path.name} from the result store")
+
+
+class RecentResults:
+    """
+    In-memory LRU of the archives of recent jobs, which expire after a few seconds.
+
+    It catches duplicate requests arriving shortly after each other, so they are answered
+    without converting anything. Archives larger than the whole cache aren't kept.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        """
+        Create an empty cache.
+
+        :param max_size: the maximum number of bytes of all kept archives
+        :param ttl: the number of seconds an archive is kept
+        """
+        self._max_size = max_size
+        self._ttl = ttl
+        self._size = 0
+        self._results: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Return a kept archive and mark it as recently used.
+
+        :param key: the hash of the request the archive answered
+        :return: the content of the archive or None if it isn't kept or expired
+        """
+        self._expire()
+        if key not in self._results:
+            return None
+        self._results.move_to_end(key)
+        return self._results[key][1]
+
+    def put(self, key: str, content: bytes) -> None:
+        """
+        Keep an archive, removing the least recently used ones to make room for it.
+
+        :param key: the hash of the request the archive answered
+        :param content: the content of the archive
+        """
+        if len(content) > self._max_size:
+            return
+        self._remove(key)
+        self._results[key] = (time.monotonic() + self._ttl, content)
+        self._size += len(content)
+        while self._size > self._max_size:
+            self._remove(next(iter(self._results)))
+
+    def _expire(self) -> None:
+        """Remove the archives kept longer than their time to live."""
+        now = time.monotonic()
+        for key in [key for key, (expiry, _) in self._results.items() if expiry <= now]:
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        """Remove an archive if it is kept."""
+        if key in self._results:
+            self._size -= len(self._results.pop(key)[1])
@@ -0,0 +1,281 @@
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from recipe_xml_converter import config
+from recipe_xml_converter.exceptions import ScratchSpaceException
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = "recipe-xml-converter-jobs"
+"""The name of the directory holding the job directories in every scratch root."""
+OWNER_NAME = ".owner.json"
+"""The name of the file recording the process and reservation of a job directory."""
+
+
+class ScratchDir:
+    """Working directory of a single job, removed again when the job is done."""
+
+    def __init__(self, path: Path, quota: int) -> None:
+        """
+        Wrap a job directory created by the scratch space.
+
+        :param path: the full path to the directory
+        :param quota: the maximum number of bytes the job may keep in it or 0 for no limit
+        """
+        self.path = path
+        self._quota = quota
+
+    def __enter__(self) -> Path:
+        """Return the path of the directory to use in a with statement."""
+        return self.path
+
+    def __exit__(self, *args: Any) -> None:
+        """Remove the directory when leaving the with statement."""
+        self.cleanup()
+
+    def check(self) -> None:
+        """
+        Measure the files of the job against its quota.
+
+        :raises ScratchSpaceException: if the job keeps more bytes than its quota allows
+        """
+        if not self._quota:
+            return
+        usage = _disk_usage(self.path)
+        if usage > self._quota:
+            raise ScratchSpaceException(
+                f"The job uses {usage} bytes of scratch space, more than its quota of {self._quota}"
+            )
+
+    def cleanup(self) -> None:
+        """Remove the directory with everything in it."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class ScratchSpace:
+    """
+    Places the working directories of jobs on a memory or a disk scratch root.
+
+    Small jobs go to the memory root, typically a tmpfs such as /dev/shm, as long as it has
+    room for them, all others to the disk root. Every job reserves its estimated size, so
+    the reservations of all jobs of a root stay within the global quota. Job directories
+    record the process owning them, so the janitor can remove those of crashed processes.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        memory_root: Optional[Path] = None,
+        memory_max_job_size: int = 0,
+        job_quota: int = 0,
+        quota: int = 0,
+        max_age: float = 24 * 60 * 60,
+    ) -> None:
+        """
+        Configure the scratch space.
+
+        :param root: the full path to the directory on disk to create job directories in
+        :param memory_root: the full path to a directory in memory for small jobs or None
+        :param memory_max_job_size: the estimated number of bytes up to which jobs go to the
+            memory root
+        :param job_quota: the maximum number of bytes of a single job or 0 for no limit
+        :param quota: the maximum number of bytes all jobs of a root may reserve or 0 for no
+            limit
+        :param max_age: the number of seconds after which job directories of processes on
+            other hosts are considered abandoned
+        """
+        self._root = root
+        self._memory_root = memory_root
+        self._memory_max_job_size = memory_max_job_size
+        self._job_quota = job_quota
+        self._quota = quota
+        self._max_age = max_age
+
+    @classmethod
+    def from_config(cls) -> "ScratchSpace":
+        """Return the scratch space configured by the environment."""
+        return cls(
+            Path(config.SCRATCH_DIR),
+            Path(config.SCRATCH_MEMORY_DIR) if config.SCRATCH_MEMORY_DIR else None,
+            config.SCRATCH_MEMORY_MAX_JOB_SIZE,
+            config.SCRATCH_JOB_QUOTA,
+            config.SCRATCH_QUOTA,
+            config.SCRATCH_MAX_AGE,
+        )
+
+    @property
+    def _roots(self) -> tuple[Path, ...]:
+        """Return the directories holding the job directories."""
+        roots = (self._root, self._memory_root) if self._memory_root else (self._root,)
+        return tuple([root / JOBS_DIR for root in roots])
+
+    def create(self, estimated_size: int) -> ScratchDir:
+        """
+        Create the working directory of a job on the root fitting its size.
+
+        :param estimated_size: the number of bytes the job is expected to keep at most
+        :return: the new job directory
+        :raises ScratchSpaceException: if the job exceeds its quota or no root has room for it
+        """
+        if self._job_quota and estimated_size > self._job_quota:
+            raise ScratchSpaceException(
+                f"The job needs about {estimated_size} bytes of scratch space, more than its quota of {self._job_quota}"
+            )
+
+        candidates = [self._root / JOBS_DIR]
+        if self._memory_root and estimated_size <= self._memory_max_job_size:
+            candidates.insert(0, self._memory_root / JOBS_DIR)
+        for jobs_dir in candidates:
+            path = self._reserve(jobs_dir, estimated_size)
+            if path is not None:
+                logger.debug(f"Working in {path} for about {estimated_size} bytes")
+                return ScratchDir(path, self._job_quota)
+        raise ScratchSpaceException(
+            f"No scratch space left for a job of about {estimated_size} bytes"
+        )
+
+    def clean(self) -> int:
+        """
+        Remove the job directories of processes that have ended.
+
+        :return: the number of removed directories
+        """
+        removed = 0
+        for jobs_dir in self._roots:
+            if not jobs_dir.is_dir():
+                continue
+            with _locked(jobs_dir):
+                for path in jobs_dir.iterdir():
+                    if path.is_dir() and self._is_abandoned(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                        logger.info(f"🧹 Removed abandoned scratch directory {path}")
+                        removed += 1
+        return removed
+
+    def _reserve(self, jobs_dir: Path, estimated_size: int) -> Optional[Path]:
+        """
+        Create a job directory if the root has room for the job.
+
+        :param jobs_dir: the full path to the directory of the job directories of the root
+        :param estimated_size: the number of bytes to reserve
+        :return: the full path to the job directory or None if the root is full
+        """
+        jobs_dir.mkdir(parents=True, exist_ok=True)
+        with _locked(jobs_dir):
+            if shutil.disk_usage(jobs_dir).free < estimated_size:
+                return None
+            if self._quota and self._reserved(jobs_dir) + estimated_size > self._quota:
+                return None
+
+            path = jobs_dir / uuid.uuid4().hex
+            path.mkdir()
+            (path / OWNER_NAME).write_text(
+                json.dumps(
+                    {
+                        "host": socket.gethostname(),
+                        "pid": os.getpid(),
+                        "reserved": estimated_size,
+                    }
+                )
+            )
+        return path
+
+    @staticmethod
+    def _reserved(jobs_dir: Path) -> int:
+        """Return the number of bytes reserved by all jobs of a root."""
+        reserved = 0
+        for owner_file in jobs_dir.glob(f"*/{OWNER_NAME}"):
+            with contextlib.suppress(OSError, ValueError):
+                reserved += json.loads(owner_file.read_text())["reserved"]
+        return reserved
+
+    def _is_abandoned(self, path: Path) -> bool:
+        """
+        Return whether a job directory belongs to no running job anymore.
+
+        Directories of processes on this host are abandoned once the process has ended, all
+        others when they haven't changed for max_age seconds.
+
+        :param path: the full path to the job directory
+        """
+        try:
+            owner = json.loads((path / OWNER_NAME).read_text())
+        except (OSError, ValueError):
+            owner = {}
+        if owner.get("host") == socket.gethostname():
+            return not _is_alive(owner["pid"])
+        with contextlib.suppress(FileNotFoundError):
+            return time.time() - path.stat().st_mtime > self._max_age
+        return False
+
+
+class Janitor(threading.Thread):
+    """Thread removing abandoned job directories of the scratch space periodically."""
+
+    def __init__(self, scratch_space: ScratchSpace, interval: float) -> None:
+        """
+        Prepare the thread.
+
+        :param scratch_space: the scratch space to clean
+        :param interval: the number of seconds between two cleanups
+        """
+        super().__init__(name="scratch-janitor", daemon=True)
+        self._scratch_space = scratch_space
+        self._interval = interval
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        """Clean the scratch space right away and then every interval until stopped."""
+        while True:
+            try:
+                self._scratch_space.clean()
+            except OSError as e:
+                logger.warning(f"⚠️ Failed to clean the scratch space: {e}")
+            if self._stopped.wait(self._interval):
+                return
+
+    def stop(self) -> None:
+        """Stop the thread after the current cleanup."""
+        self._stopped.set()
+
+
+@contextlib.contextmanager
+def _locked(jobs_dir: Path) -> Iterator[None]:
+    """Hold the lock of a root, so no two processes reserve its last free bytes."""
+    with open(jobs_dir / ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _is_alive(pid: int) -> bool:
+    """Return whether a process of this host is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # running as another user
+    return True
+
+
+def _disk_usage(path: Path) -> int:
+    """Return the number of bytes of all files below a directory."""
+    usage = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            with contextlib.suppress(FileNotFoundError):  # removed in the meantime
+                usage += (Path(directory) / name).stat().st_size
+    return usage
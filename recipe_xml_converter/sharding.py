@@ -0,0 +1,183 @@
+import copy
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional
+
+from lxml import etree as ET
+
+from recipe_xml_converter.parsers import parser_options
+from recipe_xml_converter.recipes import read_recipes, write_recipes
+
+
+def _walk(file: Path) -> Iterator[tuple[str, ET._Element, tuple[int, ...]]]:
+    """
+    Stream the start and end events of the elements of a document with their positions.
+
+    The position of an element is the path of child indexes leading to it from the root, so
+    it identifies the element even after its earlier siblings are removed from the tree.
+
+    :param file: the full path to the document
+    :return: an iterator of the event, the element and its position
+    """
+    path: list[int] = []
+    counters = [0]
+    for event, element in ET.iterparse(
+        file, events=("start", "end"), **parser_options()
+    ):
+        if event == "start":
+            path.append(counters[-1])
+            counters[-1] += 1
+            counters.append(0)
+            yield event, element, tuple(path)
+        else:
+            yield event, element, tuple(path)
+            path.pop()
+            counters.pop()
+
+
+def _prune(element: ET._Element) -> None:
+    """
+    Free the memory held by an element that has been processed and its earlier siblings.
+
+    :param element: the element whose end was just parsed
+    """
+    element.clear(keep_tail=True)
+    while element.getprevious() is not None:
+        del element.getparent()[0]
+
+
+def _localname(element: ET._Element) -> str:
+    """Return the tag name of an element without its namespace."""
+    return ET.QName(element).localname
+
+
+def _collect_meta(
+    file: Path, recipes_per_chunk: int
+) -> Optional[dict[tuple[int, ...], list[ET._Element]]]:
+    """
+    Collect the meta elements of every element in a RecipeML document that has recipe children.
+
+    :param file: the full path to the document
+    :param recipes_per_chunk: the number of recipes in a chunk
+    :return: the copies of the meta elements by the position of their parent or None if
+        the document shouldn't be split
+    """
+    meta: dict[tuple[int, ...], list[ET._Element]] = {}
+    open_recipes, recipes = 0, 0
+    for event, element, path in _walk(file):
+        name = _localname(element)
+        if event == "start":
+            if len(path) == 1 and name != "recipeml":
+                return None  # not RecipeML, so leave it to the transformer to reject
+            if name == "recipe":
+                if open_recipes:
+                    return None  # nested recipes can't be moved to separate chunks
+                open_recipes += 1
+                recipes += 1
+            continue
+
+        if name == "recipe":
+            open_recipes -= 1
+        elif name == "meta" and not open_recipes:
+            meta.setdefault(path[:-1], []).append(copy.deepcopy(element))
+        if len(path) > 1 and not open_recipes:
+            _prune(element)
+
+    return meta if recipes > recipes_per_chunk else None
+
+
+def split_recipeml(
+    file: Path, target_dir: Path, recipes_per_chunk: int
+) -> Optional[tuple[Path, ...]]:
+    """
+    Split a RecipeML document into smaller ones of at most recipes_per_chunk recipes each.
+
+    The document is streamed twice, so memory use is bounded by the size of a chunk. Every
+    chunk keeps the elements surrounding its recipes and the meta elements next to them,
+    which the transformation reads the recipe source from, so transforming the chunks gives
+    the same recipes as transforming the whole document.
+
+    :param file: the full path to the RecipeML document
+    :param target_dir: the full path to the directory where to save the chunks
+    :param recipes_per_chunk: the maximum number of recipes in a chunk
+    :return: the full paths to the chunks in document order or None if the document
+        doesn't need to or can't be split
+    """
+    meta = _collect_meta(file, recipes_per_chunk)
+    if meta is None:
+        return None
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    chunks: list[Path] = []
+    ancestors: list[ET._Element] = []
+    chunk_root: Optional[ET._Element] = None
+    chunk_parent, chunk_parent_path = None, None
+    open_recipes, recipes = 0, 0
+
+    for event, element, path in _walk(file):
+        name = _localname(element)
+        if event == "start":
+            del ancestors[len(path) - 1 :]
+            ancestors.append(element)
+            open_recipes += name == "recipe"
+            continue
+        if name != "recipe":
+            if len(path) > 1 and not open_recipes:
+                _prune(element)
+            continue
+
+        open_recipes -= 1
+        if chunk_root is None:
+            chunk_root = ET.Element(ancestors[0].tag, dict(ancestors[0].attrib))
+            chunk_parent_path = None
+        if path[:-1] != chunk_parent_path:
+            chunk_parent = chunk_root
+            for ancestor in ancestors[1 : len(path) - 1]:
+                chunk_parent = ET.SubElement(
+                    chunk_parent, ancestor.tag, dict(ancestor.attrib)
+                )
+            for meta_element in meta.get(path[:-1], []):
+                chunk_parent.append(copy.deepcopy(meta_element))
+            chunk_parent_path = path[:-1]
+
+        recipe = copy.deepcopy(element)
+        recipe.tail = None
+        chunk_parent.append(recipe)  # type: ignore
+        _prune(element)
+
+        recipes += 1
+        if recipes == recipes_per_chunk:
+            chunks.append(_save_chunk(chunk_root, target_dir))
+            chunk_root, recipes = None, 0
+
+    if chunk_root is not None:
+        chunks.append(_save_chunk(chunk_root, target_dir))
+    return tuple(chunks)
+
+
+def _save_chunk(root: ET._Element, target_dir: Path) -> Path:
+    """
+    Save a chunk to the target directory.
+
+    :param root: the root element of the chunk
+    :param target_dir: the full path to the directory where to save the chunk
+    :return: the full path to the saved chunk
+    """
+    target_path = target_dir / f"{uuid.uuid4()}.xml"
+    ET.ElementTree(root).write(target_path, xml_declaration=True, encoding="UTF-8")
+    return target_path
+
+
+def merge_cookbooks(files: tuple[Path, ...], target_path: Path) -> None:
+    """
+    Reassemble the transformed chunks of a document into a single MyCookbook XML file.
+
+    The recipes are streamed one at a time, so memory doesn't grow with the document.
+
+    :param files: the full paths to the transformed chunks in document order
+    :param target_path: the full path to the file to save the recipes of all chunks to
+    :raises ValueError: if a chunk holds a recipe the transformation didn't create
+    """
+    write_recipes(
+        (recipe for file in files for recipe in read_recipes(file)), target_path
+    )
@@ -0,0 +1,150 @@
+import heapq
+import itertools
+import pickle
+import re
+import unicodedata
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from recipe_xml_converter.recipes import Recipe, read_recipes, write_cookbooks
+
+UNCATEGORIZED = "Uncategorized"
+"""The partition of recipes without a category."""
+OTHER_INITIALS = "#"
+"""The alphabetical partition of recipes whose title doesn't start with a letter."""
+
+
+def title_key(recipe: Recipe) -> str:
+    """Return the title of a recipe compared regardless of case."""
+    return (recipe.title or "").casefold()
+
+
+def category_partition(recipe: Recipe) -> str:
+    """Return the first category of a recipe, which is the partition it belongs to."""
+    return recipe.categories[0] if recipe.categories else UNCATEGORIZED
+
+
+def alphabet_partition(recipe: Recipe) -> str:
+    """Return the initial of the title of a recipe without accents as the partition."""
+    initial = unicodedata.normalize("NFKD", (recipe.title or "").strip())[:1].upper()
+    return initial if initial.isalpha() else OTHER_INITIALS
+
+
+SORT_KEYS: dict[str, Callable[[Recipe], Any]] = {"title": title_key}
+"""The functions returning the value to sort recipes by for every sort order."""
+PARTITIONS: dict[str, Callable[[Recipe], str]] = {
+    "category": category_partition,
+    "alphabet": alphabet_partition,
+}
+"""The functions returning the partition of a recipe for every way of partitioning."""
+
+
+def spill_runs(
+    files: Iterable[Path],
+    run_dir: Path,
+    run_size: int,
+    sort_by: Optional[str] = None,
+    partition_by: Optional[str] = None,
+) -> dict[str, list[Path]]:
+    """
+    Split the recipes of cookbooks into sorted runs saved per partition.
+
+    At most run_size recipes are held in memory; whenever that many are read, the recipes
+    of every partition are sorted and saved as a run of that partition. Partitions that
+    differ only in case are the same, named as they first appear.
+
+    :param files: the full paths to the cookbooks in order
+    :param run_dir: the full path to the directory to save the runs in
+    :param run_size: the number of recipes to hold in memory
+    :param sort_by: the sort order of the recipes or None to keep them in order
+    :param partition_by: the way of partitioning the recipes or None for a single partition
+    :return: the full paths to the runs of every partition in order by partition name
+    :raises ValueError: if a cookbook holds an unexpected recipe
+    """
+    run_dir.mkdir(parents=True, exist_ok=True)
+    partition = PARTITIONS[partition_by] if partition_by else None
+    names: dict[str, str] = {}
+    buffers: dict[str, list[Recipe]] = {}
+    runs: dict[str, list[Path]] = {}
+    run_numbers = itertools.count()
+    buffered = 0
+
+    def spill() -> None:
+        for name, recipes in buffers.items():
+            if sort_by:
+                recipes.sort(key=SORT_KEYS[sort_by])
+            path = run_dir / f"{next(run_numbers)}.run"
+            _write_run(recipes, path)
+            runs.setdefault(name, []).append(path)
+        buffers.clear()
+
+    for recipe in (recipe for file in files for recipe in read_recipes(file)):
+        name = partition(recipe) if partition else ""
+        name = names.setdefault(name.casefold(), name)
+        buffers.setdefault(name, []).append(recipe)
+        buffered += 1
+        if buffered >= run_size:
+            spill()
+            buffered = 0
+    spill()
+
+    return {name: runs[name] for name in sorted(runs, key=str.casefold)}
+
+
+def merge_runs(runs: Iterable[Path], sort_by: Optional[str] = None) -> Iterator[Recipe]:
+    """
+    Stream the recipes of the sorted runs of a partition in order.
+
+    Only the next recipe of every run is held in memory. Recipes that compare equal keep
+    the order in which they were read.
+
+    :param runs: the full paths to the runs in the order they were saved
+    :param sort_by: the sort order of the runs or None if they aren't sorted
+    :return: an iterator of the recipes
+    """
+    readers = [_read_run(run) for run in runs]
+    if not sort_by:
+        return itertools.chain.from_iterable(readers)
+    return heapq.merge(*readers, key=SORT_KEYS[sort_by])
+
+
+def write_partition(
+    runs: tuple[Path, ...],
+    target_dir: Path,
+    sort_by: Optional[str],
+    max_size: int,
+    max_recipes: int,
+) -> list[Path]:
+    """
+    Merge the runs of a partition into cookbooks, in this or in a worker process.
+
+    :param runs: the full paths to the runs of the partition in the order they were saved
+    :param target_dir: the full path to the directory to save the cookbooks in
+    :param sort_by: the sort order of the runs or None if they aren't sorted
+    :param max_size: the maximum number of bytes of a cookbook or 0 for no limit
+    :param max_recipes: the maximum number of recipes of a cookbook or 0 for no limit
+    :return: the full paths to the cookbooks in order
+    """
+    return write_cookbooks(merge_runs(runs, sort_by), target_dir, max_size, max_recipes)
+
+
+def partition_dir_name(name: str) -> str:
+    """Return the name of a partition made safe to use as a folder in an archive."""
+    return re.sub(r"[\x00-\x1f/\\:]+", "_", name).strip(" .") or "_"
+
+
+def _write_run(recipes: list[Recipe], path: Path) -> None:
+    """Save recipes one after the other, so they can be read back one at a time."""
+    with open(path, "wb") as file:
+        for recipe in recipes:
+            pickle.dump(recipe, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_run(path: Path) -> Iterator[Recipe]:
+    """Stream the recipes of a run one at a time."""
+    with open(path, "rb") as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except EOFError:
+                return
@@ -1,59 +1,191 @@
 import abc
+import functools
+import hashlib
+import io
 import logging
+import time
 from pathlib import Path
-from typing import IO, Union
+from typing import IO, TYPE_CHECKING, Any, Optional, Union
 
 from lxml import etree as ET
 
-from recipe_xml_converter.exceptions import TransformerException
+from recipe_xml_converter import config
+from recipe_xml_converter.exceptions import InvalidInputException, TransformerException
+from recipe_xml_converter.helpers import get_file_name, map_file
+from recipe_xml_converter.parsers import get_parser, get_stylesheet, load_stylesheet
+from recipe_xml_converter.profiling import read_xslt_profile
+from recipe_xml_converter.validation import sniff_input
+
+if TYPE_CHECKING:
+    from recipe_xml_converter.recipes import Recipe
 
 logger = logging.getLogger(__name__)
 
+STYLESHEETS_DIR = Path(__file__).parent.parent / "stylesheets"
+"""The directory containing all XSL stylesheets."""
+
+
+@functools.lru_cache(maxsize=None)
+def stylesheets_digest() -> str:
+    """Return a hash of all stylesheets, which changes whenever a transformation changes."""
+    digest = hashlib.sha256()
+    for xsl_file in sorted(STYLESHEETS_DIR.rglob("*.xsl")):
+        digest.update(xsl_file.relative_to(STYLESHEETS_DIR).as_posix().encode())
+        digest.update(xsl_file.read_bytes())
+    return digest.hexdigest()
+
+
+def warm_start() -> dict[str, float]:
+    """
+    Compile every stylesheet once so that the first transformations don't pay for it.
+
+    :return: the seconds it took to compile each stylesheet by file name
+    :raises TransformerException: if a stylesheet doesn't compile
+    """
+    timings = {}
+    for xsl_file in sorted(STYLESHEETS_DIR.glob("*.xsl")):
+        start = time.perf_counter()
+        try:
+            get_stylesheet(xsl_file)
+        except (ET.XMLSyntaxError, ET.XSLTParseError) as e:
+            raise TransformerException(
+                f"Invalid stylesheet {xsl_file.name}: {e}"
+            ) from e
+        timings[xsl_file.name] = time.perf_counter() - start
+    return timings
+
 
 class Transformer(abc.ABC):
     """General transformer class."""
 
-    def __init__(self, input_file: Union[Path, IO], output_file: Path) -> None:
+    def __init__(
+        self,
+        input_file: Union[Path, IO],
+        output_file: Path,
+        recover: bool = False,
+        profile: bool = False,
+    ) -> None:
         """
         Create a new transformer instance.
 
         :param input_file: the file to be transformed
         :param output_file: the file location to save the transformed file
+        :param recover: whether to try salvaging malformed input files instead of failing
+        :param profile: whether to collect the timings of the stylesheet templates
         """
         self._input_file = input_file
+        self._input_name = get_file_name(input_file)
         self._output_file = output_file
+        self._recover = recover
+        self._profile = profile
+        self.salvaged = False
+        """Whether the input file was malformed and only partially recovered."""
+        self.profile: list[dict[str, Any]] = []
+        """The calls and milliseconds of every template of the last transformation if profiling."""
 
     @property
     @abc.abstractmethod
     def _xsl_files(self) -> tuple[Path, ...]:
         """Return the XSL files containing the transformations in the right order."""
 
+    @property
+    def _root_element(self) -> Optional[str]:
+        """Return the name of the root element expected in the input file or None to skip the check."""
+        return None
+
+    @property
+    def _mmap_input(self) -> bool:
+        """Return whether input files on disk should be memory-mapped instead of read."""
+        return config.MMAP_INPUT and ET.LXML_VERSION >= (5, 0)  # buffer parsing
+
+    @property
+    def _base_url(self) -> Optional[str]:
+        """Return the URL relative references in the input file are resolved against."""
+        return str(self._input_file) if isinstance(self._input_file, Path) else None
+
+    @property
+    def _document_root(self) -> Optional[Path]:
+        """Return the directory the stylesheets may read other documents from or None to deny it."""
+        return None
+
     @property
     def _transformations(self) -> tuple[ET.XSLT, ...]:
         """Return the parsed XSL transformations in the right order."""
-        return tuple([ET.XSLT(ET.parse(xsl)) for xsl in self._xsl_files])
+        if self._profile:
+            # libxslt adds up the timings of all runs of a stylesheet, so profiled
+            # transformations use their own copy instead of the cached one
+            return tuple(
+                [load_stylesheet(xsl, self._document_root) for xsl in self._xsl_files]
+            )
+        return tuple(
+            [get_stylesheet(xsl, self._document_root) for xsl in self._xsl_files]
+        )
 
     def transform_and_save(self) -> None:
         """Transform the input file and save the result to the output file."""
-        logger.debug(f"Parsing {self._input_file.name}")
+        logger.debug(f"Sniffing {self._input_name}")
+        self._validate_input()
+
+        logger.debug(f"Parsing {self._input_name}")
         dom = self._parse_input()
 
-        logger.debug(f"Transforming {self._input_file.name}")
+        logger.debug(f"Transforming {self._input_name}")
         dom = self._transform(dom)
+        self._validate_output(dom)
 
-        logger.debug(f"Saving {self._input_file.name} to file")
+        logger.debug(f"Saving {self._input_name} to file")
         self.save_to_file(dom, self._output_file)
 
-        logger.debug(
-            f"✅ Successfully saved {self._input_file.name} to {self._output_file}"
-        )
+        logger.debug(f"✅ Successfully saved {self._input_name} to {self._output_file}")
+
+    def _validate_input(self) -> None:
+        """Reject the input file early if its beginning doesn't look like the expected document."""
+        if self._root_element:
+            sniff_input(self._input_file, self._root_element, self._recover)
+
+    def _validate_output(self, dom: ET._ElementTree) -> None:
+        """
+        Check the transformed tree before it is saved.
+
+        :param dom: the transformed tree
+        """
 
     def _parse_input(self) -> ET._ElementTree:
         """Parse the input file and return the ElementTree."""
         try:
-            return ET.parse(self._input_file)
+            if self._mmap_input:
+                with map_file(self._input_file) as buffer:
+                    if buffer is not None:
+                        return ET.fromstring(
+                            buffer, get_parser(), base_url=self._base_url
+                        ).getroottree()
+            return ET.parse(self._input_file, get_parser())
         except ET.XMLSyntaxError as e:
-            raise TransformerException(f"Failed to parse {self._input_file.name}", e)
+            if self._recover:
+                return self._salvage_input(e)
+            raise TransformerException(
+                f"Failed to parse {self._input_name}: {e}"
+            ) from e
+
+    def _salvage_input(self, error: ET.XMLSyntaxError) -> ET._ElementTree:
+        """
+        Parse the malformed input file again in recover mode keeping whatever can be salvaged.
+
+        :param error: the error raised by the strict parse
+        :return: the recovered ElementTree
+        """
+        if not isinstance(self._input_file, Path):
+            self._input_file.seek(0)
+
+        dom = ET.parse(self._input_file, get_parser(recover=True))
+        if dom.getroot() is None:
+            raise TransformerException(
+                f"Failed to salvage {self._input_name}: {error}"
+            ) from error
+
+        logger.warning(f"⚠️ Salvaged malformed {self._input_name}: {error}")
+        self.salvaged = True
+        return dom
 
     @staticmethod
     def save_to_file(dom: ET._ElementTree, file_path: Path) -> None:
@@ -79,27 +211,86 @@ class Transformer(abc.ABC):
         :param dom: the XML tree to be transformed
         :return: the transformed tree
         """
-        for transformation in self._transformations:
-            dom = transformation(dom)
+        for xsl_file, transformation in zip(self._xsl_files, self._transformations):
+            if not self._profile:
+                dom = transformation(dom)
+                continue
+
+            dom = transformation(dom, profile_run=True)
+            self.profile.extend(read_xslt_profile(xsl_file.name, dom.xslt_profile))
+            del dom.xslt_profile  # so it isn't passed on to the next transformation
         return dom
 
 
 class RecipeTransformer(Transformer):
     """A transformer from RecipeML to My Cookbook XML."""
 
+    @property
+    def _root_element(self) -> Optional[str]:
+        """Return the root element of RecipeML documents."""
+        return "recipeml"
+
+    def _validate_output(self, dom: ET._ElementTree) -> None:
+        """
+        Reject documents without recipes instead of saving an empty cookbook.
+
+        :param dom: the transformed tree
+        """
+        if not dom.xpath("/cookbook/recipe"):
+            raise InvalidInputException("No recipes found")
+
     @property
     def _xsl_files(self) -> tuple[Path, ...]:
         """Return the XSL files defining the recipe transformations."""
         return (
-            Path(__file__).parent.parent / "stylesheets/transform.xsl",
-            Path(__file__).parent.parent / "stylesheets/normalize_space.xsl",
+            STYLESHEETS_DIR / "transform.xsl",
+            STYLESHEETS_DIR / "normalize_space.xsl",
         )
 
+    def transform_to_recipes(self) -> list["Recipe"]:
+        """
+        Transform the input file and return its recipes instead of saving them.
+
+        :return: the recipes of the input file in order
+        """
+        from recipe_xml_converter.recipes import Recipe
+
+        self._validate_input()
+        dom = self._transform(self._parse_input())
+        self._validate_output(dom)
+        return [Recipe.from_element(recipe) for recipe in dom.getroot()]
+
 
 class RecipeCombiner(Transformer):
     """Combines multiple MyCookbook XML files specified in a file."""
 
+    @property
+    def _document_root(self) -> Optional[Path]:
+        """Return the directory of the file list, which is where the files to combine are stored."""
+        return self._input_file.parent if isinstance(self._input_file, Path) else None
+
     @property
     def _xsl_files(self) -> tuple[Path, ...]:
         """Return the XSL files defining the transformations for combining the recipes."""
-        return (Path(__file__).parent.parent / "stylesheets/group.xsl",)
+        return (STYLESHEETS_DIR / "group.xsl",)
+
+
+def check_transformations() -> dict[str, float]:
+    """
+    Compile all stylesheets and transform a sample recipe to check the installation works.
+
+    :return: the seconds each step took by step name
+    :raises TransformerException: if a stylesheet doesn't compile or the sample isn't transformed
+    """
+    timings = {f"compile {name}": t for name, t in warm_start().items()}
+
+    sample = io.BytesIO(
+        b"<recipeml><recipe><head><title>Self-check</title></head></recipe></recipeml>"
+    )
+    start = time.perf_counter()
+    recipes = RecipeTransformer(sample, Path()).transform_to_recipes()
+    timings["transform sample recipe"] = time.perf_counter() - start
+
+    if [recipe.title for recipe in recipes] != ["Self-check"]:
+        raise TransformerException("The sample recipe wasn't transformed correctly")
+    return timings
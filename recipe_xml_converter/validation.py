@@ -0,0 +1,105 @@
+import codecs
+import re
+from pathlib import Path
+from typing import IO, Optional, Union
+
+from lxml import etree as ET
+
+from recipe_xml_converter.exceptions import InvalidInputException
+
+SNIFF_SIZE = 4096
+"""The number of bytes read from the beginning of a file to sniff its contents."""
+
+_XML_DECLARATION_ENCODING = re.compile(
+    rb"^<\?xml[^>]*\bencoding\s*=\s*[\"']([A-Za-z0-9._-]+)[\"']"
+)
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def read_head(file: Union[Path, IO], size: int = SNIFF_SIZE) -> bytes:
+    """
+    Read the first bytes of a file leaving file objects at their original position.
+
+    :param file: the full path to the file or the file object to read
+    :param size: the maximum number of bytes to read
+    :return: the bytes read
+    """
+    if isinstance(file, Path):
+        with open(file, "rb") as f:
+            return f.read(size)
+
+    position = file.tell()
+    try:
+        head = file.read(size)
+    finally:
+        file.seek(position)
+    return head.encode("utf-8") if isinstance(head, str) else head
+
+
+def detect_encoding(head: bytes) -> Optional[str]:
+    """
+    Detect the encoding of an XML document from its byte order mark or XML declaration.
+
+    :param head: the first bytes of the document
+    :return: the name of the encoding or None if it isn't declared
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    match = _XML_DECLARATION_ENCODING.match(head)
+    return match.group(1).decode("ascii") if match else None
+
+
+def sniff_input(file: Union[Path, IO], root: str, recover: bool = False) -> None:
+    """
+    Cheaply check that a file looks like a valid XML document with the expected root element.
+
+    Only the first few KB of the file are read, so a document that passes the check may
+    still be malformed further down.
+
+    :param file: the full path to the file or the file object to check
+    :param root: the expected name of the root element
+    :param recover: whether malformed markup should be left for a recovering parser to salvage
+    :raises InvalidInputException: if the file is empty, uses an unknown encoding, isn't
+        well-formed or has an unexpected root element
+    """
+    head = read_head(file)
+    if not head.strip():
+        raise InvalidInputException("The file is empty")
+
+    encoding = detect_encoding(head)
+    if encoding:
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise InvalidInputException(f"Unsupported encoding {encoding}")
+
+    parser = ET.XMLPullParser(
+        events=("start",), resolve_entities=False, no_network=True
+    )
+    try:
+        parser.feed(head)
+        root_element = next((el for _, el in parser.read_events()), None)
+    except ET.XMLSyntaxError as e:
+        if recover:
+            return
+        raise InvalidInputException(f"Malformed XML: {e.msg}")
+
+    if root_element is None:
+        if recover or len(head) == SNIFF_SIZE:
+            return  # the prolog is longer than the sniffed bytes, so leave it to the parser
+        raise InvalidInputException("No root element found")
+
+    tag = ET.QName(root_element).localname
+    if tag != root:
+        raise InvalidInputException(
+            f"Unexpected root element <{tag}>, expected <{root}>"
+        )
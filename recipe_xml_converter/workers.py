@@ -0,0 +1,487 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence
+
+from recipe_xml_converter import config
+from recipe_xml_converter.exceptions import TimeoutException, TransformerException
+
+logger = logging.getLogger(__name__)
+
+_caller: Optional[Connection] = None
+"""The connection to the process submitting the tasks when running in a worker process."""
+_caller_lock = threading.Lock()
+"""The lock keeping the threads of a task from sending progress events at the same time."""
+
+
+class _Progress:
+    """A progress event a running task sends ahead of its result."""
+
+    __slots__ = ("event",)
+
+    def __init__(self, event: dict[str, Any]) -> None:
+        """
+        Wrap an event.
+
+        :param event: the progress event
+        """
+        self.event = event
+
+
+def report_progress(event: dict[str, Any]) -> None:
+    """
+    Send a progress event of the running task to the process that submitted it.
+
+    Outside of worker processes the event is dropped.
+
+    :param event: the progress event
+    """
+    if _caller is not None:
+        with _caller_lock:
+            _caller.send(_Progress(event))
+
+
+def available_memory() -> Optional[int]:
+    """
+    Return the number of bytes of memory the system can still hand out without swapping.
+
+    :return: the available memory or None if the system doesn't report it
+    """
+    try:
+        with open(Path("/proc/meminfo")) as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def resident_memory(pid: int) -> Optional[int]:
+    """
+    Return the number of bytes of memory a process of this host holds in RAM.
+
+    :param pid: the id of the process
+    :return: the resident set size or None if the process is gone or the system doesn't report it
+    """
+    try:
+        with open(Path(f"/proc/{pid}/statm")) as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _work(connection: Connection) -> None:
+    """
+    Run the tasks received through the connection until told to stop.
+
+    :param connection: the worker's end of the pipe to the pool
+    """
+    global _caller
+    _caller = connection
+    if config.WARM_START:
+        from recipe_xml_converter.transformer import warm_start
+
+        warm_start()
+    # ready, so start-up doesn't count towards the first task's budget
+    connection.send(None)
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+
+        function, args = task
+        try:
+            result = function(*args)
+        except Exception as e:
+            result = (
+                e
+                if isinstance(e, TransformerException)
+                else TransformerException(str(e))
+            )
+        connection.send(result)
+
+
+class _Worker:
+    """A single worker process and the pipe used to talk to it."""
+
+    def __init__(self, context: Any, daemon: bool = True) -> None:
+        """
+        Start a new worker process.
+
+        :param context: the multiprocessing context to start the process with
+        :param daemon: whether the process is a daemon, which can't start processes itself
+        """
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_work, args=(child_connection,), daemon=daemon
+        )
+        self.process.start()
+        child_connection.close()
+        try:
+            self.connection.recv()
+        except EOFError:
+            raise TransformerException("The worker process failed to start")
+        self.task = -1
+        self.cost = 0
+        self.started = 0.0
+        self.tasks = 0
+
+    def submit(self, index: int, function: Callable, args: tuple, cost: int) -> None:
+        """
+        Send a task to the worker.
+
+        :param index: the position of the task in the submitted sequence
+        :param function: the function to run
+        :param args: the arguments to run the function with
+        :param cost: the estimated number of bytes of memory the task needs
+        """
+        self.connection.send((function, args))
+        self.task = index
+        self.cost = cost
+        self.started = time.monotonic()
+        self.tasks += 1
+
+    def is_worn_out(self, max_tasks: int, max_rss: int) -> bool:
+        """
+        Return whether the idle worker should be replaced to hand its memory back.
+
+        :param max_tasks: the number of tasks after which a worker is replaced or 0 for no limit
+        :param max_rss: the number of resident bytes beyond which a worker is replaced or 0
+            for no limit
+        """
+        if max_tasks and self.tasks >= max_tasks:
+            logger.info(f"♻️ Recycling a worker after {self.tasks} tasks")
+            return True
+        rss = resident_memory(self.process.pid) if max_rss else None
+        if rss is not None and rss > max_rss:
+            logger.info(f"♻️ Recycling a worker holding {rss} bytes")
+            return True
+        return False
+
+    def stop(self) -> None:
+        """Ask the worker to exit once it is idle."""
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        """Kill the worker process immediately."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class WorkerPool:
+    """
+    Pool of worker processes running tasks under a per-task and an overall time budget.
+
+    A worker running a task past its budget is killed and replaced, so a single
+    pathological input can't hold up the rest of the job.
+
+    With a memory budget, tasks only start while the estimated memory of all running tasks
+    fits into it and into the memory the system has left. Workers are started as tasks are
+    admitted, up to the maximum, and idle ones are stopped down to the minimum when no
+    waiting task can start, so they hand the memory of their last task back. Workers are
+    also replaced after max_tasks tasks or once they hold more than max_rss bytes, so
+    memory that lxml keeps after a task doesn't build up.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        task_timeout: Optional[float] = None,
+        start_method: str = config.WORKER_START_METHOD,
+        min_workers: int = 0,
+        memory_budget: int = 0,
+        max_tasks: int = config.WORKER_MAX_TASKS,
+        max_rss: int = config.WORKER_MAX_RSS,
+    ) -> None:
+        """
+        Initialize a new pool. Worker processes are only started when tasks are submitted.
+
+        :param workers: the maximum number of worker processes
+        :param task_timeout: the maximum number of seconds a single task may run
+        :param start_method: the multiprocessing start method of the workers
+        :param min_workers: the number of idle worker processes to keep alive
+        :param memory_budget: the maximum number of bytes the running tasks are estimated
+            to need together or 0 to only limit the number of workers
+        :param max_tasks: the number of tasks after which a worker is replaced or 0 for no limit
+        :param max_rss: the number of resident bytes beyond which a worker is replaced after
+            its task or 0 for no limit
+        """
+        self._workers = max(1, workers)
+        self._min_workers = min_workers
+        self._memory_budget = memory_budget
+        self._max_tasks = max_tasks
+        self._max_rss = max_rss
+        self._task_timeout = task_timeout
+        self._context = multiprocessing.get_context(start_method)
+        self._idle: list[_Worker] = []
+        self._busy: dict[Connection, _Worker] = {}
+
+    def __enter__(self) -> "WorkerPool":
+        """Return the pool to use in a with statement."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop all workers when leaving the with statement."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop idle workers and kill the busy ones."""
+        for worker in self._idle:
+            worker.stop()
+        for worker in self._busy.values():
+            worker.kill()
+        self._idle, self._busy = [], {}
+
+    def imap_unordered(
+        self,
+        function: Callable,
+        args: Iterable[tuple],
+        deadline: Optional[float] = None,
+        costs: Optional[Sequence[int]] = None,
+    ) -> Iterator[tuple[int, Any]]:
+        """
+        Run the function for every set of arguments in the worker processes.
+
+        Tasks that raise, time out or crash their worker yield a TransformerException instead
+        of a result. With costs, the most expensive tasks start first so they don't end up
+        running alone at the end of the job.
+
+        :param function: the module level function to run
+        :param args: the arguments of every task
+        :param deadline: the time.monotonic() value by which all tasks must be done
+        :param costs: the estimated number of bytes of memory every task needs
+        :return: an iterator of the task positions and their results in completion order
+        """
+        tasks = list(enumerate(args))
+        task_costs = list(costs) if costs is not None else [0 for _ in tasks]
+        if costs is not None:
+            tasks.sort(key=lambda task: task_costs[task[0]], reverse=True)
+        pending = deque(tasks)
+        while pending or self._busy:
+            if deadline is not None and time.monotonic() >= deadline:
+                yield from self._abandon(pending)
+                return
+
+            while pending and len(self._busy) < self._workers:
+                position = self._next_admissible(pending, task_costs)
+                if position is None:
+                    break
+                index, task_args = pending[position]
+                del pending[position]
+                worker = self._idle.pop() if self._idle else _Worker(self._context)
+                worker.submit(index, function, task_args, task_costs[index])
+                self._busy[worker.connection] = worker
+            self._scale_down()
+
+            for connection in wait(list(self._busy), self._wait_timeout(deadline)):
+                worker = self._busy.pop(connection)  # type: ignore[call-overload]
+                index = worker.task
+                try:
+                    result = worker.connection.recv()
+                except (EOFError, OSError):
+                    worker.kill()
+                    yield index, TransformerException("The worker process died")
+                    continue
+                if isinstance(result, _Progress):
+                    self._busy[worker.connection] = (
+                        worker  # the result is still to come
+                    )
+                    continue
+
+                if worker.is_worn_out(self._max_tasks, self._max_rss):
+                    worker.stop()
+                else:
+                    self._idle.append(worker)
+                yield index, result
+
+            yield from self._kill_overdue()
+        self._scale_down()
+
+    def _next_admissible(self, pending: deque, costs: list[int]) -> Optional[int]:
+        """
+        Find the most expensive waiting task that fits into the memory left.
+
+        A task always starts when no other one is running, even if it exceeds the budget.
+
+        :param pending: the positions and arguments of the waiting tasks, most expensive first
+        :param costs: the estimated number of bytes of memory every task needs
+        :return: the position of the task in the waiting tasks or None if none fits
+        """
+        if not self._memory_budget or not self._busy:
+            return 0
+
+        headroom = self._memory_budget - sum(w.cost for w in self._busy.values())
+        available = available_memory()
+        if available is not None:
+            headroom = min(headroom, available)
+        for position, (index, _) in enumerate(pending):
+            if costs[index] <= headroom:
+                return position
+        return None
+
+    def _scale_down(self) -> None:
+        """Stop the idle workers beyond the minimum, since no waiting task could use them."""
+        while self._idle and len(self._idle) + len(self._busy) > max(
+            self._min_workers, len(self._busy)
+        ):
+            self._idle.pop().stop()
+
+    def _wait_timeout(self, deadline: Optional[float]) -> Optional[float]:
+        """Return the number of seconds until the next task or the job runs out of time."""
+        deadlines = [] if deadline is None else [deadline]
+        if self._task_timeout is not None:
+            deadlines += [w.started + self._task_timeout for w in self._busy.values()]
+        return max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+
+    def _kill_overdue(self) -> Iterator[tuple[int, Any]]:
+        """Kill the workers whose tasks ran past the task timeout."""
+        if self._task_timeout is None:
+            return
+
+        now = time.monotonic()
+        for connection, worker in list(self._busy.items()):
+            if now - worker.started >= self._task_timeout:
+                del self._busy[connection]
+                worker.kill()
+                logger.warning(f"⏱ Killed a worker after {self._task_timeout}s")
+                yield worker.task, TimeoutException(
+                    f"Timed out after {self._task_timeout} seconds"
+                )
+
+    def _abandon(self, pending: deque) -> Iterator[tuple[int, Any]]:
+        """Kill all busy workers and give up on every task that isn't done yet."""
+        for worker in self._busy.values():
+            worker.kill()
+            yield worker.task, TimeoutException("The job ran out of time")
+        self._busy = {}
+
+        for index, _ in pending:
+            yield index, TimeoutException("The job ran out of time before starting")
+
+
+class JobWorkers:
+    """
+    Long-lived worker processes running whole jobs for a server, one job per worker at a time.
+
+    Memory lxml, libxslt and the Python allocator keep after a job stays with the worker
+    that ran it instead of building up in the server, and workers are replaced after
+    max_jobs jobs or once they hold more than max_rss bytes, which hands it back. Unlike
+    WorkerPool, jobs are run by any number of threads at once.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_jobs: int = config.WORKER_MAX_TASKS,
+        max_rss: int = config.WORKER_MAX_RSS,
+        start_method: str = config.WORKER_START_METHOD,
+    ) -> None:
+        """
+        Initialize the workers, which are only started when jobs are run.
+
+        :param workers: the maximum number of jobs running at the same time
+        :param max_jobs: the number of jobs after which a worker is replaced or 0 for no limit
+        :param max_rss: the number of resident bytes beyond which a worker is replaced after
+            its job or 0 for no limit
+        :param start_method: the multiprocessing start method of the workers
+        """
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._max_jobs = max_jobs
+        self._max_rss = max_rss
+        self._context = multiprocessing.get_context(start_method)
+        self._lock = threading.Lock()
+        self._idle: list[_Worker] = []
+        self._busy: set[_Worker] = set()
+        self.recycled = 0
+        """The number of workers replaced because they were worn out."""
+
+    def run(
+        self,
+        function: Callable,
+        *args: Any,
+        on_progress: Optional[Callable[[dict[str, Any]], None]] = None,
+    ) -> Any:
+        """
+        Run a job on an idle worker, waiting for one if all are busy.
+
+        :param function: the module level function to run
+        :param args: the arguments to run the function with
+        :param on_progress: the function called on this thread with every event the job
+            sends with report_progress
+        :return: the return value of the function
+        :raises TransformerException: if the function raises or the worker dies
+        """
+        with self._slots:
+            with self._lock:
+                worker = self._idle.pop() if self._idle else None
+            if worker is None:
+                # jobs may transform their files in worker processes of their own
+                worker = _Worker(self._context, daemon=False)
+            with self._lock:
+                self._busy.add(worker)
+            try:
+                worker.submit(0, function, args, 0)
+                result = worker.connection.recv()
+                while isinstance(result, _Progress):
+                    if on_progress is not None:
+                        on_progress(result.event)
+                    result = worker.connection.recv()
+            except (EOFError, OSError):
+                worker.kill()
+                raise TransformerException("The worker process died")
+            except BaseException:
+                worker.kill()
+                raise
+            finally:
+                with self._lock:
+                    self._busy.discard(worker)
+
+            worn_out = worker.is_worn_out(self._max_jobs, self._max_rss)
+            if worn_out:
+                worker.stop()
+            with self._lock:
+                if worn_out:
+                    self.recycled += 1
+                else:
+                    self._idle.append(worker)
+
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def stats(self) -> list[dict[str, Any]]:
+        """Return the process id, the number of jobs and the resident bytes of every worker."""
+        with self._lock:
+            workers = [*self._idle, *self._busy]
+        return [
+            {
+                "pid": worker.process.pid,
+                "jobs": worker.tasks,
+                "rss": resident_memory(worker.process.pid),
+            }
+            for worker in workers
+        ]
+
+    def close(self) -> None:
+        """Stop idle workers and kill the busy ones, failing their jobs."""
+        with self._lock:
+            idle, busy = self._idle, list(self._busy)
+            self._idle = []
+        for worker in idle:
+            worker.stop()
+        for worker in busy:
+            worker.kill()
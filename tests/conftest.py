@@ -0,0 +1,12 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def scratch_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Keep the job directories of every test, and of the processes it starts, out of data/."""
+    path = tmp_path / "scratch"
+    monkeypatch.setattr("recipe_xml_converter.config.SCRATCH_DIR", str(path))
+    monkeypatch.setenv("SCRATCH_DIR", str(path))
+    return path
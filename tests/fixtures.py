@@ -1,11 +1,35 @@
 from pathlib import Path
 
 import pytest as pytest
+from lxml import etree as ET
 
+from recipe_xml_converter.recipes import Recipe
 from recipe_xml_converter.transformer import RecipeTransformer
 
 
+class RoundTripTransformer(RecipeTransformer):
+    """Transformer asserting every transformed recipe survives a round trip through Recipe."""
+
+    def _transform(self, dom: ET._ElementTree) -> ET._XSLTResultTree:
+        """
+        Transform the tree and compare every recipe to the one rebuilt from its Recipe.
+
+        :param dom: the XML tree to be transformed
+        :return: the transformed tree
+        """
+        result = super()._transform(dom)
+        for recipe in result.getroot():
+            assert ET.tostring(Recipe.from_element(recipe).to_element()) == ET.tostring(
+                recipe
+            )
+        return result
+
+
 @pytest.fixture
 def transformer() -> RecipeTransformer:
-    """Create a basic transformer to use for all tests that don't save to the file system."""
-    return RecipeTransformer(Path(), Path())
+    """
+    Create a basic transformer to use for all tests that don't save to the file system.
+
+    Every recipe it transforms is also checked to convert to a Recipe and back unchanged.
+    """
+    return RoundTripTransformer(Path(), Path())
@@ -0,0 +1,271 @@
+import asyncio
+import io
+import json
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from recipe_xml_converter import api
+from recipe_xml_converter.archive import REPORT_NAME
+from recipe_xml_converter.diagnostics import AllocationTracer
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.scratch import JOBS_DIR
+from recipe_xml_converter.workers import JobWorkers
+
+RECIPE = b"<recipeml><recipe><head><title>Recipe</title></head></recipe></recipeml>"
+
+
+def test_identical_requests_are_converted_once(monkeypatch) -> None:
+    """Assert concurrent and repeated identical requests share a single conversion."""
+    conversions = []
+    orchestrate = RecipeOrchestrator.orchestrate
+
+    def slow_orchestrate(orchestrator: RecipeOrchestrator):
+        conversions.append(orchestrator)
+        time.sleep(0.2)  # so the identical requests arrive while it runs
+        return orchestrate(orchestrator)
+
+    monkeypatch.setattr(RecipeOrchestrator, "orchestrate", slow_orchestrate)
+
+    def request(max_combined_files: int = 10):
+        return api.transform_recipes(
+            [UploadFile(io.BytesIO(RECIPE), filename="recipe.xml")],
+            max_combined_files,
+            "xml",
+            False,
+            None,
+        )
+
+    async def send_requests() -> list:
+        concurrent = await asyncio.gather(*[request() for _ in range(3)])
+        return [*concurrent, await request(), await request(max_combined_files=5)]
+
+    responses = asyncio.run(send_requests())
+
+    assert len(conversions) == 2
+    assert len({response.body for response in responses[:4]}) == 1
+    assert not api._in_flight
+    with zipfile.ZipFile(io.BytesIO(responses[0].body)) as archive:
+        assert archive.testzip() is None
+
+
+def test_conversions_run_in_job_workers(monkeypatch) -> None:
+    """Assert conversions run in the job workers, report progress and keep upload names."""
+    job_workers = JobWorkers(1)
+    monkeypatch.setattr(api.app.state, "job_workers", job_workers, raising=False)
+    events: list[dict] = []
+    try:
+        scratch_dir, input_files = asyncio.run(
+            api._save_uploads([UploadFile(io.BytesIO(RECIPE), filename="recipe.xml")])
+        )
+        archive, _ = api._convert(
+            scratch_dir,
+            input_files,
+            10,
+            "xml",
+            False,
+            events.append,
+        )
+        assert [stats["jobs"] for stats in job_workers.stats()] == [1]
+    finally:
+        job_workers.close()
+
+    assert {"stage": "transform", "done": 1, "total": 1} in [
+        {key: event[key] for key in ("stage", "done", "total")} for event in events
+    ]
+
+    assert isinstance(archive, bytes)
+    with zipfile.ZipFile(io.BytesIO(archive)) as archive_file:
+        report = json.loads(archive_file.read(REPORT_NAME))
+    assert [entry["file"] for entry in report["files"]] == ["recipe.xml"]
+
+
+def test_large_archives_are_sent_from_the_scratch_space(
+    monkeypatch, scratch_dir: Path
+) -> None:
+    """Assert archives too large for the cache are sent as files and removed once sent."""
+    monkeypatch.setattr("recipe_xml_converter.config.API_RESULT_CACHE_SIZE", 0)
+    orchestrate = RecipeOrchestrator.orchestrate
+
+    def slow_orchestrate(orchestrator: RecipeOrchestrator):
+        time.sleep(0.2)  # so the identical request arrives while it runs
+        return orchestrate(orchestrator)
+
+    monkeypatch.setattr(RecipeOrchestrator, "orchestrate", slow_orchestrate)
+
+    async def send_requests() -> list[bytes]:
+        responses = await asyncio.gather(
+            *[
+                api.transform_recipes(
+                    [UploadFile(io.BytesIO(RECIPE), filename="large.xml")],
+                    10,
+                    "xml",
+                    False,
+                    None,
+                )
+                for _ in range(2)
+            ]
+        )
+        bodies = []
+        for response in responses:
+            assert list((scratch_dir / JOBS_DIR).iterdir())
+            bodies.append(await _send(response))
+        return bodies
+
+    bodies = asyncio.run(send_requests())
+
+    assert bodies[0] == bodies[1]
+    with zipfile.ZipFile(io.BytesIO(bodies[0])) as archive:
+        assert archive.testzip() is None
+    assert not [path for path in (scratch_dir / JOBS_DIR).iterdir() if path.is_dir()]
+
+
+def test_cancelled_request_does_not_fail_identical_ones(
+    monkeypatch, scratch_dir: Path
+) -> None:
+    """Assert a conversion outlives the uploads of the cancelled request that started it."""
+    orchestrate = RecipeOrchestrator.orchestrate
+
+    def slow_orchestrate(orchestrator: RecipeOrchestrator):
+        time.sleep(0.5)  # so the first request is cancelled while it runs
+        return orchestrate(orchestrator)
+
+    monkeypatch.setattr(RecipeOrchestrator, "orchestrate", slow_orchestrate)
+    uploads = [
+        UploadFile(io.BytesIO(RECIPE), filename="cancelled.xml") for _ in range(2)
+    ]
+
+    async def send_requests():
+        requests = []
+        for upload in uploads:
+            requests.append(
+                asyncio.ensure_future(
+                    api.transform_recipes([upload], 10, "xml", False, None)
+                )
+            )
+            await asyncio.sleep(0.1)
+        requests[0].cancel()
+        # the framework closes the uploads of a request once it is done
+        uploads[0].file.close()
+        with pytest.raises(asyncio.CancelledError):
+            await requests[0]
+        return await requests[1]
+
+    response = asyncio.run(send_requests())
+
+    with zipfile.ZipFile(io.BytesIO(response.body)) as archive:
+        assert archive.testzip() is None
+    assert not api._in_flight
+    assert not [path for path in (scratch_dir / JOBS_DIR).iterdir() if path.is_dir()]
+
+
+def test_startup_and_shutdown_handlers(monkeypatch) -> None:
+    """Assert the app starts its helpers before taking requests and stops them afterwards."""
+    monkeypatch.setattr("recipe_xml_converter.config.API_JOB_WORKERS", 1)
+    monkeypatch.setattr("recipe_xml_converter.config.TRACEMALLOC_FRAMES", 1)
+    # the helpers are forgotten again, so the closed job workers aren't used by other tests
+    for helper in ("janitor", "job_workers", "tracer"):
+        monkeypatch.setattr(api.app.state, helper, None, raising=False)
+
+    async def serve():
+        async with api.app.router.lifespan_context(api.app):
+            assert api.app.state.janitor.is_alive()
+            assert api.app.state.tracer is not None
+            response = await api.transform_recipes(
+                [UploadFile(io.BytesIO(RECIPE), filename="lifespan.xml")],
+                10,
+                "xml",
+                False,
+                None,
+            )
+            assert [stats["jobs"] for stats in api.app.state.job_workers.stats()] == [1]
+            return response
+
+    response = asyncio.run(serve())
+
+    assert not api.app.state.janitor.is_alive()
+    assert api.app.state.job_workers.stats() == []
+    assert not tracemalloc.is_tracing()
+    with zipfile.ZipFile(io.BytesIO(response.body)) as archive:
+        assert archive.testzip() is None
+
+
+def test_memory_diagnostics(monkeypatch) -> None:
+    """Assert the debug endpoint only reports allocation sites while tracing."""
+    monkeypatch.setattr(api.app.state, "tracer", None, raising=False)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(api.memory_diagnostics())
+    assert error.value.status_code == 404
+
+    tracer = AllocationTracer(1)
+    monkeypatch.setattr(api.app.state, "tracer", tracer)
+    try:
+        leak = [bytearray(1000) for _ in range(1000)]
+        diagnostics = asyncio.run(api.memory_diagnostics(limit=5))
+    finally:
+        tracer.stop()
+
+    assert diagnostics["rss"] > 0 and diagnostics["workers"] == []
+    assert len(diagnostics["allocations"]) == 5
+    top = diagnostics["allocations"][0]
+    assert (
+        top["traceback"][0].startswith(__file__)
+        and top["size_diff"] >= len(leak) * 1000
+    )
+
+
+def test_progress_stream() -> None:
+    """Assert the progress of a request is streamed to a client connected beforehand."""
+
+    async def follow_request() -> list[str]:
+        stream = await api.job_progress("job")
+        messages = asyncio.ensure_future(_collect(stream.body_iterator))
+        await api.transform_recipes(
+            [UploadFile(io.BytesIO(RECIPE), filename="recipe.xml")],
+            3,
+            "xml",
+            False,
+            "job",
+        )
+        return await messages
+
+    messages = asyncio.run(follow_request())
+
+    events = [json.loads(message[6:]) for message in messages[:-1]]
+    assert {event["stage"] for event in events} == {"transform", "combine"}
+    assert all(event["errors"] == 0 for event in events)
+    assert events[-1]["finished"]
+    assert messages[-1] == 'event: end\ndata: {"error": null}\n\n'
+
+
+async def _send(response) -> bytes:
+    """Send a response to a fake ASGI server and return its body."""
+    messages: list[dict] = []
+
+    async def receive() -> dict:
+        await asyncio.sleep(10)
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict) -> None:
+        messages.append(message)
+
+    await response(
+        {
+            "type": "http",
+            "method": "GET",
+            "headers": [],
+            "asgi": {"spec_version": "2.4"},
+        },
+        receive,
+        send,
+    )
+    return b"".join(message.get("body", b"") for message in messages)
+
+
+async def _collect(messages) -> list[str]:
+    """Return the messages of a stream."""
+    return [message async for message in messages]
@@ -0,0 +1,441 @@
+import functools
+import json
+import shutil
+import subprocess
+import zipfile
+from pathlib import Path
+from typing import IO
+
+import pytest
+from lxml import etree as ET
+
+from recipe_xml_converter.archive import (
+    ParallelEntryWriter,
+    ZipWriter,
+    find_recipes,
+    read_index,
+    read_recipe,
+    write_entry,
+)
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.results import RecentResults, ResultStore
+
+RECIPE = "<recipeml><recipe><head><title>Recipe {i}</title></head></recipe></recipeml>"
+
+
+def _recipes(tmp_path: Path, numbers: range) -> tuple[Path, ...]:
+    """Write a RecipeML file for each number."""
+    (tmp_path / "in").mkdir(exist_ok=True)
+    paths = [tmp_path / "in" / f"{i}.xml" for i in numbers]
+    for i, path in zip(numbers, paths):
+        path.write_text(RECIPE.format(i=i))
+    return tuple(paths)
+
+
+def _titles(archive: zipfile.ZipFile, name: str) -> list[str]:
+    """Return the titles of the recipes in an archive entry."""
+    return ET.fromstring(archive.read(name)).xpath("recipe/title/text()")
+
+
+def _write(content: bytes, target: IO[bytes]) -> int:
+    """Write the content of an archive entry."""
+    return target.write(content)
+
+
+@pytest.fixture
+def archive_path(tmp_path: Path) -> Path:
+    """Return an archive of three recipes combined in entries of two."""
+    (tmp_path / "out").mkdir()
+    return RecipeOrchestrator(
+        _recipes(tmp_path, range(3)), tmp_path / "out", 2
+    ).orchestrate()
+
+
+def test_append_fills_last_entry(archive_path: Path, tmp_path: Path) -> None:
+    """Assert appended recipes fill up the last entry before starting new ones."""
+    with zipfile.ZipFile(archive_path) as archive:
+        first_entry = archive.getinfo("1.xml")
+        first_data = archive.read("1.xml")
+
+    orchestrator = RecipeOrchestrator(_recipes(tmp_path, range(3, 6)), tmp_path, 2)
+    appended_path = orchestrator.append(archive_path)
+
+    assert appended_path.parent == archive_path.parent
+    assert not archive_path.exists()
+    with zipfile.ZipFile(appended_path) as archive:
+        assert archive.testzip() is None
+        # the untouched entry is neither moved nor rewritten
+        assert archive.getinfo("1.xml").header_offset == first_entry.header_offset
+        assert archive.read("1.xml") == first_data
+        assert _titles(archive, "2.xml") == ["Recipe 2", "Recipe 3"]
+        assert _titles(archive, "3.xml") == ["Recipe 4", "Recipe 5"]
+        manifest = json.loads(archive.read("manifest.json"))
+        report = json.loads(archive.read("report.json"))
+
+    assert [entry["files"] for entry in manifest["entries"]] == [2, 2, 2]
+    assert report["summary"] == {"transformed": 6}
+
+
+def test_append_respects_size_limit(archive_path: Path, tmp_path: Path) -> None:
+    """Assert new entries are started when the last one reaches the size limit."""
+    orchestrator = RecipeOrchestrator(
+        _recipes(tmp_path, range(3, 5)), tmp_path, 10, max_entry_size=1
+    )
+    archive_path = orchestrator.append(archive_path)
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert _titles(archive, "2.xml") == ["Recipe 2"]
+        assert _titles(archive, "3.xml") == ["Recipe 3"]
+        assert _titles(archive, "4.xml") == ["Recipe 4"]
+
+
+def test_rerun_job_keeps_appended_archive(archive_path: Path, tmp_path: Path) -> None:
+    """Assert running the job of an archive again doesn't replace the appended archive."""
+    appended_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(3, 4)), tmp_path, 2
+    ).append(archive_path)
+
+    rerun_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(3)), tmp_path / "out", 2
+    ).orchestrate()
+
+    assert rerun_path == archive_path
+    with zipfile.ZipFile(appended_path) as archive:
+        assert _titles(archive, "2.xml") == ["Recipe 2", "Recipe 3"]
+
+
+def test_legacy_archive_is_not_rewritten(archive_path: Path, tmp_path: Path) -> None:
+    """Assert archives without a manifest only get new entries."""
+    legacy_path = tmp_path / "legacy.zip"
+    with zipfile.ZipFile(archive_path) as archive, zipfile.ZipFile(
+        legacy_path, "w"
+    ) as legacy:
+        for name in ("1.xml", "2.xml", "report.json"):
+            legacy.writestr(name, archive.read(name))
+
+    assert (
+        RecipeOrchestrator(_recipes(tmp_path, range(3, 4)), tmp_path, 2).append(
+            legacy_path
+        )
+        == legacy_path
+    )
+
+    with zipfile.ZipFile(legacy_path) as archive:
+        assert _titles(archive, "2.xml") == ["Recipe 2"]
+        assert _titles(archive, "3.xml") == ["Recipe 3"]
+
+
+def test_index_locates_recipes(tmp_path: Path) -> None:
+    """Assert the index points at the exact bytes of every recipe, also after appending."""
+    (tmp_path / "out").mkdir()
+    archive_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(3)), tmp_path / "out", 2, index=True
+    ).orchestrate()
+    archive_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(3, 4)), tmp_path, 2
+    ).append(archive_path)
+
+    with zipfile.ZipFile(archive_path) as archive:
+        records = read_index(archive)
+        assert [(record["title"], record["entry"]) for record in records] == [
+            ("Recipe 0", "1.xml"),
+            ("Recipe 1", "1.xml"),
+            ("Recipe 2", "2.xml"),
+            ("Recipe 3", "2.xml"),
+        ]
+        (record,) = find_recipes(archive, title="Recipe 3")
+        recipe = read_recipe(archive, record)
+        assert ET.fromstring(recipe).findtext("title") == "Recipe 3"
+        assert find_recipes(archive, sha256=record["sha256"]) == [record]
+        assert find_recipes(archive, category="Missing") == []
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_identical_jobs_create_identical_archives(tmp_path: Path, workers: int) -> None:
+    """Assert the archive of a job only depends on its inputs and settings."""
+    files = _recipes(tmp_path, range(3))
+    archives = []
+    for output_dir, job_workers in (("first", 0), ("second", workers)):
+        (tmp_path / output_dir).mkdir()
+        archives.append(
+            RecipeOrchestrator(
+                files, tmp_path / output_dir, 2, workers=job_workers
+            ).orchestrate()
+        )
+
+    assert archives[0].name == archives[1].name
+    assert archives[0].read_bytes() == archives[1].read_bytes()
+
+    (tmp_path / "third").mkdir()
+    other = RecipeOrchestrator(files, tmp_path / "third", 3).orchestrate()
+    assert other.name != archives[0].name
+
+
+def test_result_store_returns_identical_job(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Assert a repeated job is answered from the result store without transforming."""
+    files = _recipes(tmp_path, range(3))
+    for output_dir in ("first", "second"):
+        (tmp_path / output_dir).mkdir()
+    first = RecipeOrchestrator(
+        files, tmp_path / "first", 2, result_store_dir=tmp_path / "store"
+    ).orchestrate()
+
+    def fail(*args: object) -> None:
+        raise AssertionError("The files were transformed again")
+
+    monkeypatch.setattr(RecipeOrchestrator, "_transform_files", fail)
+    orchestrator = RecipeOrchestrator(
+        files, tmp_path / "second", 2, result_store_dir=tmp_path / "store"
+    )
+    second = orchestrator.orchestrate()
+
+    assert second == tmp_path / "second" / first.name
+    assert second.read_bytes() == first.read_bytes()
+    assert orchestrator.report.files == [
+        {"file": f"{i}.xml", "status": "transformed"} for i in range(3)
+    ]
+
+
+def test_result_store_evicts_least_recently_used(tmp_path: Path) -> None:
+    """Assert the store drops the oldest archives once it outgrows its maximum size."""
+    store = ResultStore(tmp_path / "store", max_size=1500)
+    for name in ("a.zip", "b.zip"):
+        (tmp_path / name).write_bytes(b"x" * 1000)
+    store.put(tmp_path / "a.zip")
+    store.put(tmp_path / "b.zip")
+    assert store.get("a.zip", tmp_path) is None
+    assert store.get("b.zip", tmp_path) == tmp_path / "b.zip"
+
+
+def test_recent_results_expire_and_evict_least_recently_used(monkeypatch) -> None:
+    """Assert the in-memory cache keeps recently used archives within its size and time."""
+    now = [0.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    results = RecentResults(max_size=2000, ttl=60)
+    results.put("a", b"a" * 1000)
+    results.put("b", b"b" * 1000)
+    assert results.get("a") == b"a" * 1000
+    results.put("c", b"c" * 1000)
+    results.put("d", b"d" * 3000)  # larger than the whole cache
+
+    assert [results.get(key) is not None for key in "abcd"] == [
+        True,
+        False,
+        True,
+        False,
+    ]
+    now[0] = 60
+    assert results.get("a") is None
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_streamed_entries_match_combined_files(tmp_path: Path, workers: int) -> None:
+    """Assert combining straight into the archive gives the same archive as the stylesheet."""
+    (tmp_path / "in").mkdir()
+    files = []
+    for i in range(5):
+        files.append(tmp_path / "in" / f"{i}.xml")
+        files[-1].write_text(
+            "<recipeml><recipe><head><title>Crème brûlée &amp; more {i}</title>"
+            "<categories><cat>Dessert</cat><cat>French</cat></categories></head>"
+            "<ingredients><ing><amt><qty>2</qty><unit>cups</unit></amt>"
+            "<item>cream</item></ing></ingredients>"
+            "<directions><step>Bake &lt; 1h.</step></directions></recipe>"
+            "<recipe><head><title>Second {i}</title></head></recipe></recipeml>".format(
+                i=i
+            ),
+            encoding="utf-8",
+        )
+
+    archives = []
+    for output_dir, stream_combine in (("files", False), ("streamed", True)):
+        (tmp_path / output_dir).mkdir()
+        archives.append(
+            RecipeOrchestrator(
+                tuple(files),
+                tmp_path / output_dir,
+                2,
+                workers=workers,
+                index=True,
+                stream_combine=stream_combine,
+            ).orchestrate()
+        )
+
+    assert archives[0].read_bytes() == archives[1].read_bytes()
+    with zipfile.ZipFile(archives[1]) as archive:
+        record = find_recipes(archive, title="Crème brûlée & more 4")[0]
+        assert read_recipe(archive, record).startswith(b"<recipe>")
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+@pytest.mark.parametrize("stream_combine", [False, True])
+@pytest.mark.parametrize("compression", ["deflated", "bzip2", "lzma"])
+def test_compressed_entries_match_stored_ones(
+    tmp_path: Path, compression: str, stream_combine: bool, threads: int, monkeypatch
+) -> None:
+    """Assert compressed entries hold the same content in the same order as stored ones."""
+    monkeypatch.setattr("recipe_xml_converter.config.COMPRESSION_THREADS", threads)
+    files = _recipes(tmp_path, range(9))
+    archives = []
+    for output_dir, entry_compression in (
+        ("stored", "stored"),
+        ("compressed", compression),
+    ):
+        (tmp_path / output_dir).mkdir()
+        archives.append(
+            RecipeOrchestrator(
+                files,
+                tmp_path / output_dir,
+                2,
+                index=True,
+                stream_combine=stream_combine,
+                compression=entry_compression,
+            ).orchestrate()
+        )
+
+    with zipfile.ZipFile(archives[0]) as stored, zipfile.ZipFile(
+        archives[1]
+    ) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == stored.namelist()
+        assert all(
+            archive.read(name) == stored.read(name) for name in stored.namelist()
+        )
+        assert archive.getinfo("1.xml").compress_type != zipfile.ZIP_STORED
+        record = find_recipes(archive, title="Recipe 7")[0]
+        assert _titles(archive, record["entry"]) == ["Recipe 6", "Recipe 7"]
+        assert read_recipe(archive, record).startswith(b"<recipe>")
+    if compression == "deflated" and shutil.which("unzip"):
+        subprocess.run(["unzip", "-tqq", str(archives[1])], check=True)
+
+
+def test_append_to_compressed_archive(tmp_path: Path) -> None:
+    """Assert appending compresses the rewritten and new entries as well."""
+    (tmp_path / "out").mkdir()
+    archive_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(3)), tmp_path / "out", 2, compression="deflated"
+    ).orchestrate()
+
+    archive_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(3, 6)), tmp_path, 2, compression="deflated"
+    ).append(archive_path)
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert archive.testzip() is None
+        assert _titles(archive, "2.xml") == ["Recipe 2", "Recipe 3"]
+        assert _titles(archive, "3.xml") == ["Recipe 4", "Recipe 5"]
+        assert {archive.getinfo(f"{i}.xml").compress_type for i in (1, 2, 3)} == {
+            zipfile.ZIP_DEFLATED
+        }
+
+
+def test_zip_writer_switches_to_zip64(tmp_path: Path, monkeypatch) -> None:
+    """Assert members and directories past the zip64 limit are readable by zipfile and unzip."""
+    monkeypatch.setattr(zipfile, "ZIP64_LIMIT", 1000)
+    contents = [f"<cookbook>{'x' * 500 * i}</cookbook>".encode() for i in range(6)]
+    archive_path = tmp_path / "zip64.zip"
+    with open(archive_path, "w+b") as target, ZipWriter(
+        target, zipfile.ZIP_DEFLATED
+    ) as writer:
+        with ParallelEntryWriter(writer, zipfile.ZIP_STORED, 2) as parallel_writer:
+            for i, content in enumerate(contents):
+                parallel_writer.submit(
+                    f"{i}.xml", functools.partial(_write, content), len(content)
+                )
+        write_entry(writer.archive, "report.json", "{}")
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert archive.testzip() is None
+        assert [archive.read(f"{i}.xml") for i in range(6)] == contents
+        assert archive.getinfo("5.xml").header_offset > 1000
+        assert archive.getinfo("5.xml").extra[:2] == b"\x01\x00"
+    if shutil.which("unzip"):
+        subprocess.run(["unzip", "-tqq", str(archive_path)], check=True)
+
+
+def test_zip_writer_copies_data_descriptors(tmp_path: Path) -> None:
+    """Assert members written to a stream keep the sizes following their data."""
+
+    class Stream:
+        """An output zipfile can't seek in."""
+
+        def __init__(self) -> None:
+            self.data = b""
+
+        def write(self, data: bytes) -> int:
+            self.data += data
+            return len(data)
+
+        def flush(self) -> None:
+            pass
+
+        def close(self) -> None:
+            pass
+
+    stream = Stream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as source:
+        for i in range(3):
+            source.writestr(f"{i}.xml", f"<cookbook>{i}</cookbook>" * 100)
+    (tmp_path / "source.zip").write_bytes(stream.data)
+
+    with open(tmp_path / "source.zip", "rb") as source_file, zipfile.ZipFile(
+        source_file
+    ) as source, open(tmp_path / "copy.zip", "w+b") as target, ZipWriter(
+        target
+    ) as writer:
+        assert all(info.flag_bits & 0x08 for info in source.infolist())
+        for info in reversed(source.infolist()):
+            writer.copy_member(source_file, info)
+
+    with zipfile.ZipFile(tmp_path / "copy.zip") as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["2.xml", "1.xml", "0.xml"]
+    if shutil.which("unzip"):
+        subprocess.run(["unzip", "-tqq", str(tmp_path / "copy.zip")], check=True)
+
+
+def test_append_copies_untouched_members_as_they_are(tmp_path: Path) -> None:
+    """Assert kept entries are neither decompressed nor moved, whatever the new compression."""
+    (tmp_path / "out").mkdir()
+    archive_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(5)), tmp_path / "out", 2, compression="lzma"
+    ).orchestrate()
+    with zipfile.ZipFile(archive_path) as archive:
+        kept = [archive.getinfo(name) for name in ("1.xml", "2.xml")]
+    raw_members = [_raw_member(archive_path, info) for info in kept]
+
+    archive_path = RecipeOrchestrator(
+        _recipes(tmp_path, range(5, 7)), tmp_path, 2, compression="stored"
+    ).append(archive_path)
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert archive.testzip() is None
+        copies = [archive.getinfo(info.filename) for info in kept]
+        assert [
+            (info.CRC, info.compress_size, info.compress_type, info.header_offset)
+            for info in copies
+        ] == [
+            (info.CRC, info.compress_size, zipfile.ZIP_LZMA, info.header_offset)
+            for info in kept
+        ]
+        assert archive.getinfo("3.xml").compress_type == zipfile.ZIP_STORED
+    assert [_raw_member(archive_path, info) for info in copies] == raw_members
+
+
+def _raw_member(archive_path: Path, info: zipfile.ZipInfo) -> bytes:
+    """Return the local header and the compressed data of an archive member."""
+    with open(archive_path, "rb") as archive_file:
+        archive_file.seek(info.header_offset)
+        header = archive_file.read(30)
+        length = int.from_bytes(header[26:28], "little") + int.from_bytes(
+            header[28:30], "little"
+        )
+        return header + archive_file.read(length + info.compress_size)
+
+
+def test_unsupported_compression(tmp_path: Path) -> None:
+    """Assert an unknown compression method is rejected before transforming anything."""
+    with pytest.raises(ValueError, match="zstd"):
+        RecipeOrchestrator((), tmp_path, compression="zstd")
@@ -0,0 +1,77 @@
+import threading
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from recipe_xml_converter import daemon
+from recipe_xml_converter.archive import INDEX_NAME
+from recipe_xml_converter.exceptions import TransformerException
+
+RECIPE = b"<recipeml><recipe><head><title>Soup</title></head></recipe></recipeml>"
+
+
+@pytest.fixture
+def socket_path(tmp_path: Path):
+    """Run a conversion daemon in a background thread and return its socket."""
+    socket_path = tmp_path / "daemon.sock"
+    server = daemon.ConversionDaemon(socket_path, workers=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield socket_path
+    server.shutdown()
+    server.server_close()
+
+
+def test_daemon_converts_files(socket_path: Path, tmp_path: Path) -> None:
+    """Assert the client receives the archive converted by the daemon."""
+    (tmp_path / "recipes").mkdir()
+    (tmp_path / "recipes" / "soup.xml").write_bytes(RECIPE)
+
+    archive_path = daemon.submit(
+        socket_path, (str(tmp_path / "recipes"),), str(tmp_path), 10
+    )
+    with zipfile.ZipFile(archive_path) as archive:
+        assert b"<title>Soup</title>" in archive.read("1.xml")
+
+
+def test_daemon_forwards_options_and_progress(
+    socket_path: Path, tmp_path: Path
+) -> None:
+    """Assert the options of the client are applied and its progress is sent back."""
+    (tmp_path / "recipes").mkdir()
+    for name, title in (("a", b"Stew"), ("b", b"Bread")):
+        (tmp_path / "recipes" / f"{name}.xml").write_bytes(
+            RECIPE.replace(b"Soup", title)
+        )
+    events: list[dict] = []
+
+    archive_path = daemon.submit(
+        socket_path,
+        (str(tmp_path / "recipes"),),
+        str(tmp_path),
+        10,
+        on_progress=events.append,
+        index=True,
+        sort_by="title",
+    )
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert INDEX_NAME in archive.namelist()
+        assert archive.read("1.xml").index(b"Bread") < archive.read("1.xml").index(
+            b"Stew"
+        )
+    assert {event["stage"] for event in events} >= {"transform", "sort"}
+
+
+def test_daemon_reports_errors(socket_path: Path, tmp_path: Path) -> None:
+    """Assert failures in the daemon are raised in the client."""
+    with pytest.raises(TransformerException, match="Cannot locate"):
+        daemon.submit(socket_path, (str(tmp_path / "missing"),), str(tmp_path), 10)
+
+
+def test_daemon_refuses_socket_in_use(socket_path: Path) -> None:
+    """Assert a second daemon doesn't hijack the socket of a running one."""
+    assert daemon.is_running(socket_path)
+    with pytest.raises(TransformerException, match="already listening"):
+        daemon.ConversionDaemon(socket_path)
@@ -0,0 +1,135 @@
+import json
+import multiprocessing
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+
+from recipe_xml_converter.distributed import QUEUE_NAME, WorkQueue, encode_input
+from recipe_xml_converter.exceptions import TransformerException
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+
+RECIPE = "<recipeml><recipe><head><title>Recipe {i}</title></head></recipe></recipeml>"
+
+
+def _recipes(tmp_path: Path, count: int) -> tuple[Path, ...]:
+    """Write RecipeML files and a file that isn't RecipeML at the end."""
+    (tmp_path / "in").mkdir()
+    paths = [tmp_path / "in" / f"{i}.xml" for i in range(count)]
+    for i, path in enumerate(paths):
+        path.write_text(RECIPE.format(i=i))
+    paths.append(tmp_path / "in" / "broken.xml")
+    paths[-1].write_text("<cookbook/>")
+    return tuple(paths)
+
+
+def _node(shared_dir: Path) -> None:
+    """Work on the job in the shared directory like a node on another host."""
+    RecipeOrchestrator((), shared_dir).work(shared_dir, publish_timeout=30)
+
+
+def _titles(archive_path: Path) -> list[str]:
+    """Return the titles of all recipes in an archive."""
+    with zipfile.ZipFile(archive_path) as archive:
+        return [
+            title
+            for name in sorted(archive.namelist())
+            if name.endswith(".xml")
+            for title in ET.fromstring(archive.read(name)).xpath("recipe/title/text()")
+        ]
+
+
+def test_nodes_transform_a_job_together(tmp_path: Path) -> None:
+    """Assert nodes started before the job and the coordinator transform every file once."""
+    shared_dir = tmp_path / "shared"
+    context = multiprocessing.get_context("spawn")
+    nodes = [context.Process(target=_node, args=(shared_dir,)) for _ in range(2)]
+    for node in nodes:
+        node.start()
+
+    files = _recipes(tmp_path, 12)
+    (tmp_path / "out").mkdir()
+    orchestrator = RecipeOrchestrator(files, tmp_path / "out", 5)
+    archive_path = orchestrator.orchestrate_distributed(shared_dir, files_per_claim=2)
+    for node in nodes:
+        node.join(30)
+        assert node.exitcode == 0
+
+    assert _titles(archive_path) == [f"Recipe {i}" for i in range(12)]
+    with zipfile.ZipFile(archive_path) as archive:
+        report = json.loads(archive.read("report.json"))
+    assert report["summary"] == {"transformed": 12, "rejected": 1}
+    assert [entry["file"] for entry in report["files"]] == [
+        *[f"{i}.xml" for i in range(12)],
+        "broken.xml",
+    ]
+
+
+def test_chunks_of_silent_nodes_are_taken_over(tmp_path: Path) -> None:
+    """Assert a chunk claimed by a node that stopped reporting progress is done by another."""
+    shared_dir = tmp_path / "shared"
+    files = _recipes(tmp_path, 4)
+    (tmp_path / "out").mkdir()
+    orchestrator = RecipeOrchestrator(files, tmp_path / "out")
+    queue = WorkQueue(shared_dir, claim_timeout=0.1)
+    queue.publish(
+        [encode_input(file) for file in files],
+        files_per_claim=2,
+        digest=orchestrator._archive_name,
+    )
+    assert queue.claim("crashed-node") is not None
+    queue.close()
+
+    archive_path = orchestrator.orchestrate_distributed(shared_dir, claim_timeout=0.1)
+
+    assert _titles(archive_path) == [f"Recipe {i}" for i in range(4)]
+    assert (shared_dir / QUEUE_NAME).exists()
+
+
+def test_heartbeats_keep_slow_chunks_claimed(tmp_path: Path) -> None:
+    """Assert a chunk isn't taken over while its node works on it past the claim timeout."""
+    queue = WorkQueue(tmp_path, claim_timeout=0.3)
+    queue.publish([{"path": "slow.xml"}], files_per_claim=1, digest="job")
+    claim = queue.claim("slow-node")
+    assert claim is not None
+
+    with queue.keep_claimed(claim[0], "slow-node"):
+        time.sleep(1)
+        assert queue.claim("other-node") is None
+    time.sleep(0.5)
+    assert queue.claim("other-node") is not None
+    queue.close()
+
+
+def test_finished_jobs_are_cleared(tmp_path: Path) -> None:
+    """Assert a job published after a finished one transforms its own files."""
+    shared_dir = tmp_path / "shared"
+    files = _recipes(tmp_path, 2)
+    (tmp_path / "out").mkdir()
+    RecipeOrchestrator(files, tmp_path / "out").orchestrate_distributed(shared_dir)
+    files[0].write_text(RECIPE.format(i="changed"))
+
+    archive_path = RecipeOrchestrator(files, tmp_path / "out").orchestrate_distributed(
+        shared_dir
+    )
+
+    assert _titles(archive_path) == ["Recipe changed", "Recipe 1"]
+    queue = WorkQueue(shared_dir, claim_timeout=1)
+    assert queue.claim("late-node") is None
+    assert queue.outcomes() == {}
+    queue.close()
+
+
+def test_other_unfinished_jobs_are_refused(tmp_path: Path) -> None:
+    """Assert a job isn't resumed from the chunks of a different unfinished job."""
+    shared_dir = tmp_path / "shared"
+    files = _recipes(tmp_path, 2)
+    queue = WorkQueue(shared_dir, claim_timeout=1)
+    queue.publish([encode_input(file) for file in files], 1, digest="other job")
+    queue.close()
+
+    (tmp_path / "out").mkdir()
+    with pytest.raises(TransformerException, match="another unfinished job"):
+        RecipeOrchestrator(files, tmp_path / "out").orchestrate_distributed(shared_dir)
@@ -0,0 +1,80 @@
+import json
+import zipfile
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+from lxml.builder import E
+
+from recipe_xml_converter.exporters import (
+    RecipeJsonLinesExporter,
+    RecipeParquetExporter,
+)
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.transformer import RecipeTransformer
+from tests.fixtures import transformer  # noqa: F401
+
+RECIPEML = E.recipeml(
+    E("meta", name="DC.Creator", content="Creator Name"),
+    E.recipe(
+        E.head(
+            E.title("Soup"),
+            E.categories(E.cat("Soups"), E.cat("Starters")),
+            E("yield", "4"),
+        ),
+        E.ingredients(E.ing(E.amt(E.qty("1"), E.unit("cup")), E.item("water"))),
+        E.directions(E.step("Boil the water.")),
+    ),
+    E.recipe(E.head(E.title("Bread"))),
+)
+
+
+def _write_transformed(transformer: RecipeTransformer, path: Path) -> Path:
+    """Save the transformed sample recipes to the path."""
+    transformer.save_to_file(transformer._transform(RECIPEML), path)
+    return path
+
+
+def test_json_lines_export(transformer: RecipeTransformer, tmp_path: Path) -> None:
+    """Assert every recipe of every file is written as a line of JSON with all its fields."""
+    files = (
+        _write_transformed(transformer, tmp_path / "1.xml"),
+        _write_transformed(transformer, tmp_path / "2.xml"),
+    )
+    RecipeJsonLinesExporter(files, tmp_path / "recipes.jsonl").export()
+
+    lines = (tmp_path / "recipes.jsonl").read_text().splitlines()
+    assert [json.loads(line)["title"] for line in lines] == ["Soup", "Bread"] * 2
+    assert json.loads(lines[0]) == {
+        "title": "Soup",
+        "description": None,
+        "categories": ["Soups", "Starters"],
+        "quantity": "4",
+        "preptime": None,
+        "cooktime": None,
+        "ingredients": ["1 cup water"],
+        "recipetext": ["Boil the water."],
+        "source": ["Creator: Creator Name"],
+    }
+
+
+def test_parquet_export(transformer: RecipeTransformer, tmp_path: Path) -> None:
+    """Assert the recipes are written to a Parquet file."""
+    pq = pytest.importorskip("pyarrow.parquet")
+    files = (_write_transformed(transformer, tmp_path / "1.xml"),)
+    RecipeParquetExporter(files, tmp_path / "recipes.parquet").export()
+
+    table = pq.read_table(tmp_path / "recipes.parquet")
+    assert table.column("title").to_pylist() == ["Soup", "Bread"]
+    assert table.column("categories").to_pylist() == [["Soups", "Starters"], []]
+
+
+def test_orchestrator_exports_json_lines(tmp_path: Path) -> None:
+    """Assert the orchestrator archives the exported recipes instead of combined XML files."""
+    (tmp_path / "recipes.xml").write_bytes(ET.tostring(RECIPEML))
+    orchestrator = RecipeOrchestrator(
+        (tmp_path / "recipes.xml",), tmp_path, output_format="jsonl"
+    )
+    with zipfile.ZipFile(orchestrator.orchestrate()) as archive:
+        assert archive.namelist() == ["recipes.jsonl", "report.json"]
+        assert len(archive.read("recipes.jsonl").splitlines()) == 2
@@ -0,0 +1,50 @@
+import io
+import tempfile
+from pathlib import Path
+
+from recipe_xml_converter.helpers import get_file_name, get_input_root, map_file
+from recipe_xml_converter.inputs import ArchiveMember
+
+
+def test_map_file_maps_files_on_disk(tmp_path: Path) -> None:
+    """Assert files on disk are mapped once they reach the minimum size."""
+    path = tmp_path / "recipes.xml"
+    path.write_bytes(b"<recipeml/>")
+
+    with map_file(path, min_size=0) as buffer:
+        assert buffer is not None and buffer[:] == b"<recipeml/>"
+    with map_file(path, min_size=1024) as buffer:
+        assert buffer is None
+
+
+def test_map_file_skips_in_memory_files() -> None:
+    """Assert file objects without a file descriptor are never mapped."""
+    with map_file(io.BytesIO(b"<recipeml/>"), min_size=0) as buffer:
+        assert buffer is None
+
+
+def test_map_file_maps_large_spooled_files() -> None:
+    """Assert spooled files are only mapped once they reach the minimum size."""
+    with tempfile.SpooledTemporaryFile(max_size=1024) as file:
+        file.write(b"<recipeml/>")
+        with map_file(file, min_size=1024) as buffer:
+            assert buffer is None
+        with map_file(file, min_size=0) as buffer:
+            assert buffer is not None and buffer[:] == b"<recipeml/>"
+
+
+def test_file_names_keep_their_folders(tmp_path: Path) -> None:
+    """Assert inputs of the same name are named by their path below the common folder."""
+    files = (
+        tmp_path / "a" / "recipes.xml",
+        ArchiveMember(tmp_path / "b" / "recipes.zip", "c/recipes.xml"),
+    )
+
+    root = get_input_root(files)
+
+    assert root == tmp_path
+    assert [get_file_name(file, root) for file in files] == [
+        "a/recipes.xml",
+        "b/recipes.zip/c/recipes.xml",
+    ]
+    assert get_file_name(files[0], get_input_root(files[:1])) == "recipes.xml"
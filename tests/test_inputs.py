@@ -0,0 +1,160 @@
+import gzip
+import io
+import json
+import os
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from recipe_xml_converter import inputs
+from recipe_xml_converter.exceptions import InvalidInputException
+from recipe_xml_converter.helpers import get_files_in_path
+from recipe_xml_converter.inputs import list_members, tar_streams
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+
+RECIPE = "<recipeml><recipe><head><title>Recipe {i}</title></head></recipe></recipeml>"
+
+
+def _zip(path: Path) -> Path:
+    """Write a zip archive of two recipes and a file that isn't XML."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.xml", RECIPE.format(i=1))
+        archive.writestr("nested/b.xml", RECIPE.format(i=2))
+        archive.writestr("notes.txt", "not a recipe")
+    return path
+
+
+def _tar(path: Path) -> Path:
+    """Write a tar archive of two recipes, compressed as the suffix says."""
+    with tarfile.open(path, "w:gz" if path.suffix == ".gz" else "w") as archive:
+        for name, i in (("a.xml", 1), ("nested/b.xml", 2)):
+            data = RECIPE.format(i=i).encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+def _gzip(path: Path) -> Path:
+    """Write a single gzip-compressed recipe."""
+    with gzip.open(path, "wt") as file:
+        file.write(RECIPE.format(i=1))
+    return path
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+@pytest.mark.parametrize(
+    "bundle, names",
+    [
+        (_zip, ["bundle.zip/a.xml", "bundle.zip/nested/b.xml"]),
+        (_tar, ["bundle.tar/a.xml", "bundle.tar/nested/b.xml"]),
+        (_tar, ["bundle.tar.gz/a.xml", "bundle.tar.gz/nested/b.xml"]),
+        (_gzip, ["bundle.xml.gz"]),
+    ],
+)
+def test_bundle_members_are_transformed(
+    bundle, names: list[str], workers: int, tmp_path: Path
+) -> None:
+    """Assert the XML members of archives and compressed files are transformed."""
+    path = bundle(tmp_path / names[0].split("/")[0])
+    archive_path = RecipeOrchestrator(
+        get_files_in_path(path), tmp_path, 10, workers=workers
+    ).orchestrate()
+
+    with zipfile.ZipFile(archive_path) as archive:
+        report = json.loads(archive.read("report.json"))
+        cookbook = archive.read("1.xml").decode()
+
+    assert sorted(file["file"] for file in report["files"]) == names
+    assert report["summary"] == {"transformed": len(names)}
+    assert all(f"Recipe {i + 1}" in cookbook for i in range(len(names)))
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_compressed_tars_are_decompressed_once(
+    workers: int, tmp_path: Path, monkeypatch
+) -> None:
+    """Assert a compressed tar is decompressed once however its members are scheduled."""
+    opened = []
+    open_tar = inputs._open_tar
+
+    def counting_open_tar(archive: Path):
+        opened.append(archive)
+        return open_tar(archive)
+
+    monkeypatch.setattr(inputs, "_open_tar", counting_open_tar)
+    path = _tar(tmp_path / "bundle.tar.gz")
+
+    RecipeOrchestrator(
+        get_files_in_path(path), tmp_path, 10, workers=workers
+    ).orchestrate()
+
+    assert opened == [path]
+
+
+def test_bundles_in_directories_are_expanded(tmp_path: Path) -> None:
+    """Assert bundles found in an input directory are expanded next to plain files."""
+    (tmp_path / "in").mkdir()
+    _zip(tmp_path / "in" / "bundle.zip")
+    (tmp_path / "in" / "c.xml").write_text(RECIPE.format(i=3))
+    (tmp_path / "in" / "readme.gz").write_bytes(b"")
+
+    files = get_files_in_path(tmp_path / "in")
+
+    assert [file.name for file in files] == [
+        "bundle.zip/a.xml",
+        "bundle.zip/nested/b.xml",
+        "c.xml",
+    ]
+
+
+def test_unreadable_bundle(tmp_path: Path) -> None:
+    """Assert a corrupt archive is rejected with a readable error."""
+    path = tmp_path / "broken.zip"
+    path.write_bytes(b"not a zip")
+
+    with pytest.raises(InvalidInputException, match="broken.zip"):
+        list_members(path)
+
+
+def test_corrupt_compressed_member_fails_alone(tmp_path: Path) -> None:
+    """Assert a member that can't be decompressed only fails its own file."""
+    _gzip(tmp_path / "good.xml.gz")
+    (tmp_path / "bad.xml.gz").write_bytes(b"\x1f\x8b not gzip")
+    files = get_files_in_path(tmp_path / "good.xml.gz") + get_files_in_path(
+        tmp_path / "bad.xml.gz"
+    )
+
+    archive_path = RecipeOrchestrator(files, tmp_path, 10).orchestrate()
+
+    with zipfile.ZipFile(archive_path) as archive:
+        report = json.loads(archive.read("report.json"))
+    assert report["summary"] == {"transformed": 1, "failed": 1}
+
+
+def _open_files(path: Path) -> int:
+    """Return the number of file descriptors of this process open on a file."""
+    return sum(
+        1
+        for fd in os.listdir("/proc/self/fd")
+        if os.path.realpath(f"/proc/self/fd/{fd}") == str(path.resolve())
+    )
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+@pytest.mark.parametrize("bundle", [_zip, _tar])
+def test_archives_are_closed(bundle, tmp_path: Path) -> None:
+    """Assert archives stay open only while a member or the tar stream of a job is open."""
+    path = bundle(tmp_path / ("bundle.zip" if bundle is _zip else "bundle.tar.gz"))
+
+    with tar_streams():
+        members = [member.open() for member in list_members(path)]
+        assert [member.read() for member in members] == [
+            RECIPE.format(i=i).encode() for i in (1, 2)
+        ]
+        for member in members:
+            member.close()
+        assert _open_files(path) == (0 if bundle is _zip else 1)
+    assert _open_files(path) == 0
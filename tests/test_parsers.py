@@ -0,0 +1,86 @@
+import threading
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+from lxml.builder import E
+
+from recipe_xml_converter.exceptions import TransformerException
+from recipe_xml_converter.parsers import get_parser, get_stylesheet
+from recipe_xml_converter.transformer import (
+    STYLESHEETS_DIR,
+    RecipeCombiner,
+    RecipeTransformer,
+    check_transformations,
+)
+
+
+def test_parser_is_reused_per_thread() -> None:
+    """Assert every thread reuses its own parser for the same options."""
+    parser = get_parser()
+    assert get_parser() is parser
+    assert get_parser(huge_tree=True) is not parser
+
+    other_parsers = []
+    thread = threading.Thread(target=lambda: other_parsers.append(get_parser()))
+    thread.start()
+    thread.join()
+    assert other_parsers[0] is not parser
+
+
+def test_stylesheets_are_compiled_once_per_thread() -> None:
+    """Assert stylesheets without a document root are only compiled once."""
+    xsl_file = STYLESHEETS_DIR / "transform.xsl"
+    assert get_stylesheet(xsl_file) is get_stylesheet(xsl_file)
+    assert get_stylesheet(xsl_file, Path()) is not get_stylesheet(xsl_file, Path())
+
+
+def test_check_transformations() -> None:
+    """Assert the self-check times every stylesheet and the sample transformation."""
+    timings = check_transformations()
+    assert {"compile transform.xsl", "transform sample recipe"} <= timings.keys()
+
+
+def test_external_entities_are_not_resolved(tmp_path: Path) -> None:
+    """Assert input files can't pull in the contents of other files through entities."""
+    secret = tmp_path / "secret.txt"
+    secret.write_text("secret")
+    recipe = tmp_path / "recipe.xml"
+    recipe.write_text(
+        f'<!DOCTYPE recipeml [<!ENTITY s SYSTEM "{secret.as_uri()}">]>'
+        "<recipeml><recipe><head><title>&s;</title></head></recipe></recipeml>"
+    )
+    try:
+        RecipeTransformer(recipe, tmp_path / "out.xml").transform_and_save()
+    except TransformerException:
+        return  # refusing the undefined entity is just as safe
+    assert b"secret" not in (tmp_path / "out.xml").read_bytes()
+
+
+def _write_file_list(work_dir: Path, path: Path) -> Path:
+    """Write a file list referencing a single file and return its path."""
+    file_list = work_dir / "files.xml"
+    file_list.write_bytes(ET.tostring(E.files(E.file(path=str(path)))))
+    return file_list
+
+
+def test_combiner_reads_files_in_work_dir(tmp_path: Path) -> None:
+    """Assert the combiner can read files stored next to the file list."""
+    (tmp_path / "a.xml").write_text(
+        "<cookbook><recipe><title>A</title></recipe></cookbook>"
+    )
+    file_list = _write_file_list(tmp_path, tmp_path / "a.xml")
+    RecipeCombiner(file_list, tmp_path / "out.xml").transform_and_save()
+    assert b"<title>A</title>" in (tmp_path / "out.xml").read_bytes()
+
+
+def test_combiner_refuses_files_outside_work_dir(tmp_path: Path) -> None:
+    """Assert the combiner can't read files outside of the directory of the file list."""
+    (tmp_path / "a.xml").write_text(
+        "<cookbook><recipe><title>A</title></recipe></cookbook>"
+    )
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    file_list = _write_file_list(work_dir, work_dir / ".." / "a.xml")
+    with pytest.raises(TransformerException, match="Access denied"):
+        RecipeCombiner(file_list, work_dir / "out.xml").transform_and_save()
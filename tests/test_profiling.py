@@ -0,0 +1,72 @@
+import json
+import pstats
+from pathlib import Path
+
+import pytest
+
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.transformer import RecipeTransformer
+
+RECIPES = (
+    b"<recipeml><recipe><head><title>Soup</title></head></recipe>"
+    b"<recipe><head><title>Stew</title></head></recipe></recipeml>"
+)
+
+
+def test_transformer_collects_template_timings(tmp_path: Path) -> None:
+    """Assert profiling records the templates of every stylesheet without changing the output."""
+    (tmp_path / "recipes.xml").write_bytes(RECIPES)
+    RecipeTransformer(
+        tmp_path / "recipes.xml", tmp_path / "plain.xml"
+    ).transform_and_save()
+    transformer = RecipeTransformer(
+        tmp_path / "recipes.xml", tmp_path / "profiled.xml", profile=True
+    )
+    transformer.transform_and_save()
+
+    assert (tmp_path / "plain.xml").read_bytes() == (
+        tmp_path / "profiled.xml"
+    ).read_bytes()
+    assert {record["stylesheet"] for record in transformer.profile} == {
+        "transform.xsl",
+        "normalize_space.xsl",
+    }
+    (recipe,) = [
+        record
+        for record in transformer.profile
+        if record["stylesheet"] == "transform.xsl" and record["template"] == "recipe"
+    ]
+    assert recipe["calls"] == 2
+
+
+@pytest.mark.parametrize("workers", [0, 1])
+def test_profiles_are_saved_next_to_archive(tmp_path: Path, workers: int) -> None:
+    """Assert the profiles of all files of a job are aggregated next to the archive."""
+    for name in ("a.xml", "b.xml"):
+        (tmp_path / name).write_bytes(RECIPES)
+    (tmp_path / "out").mkdir()
+    orchestrator = RecipeOrchestrator(
+        (tmp_path / "a.xml", tmp_path / "b.xml"),
+        tmp_path / "out",
+        workers=workers,
+        profile=True,
+        profile_python=True,
+    )
+    archive_path = orchestrator.orchestrate()
+
+    profile = json.loads(archive_path.with_suffix(".profile.json").read_text())
+    assert profile == orchestrator.profile
+    assert [record["time"] for record in profile] == sorted(
+        [record["time"] for record in profile], reverse=True
+    )
+    calls = {
+        (record["stylesheet"], record["template"]): record["calls"]
+        for record in profile
+    }
+    assert calls[("transform.xsl", "recipe")] == 4
+    assert calls[("group.xsl", "/")] == 1
+
+    stats = pstats.Stats(str(archive_path.with_suffix(".pstats")))
+    assert any(
+        function == "transform_and_save" for _, _, function in stats.stats  # type: ignore
+    )
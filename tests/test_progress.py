@@ -0,0 +1,45 @@
+import io
+import json
+
+from recipe_xml_converter.progress import TRANSFORM, JsonLinesRenderer, ProgressBus
+
+
+def test_events_are_rate_limited() -> None:
+    """Assert only the first, the last and the events after the interval are published."""
+    events: list[dict] = []
+    bus = ProgressBus(interval=60)
+    bus.subscribe(events.append)
+
+    bus.start(TRANSFORM, 3)
+    bus.advance(TRANSFORM, size=10)
+    bus.advance(TRANSFORM, size=20, errors=1)
+    bus.advance(TRANSFORM, size=30)
+    bus.finish(TRANSFORM)
+
+    assert [(event["done"], event["finished"]) for event in events] == [
+        (0, False),
+        (3, False),
+        (3, True),
+    ]
+    assert events[-1] == {
+        "stage": TRANSFORM,
+        "done": 3,
+        "total": 3,
+        "bytes": 60,
+        "errors": 1,
+        "finished": True,
+    }
+
+
+def test_json_lines() -> None:
+    """Assert every event is written as a line of JSON once subscribed."""
+    stream = io.StringIO()
+    bus = ProgressBus(interval=0)
+    bus.start(TRANSFORM, 2)
+    renderer = JsonLinesRenderer(stream)
+    bus.subscribe(renderer)
+    bus.advance(TRANSFORM)
+    bus.unsubscribe(renderer)
+    bus.advance(TRANSFORM)
+
+    assert [json.loads(line)["done"] for line in stream.getvalue().splitlines()] == [1]
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+
+from recipe_xml_converter.recipes import Recipe, read_recipes, write_recipes
+from recipe_xml_converter.transformer import RecipeTransformer
+
+RECIPEML = (
+    "<recipeml><recipe><head><title>Soup {i}</title><subtitle>Hot</subtitle>"
+    "<categories><cat>Soup</cat><cat>Starter</cat></categories><yield>4</yield>"
+    '<preptime type="cooking">1h</preptime><preptime type="preparation">5 min</preptime>'
+    "</head><ingredients><ing><amt><qty>1</qty></amt><item>leek</item></ing></ingredients>"
+    "<directions><step>Cook &amp; serve.</step></directions></recipe></recipeml>"
+)
+
+
+def test_recipes_are_saved_like_transformed_files(tmp_path: Path) -> None:
+    """Assert recipes read from a transformed file are saved to the same bytes again."""
+    (tmp_path / "in.xml").write_text(RECIPEML.format(i=1) + "\n")
+    RecipeTransformer(tmp_path / "in.xml", tmp_path / "out.xml").transform_and_save()
+
+    recipes = list(read_recipes(tmp_path / "out.xml"))
+    write_recipes(recipes, tmp_path / "copy.xml")
+
+    # saved cookbooks carry the version of the format like the combined files
+    assert (tmp_path / "copy.xml").read_bytes() == (
+        tmp_path / "out.xml"
+    ).read_bytes().replace(b"<cookbook>", b'<cookbook version="46">', 1)
+    assert recipes[0].to_record()["cooktime"] == "1h"
+    assert recipes[0].times == (("cooktime", "1h"), ("preptime", "5 min"))
+
+
+def test_categories_are_interned(tmp_path: Path) -> None:
+    """Assert the categories of different recipes share their strings."""
+    (tmp_path / "in.xml").write_text(RECIPEML.format(i=1))
+    (tmp_path / "in2.xml").write_text(RECIPEML.format(i=2))
+
+    first, second = [
+        RecipeTransformer(tmp_path / name, tmp_path).transform_to_recipes()[0]
+        for name in ("in.xml", "in2.xml")
+    ]
+
+    assert first.categories == ("Soup", "Starter")
+    assert all(a is b for a, b in zip(first.categories, second.categories))
+
+
+@pytest.mark.parametrize(
+    "recipe",
+    [
+        "<recipe><title>A</title><title>B</title></recipe>",
+        "<recipe><source/><title>A</title></recipe>",
+        "<recipe><title>A<b>bold</b></title></recipe>",
+        "<recipe><ingredient><p>1 leek</p></ingredient></recipe>",
+        "<recipe><nutrition/></recipe>",
+    ],
+)
+def test_unexpected_recipes_are_rejected(recipe: str) -> None:
+    """Assert recipes the transformation wouldn't create aren't silently changed."""
+    with pytest.raises(ValueError):
+        Recipe.from_element(ET.fromstring(recipe))
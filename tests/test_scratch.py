@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from recipe_xml_converter.exceptions import ScratchSpaceException
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.scratch import JOBS_DIR, OWNER_NAME, ScratchSpace
+
+RECIPE = "<recipeml><recipe><head><title>Recipe</title></head></recipe></recipeml>"
+
+
+def test_small_jobs_go_to_memory_root(tmp_path: Path) -> None:
+    """Assert jobs up to the memory size limit use the memory root and larger ones the disk."""
+    scratch_space = ScratchSpace(
+        tmp_path / "disk", tmp_path / "memory", memory_max_job_size=1000
+    )
+
+    with scratch_space.create(1000) as small, scratch_space.create(1001) as large:
+        assert small.parent == tmp_path / "memory" / JOBS_DIR
+        assert large.parent == tmp_path / "disk" / JOBS_DIR
+    assert not small.exists() and not large.exists()
+
+
+def test_quotas(tmp_path: Path) -> None:
+    """Assert jobs beyond their own or the global quota are refused."""
+    scratch_space = ScratchSpace(tmp_path, job_quota=100, quota=150)
+
+    with pytest.raises(ScratchSpaceException, match="quota of 100"):
+        scratch_space.create(101)
+    with scratch_space.create(100):
+        with pytest.raises(ScratchSpaceException, match="No scratch space left"):
+            scratch_space.create(100)
+        scratch_space.create(50).cleanup()
+    scratch_space.create(100).cleanup()  # the reservation ended with the job
+
+
+def test_job_quota_is_checked_against_usage(tmp_path: Path) -> None:
+    """Assert a job keeping more bytes than its quota fails the check."""
+    scratch_dir = ScratchSpace(tmp_path, job_quota=100).create(10)
+    (scratch_dir.path / "a.xml").write_bytes(b"x" * 20)
+    scratch_dir.check()
+    (scratch_dir.path / "b.xml").write_bytes(b"x" * 40)
+
+    with pytest.raises(ScratchSpaceException, match="uses 1[0-9]{2} bytes"):
+        scratch_dir.check()
+
+
+def test_janitor_removes_abandoned_directories(tmp_path: Path) -> None:
+    """Assert only directories of ended processes or silent other hosts are removed."""
+    scratch_space = ScratchSpace(tmp_path, max_age=60)
+    running = scratch_space.create(10)
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from pathlib import Path; from recipe_xml_converter.scratch import ScratchSpace; "
+            f"ScratchSpace(Path({str(tmp_path)!r})).create(10)",
+        ],
+        check=True,
+    )
+    recent, old = scratch_space.create(10), scratch_space.create(10)
+    for scratch_dir in (recent, old):
+        (scratch_dir.path / OWNER_NAME).write_text(
+            json.dumps({"host": "other-host", "pid": os.getpid(), "reserved": 10})
+        )
+    os.utime(old.path, (0, 0))
+
+    assert scratch_space.clean() == 2
+    assert sorted((tmp_path / JOBS_DIR).glob("*/")) == sorted(
+        [running.path, recent.path]
+    )
+
+
+def test_orchestrator_works_in_scratch_space(tmp_path: Path, monkeypatch) -> None:
+    """Assert jobs work in the configured scratch root and leave nothing behind."""
+    monkeypatch.setattr("recipe_xml_converter.config.SCRATCH_DIR", str(tmp_path))
+    (tmp_path / "in.xml").write_text(RECIPE)
+
+    RecipeOrchestrator((tmp_path / "in.xml",), tmp_path).orchestrate()
+
+    assert (tmp_path / JOBS_DIR).is_dir()
+    assert [path.name for path in (tmp_path / JOBS_DIR).iterdir()] == [".lock"]
+
+    monkeypatch.setattr("recipe_xml_converter.config.SCRATCH_JOB_QUOTA", 10)
+    with pytest.raises(ScratchSpaceException):
+        RecipeOrchestrator((tmp_path / "in.xml",), tmp_path).orchestrate()
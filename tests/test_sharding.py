@@ -0,0 +1,83 @@
+import zipfile
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.sharding import split_recipeml
+from recipe_xml_converter.transformer import RecipeTransformer
+
+RECIPEML = """<?xml version="1.0" encoding="UTF-8"?>
+<recipeml version="0.5">
+  <meta name="DC.Creator" content="Root Creator"/>
+  {root_recipes}
+  <menu>
+    <meta name="DC.Source" content="Menu Source"/>
+    {menu_recipes}
+  </menu>
+</recipeml>
+"""
+
+RECIPE = (
+    "<recipe><head><title>Recipe {i}</title><categories><cat>Cat {i}</cat>"
+    "</categories></head><ingredients><ing><item>Item {i}</item></ing>"
+    "</ingredients></recipe>"
+)
+
+
+@pytest.fixture
+def giant_file(tmp_path: Path) -> Path:
+    """Return a RecipeML file with recipes both in the root and in a menu."""
+    path = tmp_path / "giant.xml"
+    path.write_text(
+        RECIPEML.format(
+            root_recipes="\n  ".join([RECIPE.format(i=i) for i in range(7)]),
+            menu_recipes="\n    ".join([RECIPE.format(i=i) for i in range(7, 12)]),
+        )
+    )
+    return path
+
+
+def test_chunks_keep_surrounding_meta(giant_file: Path, tmp_path: Path) -> None:
+    """Assert every chunk keeps the meta elements next to its recipes."""
+    chunks = split_recipeml(giant_file, tmp_path / "chunks", 5)
+    assert chunks is not None and len(chunks) == 3
+
+    middle = ET.parse(chunks[1]).getroot()
+    assert middle.get("version") == "0.5"
+    assert middle.xpath("meta/@content") == ["Root Creator"]
+    assert middle.xpath("menu/meta/@content") == ["Menu Source"]
+    assert middle.xpath("recipe/head/title/text()") == ["Recipe 5", "Recipe 6"]
+    assert len(middle.xpath("menu/recipe")) == 3
+
+
+def test_small_files_are_not_split(giant_file: Path, tmp_path: Path) -> None:
+    """Assert files with no more recipes than a chunk holds aren't split."""
+    assert split_recipeml(giant_file, tmp_path / "chunks", 12) is None
+
+
+@pytest.mark.parametrize("recipes_per_shard", [1, 5])
+def test_sharded_output_is_identical(
+    giant_file: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    recipes_per_shard: int,
+) -> None:
+    """Assert transforming a file in chunks gives the same cookbook as transforming it whole."""
+    RecipeTransformer(giant_file, tmp_path / "whole.xml").transform_and_save()
+
+    monkeypatch.setattr("recipe_xml_converter.config.SHARD_MIN_SIZE", 0)
+    (tmp_path / "out").mkdir()
+    orchestrator = RecipeOrchestrator(
+        (giant_file,), tmp_path / "out", workers=2, recipes_per_shard=recipes_per_shard
+    )
+    with zipfile.ZipFile(orchestrator.orchestrate()) as archive:
+        combined = ET.fromstring(archive.read("1.xml"))
+
+    whole = ET.parse(tmp_path / "whole.xml").getroot()
+    assert len(combined.xpath("recipe")) == 12
+    assert [ET.tostring(recipe) for recipe in combined] == [
+        ET.tostring(recipe) for recipe in whole
+    ]
+    assert orchestrator.report.files == [{"file": "giant.xml", "status": "transformed"}]
@@ -0,0 +1,161 @@
+import zipfile
+from pathlib import Path
+
+import pytest
+from lxml import etree as ET
+
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.recipes import Recipe, write_recipes
+from recipe_xml_converter.sorting import merge_runs, spill_runs, title_key
+
+RECIPE = (
+    "<recipe><head><title>{title}</title><categories><cat>{category}</cat>"
+    "</categories></head></recipe>"
+)
+TITLES = ["pie", "Apple", "Éclair", "apple", "2 Eggs", "Bread", "Cake", "brownie"]
+CATEGORIES = ["Desserts", "Fruit", "Desserts", "fruit", "Eggs", "Baking", "desserts"]
+
+
+@pytest.fixture
+def input_files(tmp_path: Path) -> tuple[Path, ...]:
+    """Return RecipeML files of a few recipes each with titles in no particular order."""
+    paths = []
+    for i in range(0, len(TITLES), 3):
+        path = tmp_path / f"{i}.xml"
+        path.write_text(
+            "<recipeml>"
+            + "".join(
+                RECIPE.format(title=title, category=CATEGORIES[j % len(CATEGORIES)])
+                for j, title in enumerate(TITLES[i : i + 3], start=i)
+            )
+            + "</recipeml>"
+        )
+        paths.append(path)
+    return tuple(paths)
+
+
+def titles(archive: zipfile.ZipFile, name: str) -> list[str]:
+    """Return the titles of the recipes of an entry in order."""
+    return ET.fromstring(archive.read(name)).xpath("recipe/title/text()")
+
+
+@pytest.mark.parametrize("run_size", [1, 3, 100])
+def test_runs_merge_in_order(tmp_path: Path, run_size: int) -> None:
+    """Assert merged runs are sorted however many there are and keep ties in order."""
+    recipes = [Recipe(title, quantity=str(i)) for i, title in enumerate(TITLES)]
+    write_recipes(recipes, tmp_path / "cookbook.xml")
+
+    runs = spill_runs([tmp_path / "cookbook.xml"], tmp_path / "runs", run_size, "title")
+
+    assert list(runs) == [""]
+    assert len(runs[""]) == -(-len(TITLES) // run_size)
+    merged = list(merge_runs(runs[""], "title"))
+    assert merged == sorted(recipes, key=title_key)
+    assert [recipe.quantity for recipe in merged[1:3]] == ["1", "3"]
+
+
+def test_runs_are_partitioned(tmp_path: Path) -> None:
+    """Assert partitions differing only in case are one and keep the input order unsorted."""
+    recipes = [Recipe(title, categories=("Soup",)) for title in ("b", "a")] + [
+        Recipe("c", categories=("soup",)),
+        Recipe("d"),
+    ]
+    write_recipes(recipes, tmp_path / "cookbook.xml")
+
+    runs = spill_runs(
+        [tmp_path / "cookbook.xml"], tmp_path / "runs", 2, partition_by="category"
+    )
+
+    assert list(runs) == ["Soup", "Uncategorized"]
+    assert [recipe.title for recipe in merge_runs(runs["Soup"])] == ["b", "a", "c"]
+
+
+def test_sorted_archive(input_files: tuple[Path, ...], tmp_path: Path) -> None:
+    """Assert the combined file of a sorted job holds all recipes ordered by title."""
+    archive_path = RecipeOrchestrator(
+        input_files, tmp_path, sort_by="title"
+    ).orchestrate()
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert titles(archive, "1.xml") == sorted(TITLES, key=str.casefold)
+        assert ET.fromstring(archive.read("1.xml")).attrib == {"version": "46"}
+
+
+def test_sorted_files_hold_at_most_max_files_combined(
+    input_files: tuple[Path, ...], tmp_path: Path
+) -> None:
+    """Assert sorted recipes are combined into files of at most max_files_combined each."""
+    archive_path = RecipeOrchestrator(
+        input_files, tmp_path, 3, sort_by="title"
+    ).orchestrate()
+
+    with zipfile.ZipFile(archive_path) as archive:
+        combined = [titles(archive, f"{i}.xml") for i in (1, 2, 3)]
+    assert [len(recipes) for recipes in combined] == [3, 3, 2]
+    assert sum(combined, []) == sorted(TITLES, key=str.casefold)
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_partitioned_archive(
+    input_files: tuple[Path, ...], tmp_path: Path, workers: int
+) -> None:
+    """Assert every partition gets a folder of sorted combined files below the size limit."""
+    archive_path = RecipeOrchestrator(
+        input_files,
+        tmp_path,
+        workers=workers,
+        max_entry_size=200,
+        index=True,
+        sort_by="title",
+        partition_by="alphabet",
+    ).orchestrate()
+
+    with zipfile.ZipFile(archive_path) as archive:
+        entries = [name for name in archive.namelist() if name.endswith(".xml")]
+        assert entries == [
+            "#/1.xml",
+            "A/1.xml",
+            "A/2.xml",
+            "B/1.xml",
+            "B/2.xml",
+            "C/1.xml",
+            "E/1.xml",
+            "P/1.xml",
+        ]
+        assert titles(archive, "A/1.xml") + titles(archive, "A/2.xml") == [
+            "Apple",
+            "apple",
+        ]
+        assert titles(archive, "B/1.xml") + titles(archive, "B/2.xml") == [
+            "Bread",
+            "brownie",
+        ]
+        assert titles(archive, "E/1.xml") == ["Éclair"]
+        assert all(archive.getinfo(name).file_size <= 200 for name in entries)
+        assert {
+            ET.fromstring(archive.read(name)).get("version") for name in entries
+        } == {"46"}
+
+
+def test_category_partitions_and_append(
+    input_files: tuple[Path, ...], tmp_path: Path
+) -> None:
+    """Assert recipes are partitioned by their first category and nothing can be appended."""
+    orchestrator = RecipeOrchestrator(input_files, tmp_path, partition_by="category")
+    archive_path = orchestrator.orchestrate()
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert titles(archive, "Desserts/1.xml") == ["pie", "Éclair", "Cake", "brownie"]
+        assert titles(archive, "Fruit/1.xml") == ["Apple", "apple"]
+    with pytest.raises(ValueError, match="can't be appended"):
+        orchestrator.append(archive_path)
+    with pytest.raises(ValueError, match="sorted or partitioned archive"):
+        RecipeOrchestrator(input_files, tmp_path).append(archive_path)
+
+
+def test_unsupported_sorting(tmp_path: Path) -> None:
+    """Assert unknown sort orders and partitionings are refused."""
+    with pytest.raises(ValueError, match="sort order"):
+        RecipeOrchestrator((), tmp_path, sort_by="calories")
+    with pytest.raises(ValueError, match="partitioning"):
+        RecipeOrchestrator((), tmp_path, partition_by="cuisine")
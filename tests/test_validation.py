@@ -0,0 +1,70 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from recipe_xml_converter.exceptions import InvalidInputException, TransformerException
+from recipe_xml_converter.transformer import RecipeTransformer
+from recipe_xml_converter.validation import detect_encoding, sniff_input
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"<recipeml><recipe/></recipeml>",
+        b'<?xml version="1.0" encoding="ISO-8859-1"?>\n<!-- c --><recipeml><recipe>',
+        b"\xef\xbb\xbf<?xml version='1.0'?><recipeml>",
+    ],
+)
+def test_sniff_accepts_recipeml(content: bytes) -> None:
+    """Assert documents starting with a recipeml root element pass the sniffing."""
+    sniff_input(io.BytesIO(content), "recipeml")
+
+
+@pytest.mark.parametrize(
+    "content,reason",
+    [
+        (b"", "empty"),
+        (b"  \n", "empty"),
+        (b'<?xml version="1.0" encoding="made-up"?><recipeml/>', "encoding"),
+        (b"not xml at all", "Malformed"),
+        (b"<cookbook><recipe/></cookbook>", "<cookbook>"),
+    ],
+)
+def test_sniff_rejects_invalid_input(content: bytes, reason: str) -> None:
+    """Assert files that are clearly not RecipeML are rejected with a reason."""
+    with pytest.raises(InvalidInputException, match=reason):
+        sniff_input(io.BytesIO(content), "recipeml")
+
+
+def test_sniff_keeps_file_position() -> None:
+    """Assert sniffing a file object doesn't consume it."""
+    file = io.BytesIO(b"<recipeml/>")
+    sniff_input(file, "recipeml")
+    assert file.tell() == 0
+
+
+def test_detect_encoding() -> None:
+    """Assert the encoding is taken from the XML declaration."""
+    assert detect_encoding(b'<?xml version="1.0" encoding="UTF-8"?>') == "UTF-8"
+    assert detect_encoding(b"<recipeml/>") is None
+
+
+def test_empty_output_is_rejected(tmp_path: Path) -> None:
+    """Assert RecipeML documents without recipes don't produce an empty cookbook."""
+    file = io.BytesIO(b"<recipeml><meta name='DC.Creator' content='x'/></recipeml>")
+    with pytest.raises(InvalidInputException, match="No recipes"):
+        RecipeTransformer(file, tmp_path / "out.xml").transform_and_save()
+    assert not (tmp_path / "out.xml").exists()
+
+
+def test_malformed_input_is_salvaged(tmp_path: Path) -> None:
+    """Assert malformed documents are only transformed in recover mode."""
+    content = b"<recipeml><recipe><head><title>Soup</title></head></recipe>"
+    with pytest.raises(TransformerException):
+        RecipeTransformer(io.BytesIO(content), tmp_path / "a.xml").transform_and_save()
+
+    transformer = RecipeTransformer(io.BytesIO(content), tmp_path / "b.xml", True)
+    transformer.transform_and_save()
+    assert transformer.salvaged
+    assert b"<title>Soup</title>" in (tmp_path / "b.xml").read_bytes()
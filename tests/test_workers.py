@@ -0,0 +1,201 @@
+import json
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Type
+
+import pytest
+
+from recipe_xml_converter.exceptions import TimeoutException, TransformerException
+from recipe_xml_converter.orchestrator import RecipeOrchestrator
+from recipe_xml_converter.transformer import RecipeTransformer, Transformer
+from recipe_xml_converter.workers import JobWorkers, WorkerPool
+
+RECIPE = b"<recipeml><recipe><head><title>{title}</title></head></recipe></recipeml>"
+
+
+def _square(x: int) -> int:
+    return x * x
+
+
+def _sleep(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def _fail() -> None:
+    raise ValueError("Broken")
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
+def test_pool_returns_all_results() -> None:
+    """Assert every task's result is returned with its position."""
+    with WorkerPool(2) as pool:
+        results = dict(pool.imap_unordered(_square, [(i,) for i in range(10)]))
+    assert results == {i: i * i for i in range(10)}
+
+
+def test_pool_returns_errors() -> None:
+    """Assert failing and crashing tasks return an exception without stopping the others."""
+    with WorkerPool(1) as pool:
+        results = dict(pool.imap_unordered(_fail, [()]))
+        results.update({i + 1: r for i, r in pool.imap_unordered(_crash, [()])})
+        results.update({i + 2: r for i, r in pool.imap_unordered(_square, [(3,)])})
+    assert isinstance(results[0], TransformerException)
+    assert isinstance(results[1], TransformerException)
+    assert results[2] == 9
+
+
+def test_pool_kills_tasks_exceeding_task_timeout() -> None:
+    """Assert a task running past its timeout is killed while the others complete."""
+    with WorkerPool(2, task_timeout=0.5) as pool:
+        results = dict(pool.imap_unordered(_sleep, [(30,), (0.01,), (0.02,)]))
+    assert isinstance(results[0], TimeoutException)
+    assert results[1] == 0.01
+    assert results[2] == 0.02
+
+
+def test_pool_abandons_tasks_after_deadline() -> None:
+    """Assert no task outlives the deadline of the job."""
+    start = time.monotonic()
+    with WorkerPool(1) as pool:
+        results = dict(pool.imap_unordered(_sleep, [(0.01,), (30,), (30,)], start + 1))
+    assert time.monotonic() - start < 10
+    assert results[0] == 0.01
+    assert isinstance(results[1], TimeoutException)
+    assert isinstance(results[2], TimeoutException)
+
+
+def _interval(seconds: float) -> tuple[float, float]:
+    start = time.time()
+    time.sleep(seconds)
+    return start, time.time()
+
+
+def test_pool_runs_most_expensive_tasks_first() -> None:
+    """Assert tasks with the highest cost start first."""
+    with WorkerPool(1) as pool:
+        order = [
+            index
+            for index, _ in pool.imap_unordered(
+                _square, [(i,) for i in range(4)], costs=[1, 5, 3, 2]
+            )
+        ]
+    assert order == [1, 2, 3, 0]
+
+
+def test_pool_admits_tasks_within_memory_budget() -> None:
+    """Assert no more tasks run at once than fit into the budget, but at least one does."""
+    with WorkerPool(4, memory_budget=2048) as pool:
+        results = dict(
+            pool.imap_unordered(
+                _interval, [(0.3,)] * 5, costs=[4096, 1024, 1024, 1024, 1024]
+            )
+        )
+        assert len(pool._idle) == 0  # idle workers are stopped once nothing is waiting
+
+    starts = sorted(start for start, _ in results.values())
+    ends = sorted(end for _, end in results.values())
+    concurrent = max(
+        sum(start <= moment for start in starts) - sum(end <= moment for end in ends)
+        for moment in starts
+    )
+    assert concurrent == 2
+    # the task exceeding the budget ran first and alone
+    assert results[0][1] <= min(starts[1:])
+
+
+def test_pool_keeps_minimum_of_idle_workers() -> None:
+    """Assert the pool keeps the minimum number of idle workers between jobs."""
+    with WorkerPool(3, min_workers=2) as pool:
+        list(pool.imap_unordered(_sleep, [(0.1,)] * 3))
+        assert len(pool._idle) == 2
+
+
+def test_pool_recycles_worn_out_workers() -> None:
+    """Assert workers are replaced after the maximum number of tasks or resident bytes."""
+    with WorkerPool(1, max_tasks=2) as pool:
+        pids = [pid for _, pid in pool.imap_unordered(os.getpid, [()] * 5)]
+    assert pids[0] == pids[1] != pids[2] == pids[3] != pids[4]
+
+    with WorkerPool(1, max_rss=1) as pool:
+        pids = [pid for _, pid in pool.imap_unordered(os.getpid, [()] * 2)]
+    assert pids[0] != pids[1]
+
+
+def test_job_workers_run_jobs_and_recycle() -> None:
+    """Assert job workers return results, raise errors and are replaced when worn out."""
+    job_workers = JobWorkers(2, max_jobs=2)
+    try:
+        pids = [job_workers.run(os.getpid) for _ in range(3)]
+        assert job_workers.run(_square, 3) == 9
+        with pytest.raises(TransformerException, match="Broken"):
+            job_workers.run(_fail)
+        with pytest.raises(TransformerException, match="died"):
+            job_workers.run(_crash)
+
+        assert pids[0] == pids[1] != pids[2] and os.getpid() not in pids
+        assert job_workers.recycled == 2
+        job_workers.run(_square, 4)
+        assert [stats["jobs"] for stats in job_workers.stats()] == [1]
+    finally:
+        job_workers.close()
+    assert job_workers.stats() == []
+
+
+class SlowRecipeTransformer(RecipeTransformer):
+    """A recipe transformer that hangs on files with slow in their name."""
+
+    def transform_and_save(self) -> None:
+        """Hang before transforming slow files."""
+        if "slow" in self._input_name:
+            time.sleep(30)
+        super().transform_and_save()
+
+
+class SlowRecipeOrchestrator(RecipeOrchestrator):
+    """A recipe orchestrator using the slow transformer."""
+
+    @property
+    def _transformer_class(self) -> Type[Transformer]:
+        return SlowRecipeTransformer
+
+
+@pytest.mark.parametrize(
+    "timeouts", [{"file_timeout": 1}, {"job_timeout": 2}], ids=["file", "job"]
+)
+def test_orchestrator_returns_partial_results(tmp_path: Path, timeouts: dict) -> None:
+    """Assert the archive contains the converted files and a manifest of the timed out ones."""
+    for name in ("fast", "slow"):
+        (tmp_path / f"{name}.xml").write_bytes(
+            RECIPE.replace(b"{title}", name.encode())
+        )
+
+    orchestrator = SlowRecipeOrchestrator(
+        (tmp_path / "fast.xml", tmp_path / "slow.xml"), tmp_path, workers=2, **timeouts
+    )
+    with zipfile.ZipFile(orchestrator.orchestrate()) as archive:
+        assert b"<title>fast</title>" in archive.read("1.xml")
+        report = json.loads(archive.read("report.json"))
+    assert report["summary"] == {"transformed": 1, "timed_out": 1}
+    assert report["files"][1]["file"] == "slow.xml"
+
+
+def test_orchestrator_transforms_files_within_memory_budget(tmp_path: Path) -> None:
+    """Assert files too large to run side by side are all transformed one at a time."""
+    files = []
+    for i in range(3):
+        files.append(tmp_path / f"{i}.xml")
+        files[-1].write_bytes(RECIPE.replace(b"{title}", str(i).encode()))
+
+    orchestrator = RecipeOrchestrator(
+        tuple(files), tmp_path, workers=2, memory_budget=1
+    )
+    with zipfile.ZipFile(orchestrator.orchestrate()) as archive:
+        report = json.loads(archive.read("report.json"))
+    assert report["summary"] == {"transformed": 3}
+    assert [file["file"] for file in report["files"]] == ["0.xml", "1.xml", "2.xml"]